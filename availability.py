@@ -0,0 +1,259 @@
+# Availability parsing for player profiles
+import os
+import re
+import logging
+from datetime import datetime, timezone
+from db import register_index
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+HOURS_PER_WEEK = 7 * 24
+# Bit mask with every hour of the week set
+ALL_HOURS = (1 << HOURS_PER_WEEK) - 1
+
+# UTC offset (in hours) assumed when a schedule doesn't name a timezone
+DEFAULT_UTC_OFFSET = float(os.getenv("NB_DEFAULT_UTC_OFFSET", "0"))
+
+# How long "8pm +" style open-ended schedules last
+OPEN_ENDED_HOURS = 4
+
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+DAY_GROUPS = {
+    "weekdays": [0, 1, 2, 3, 4],
+    "weekday": [0, 1, 2, 3, 4],
+    "weekends": [5, 6],
+    "weekend": [5, 6],
+    "daily": list(range(7)),
+    "everyday": list(range(7)),
+}
+# Local hour ranges for parts of the day
+DAY_PERIODS = {
+    "morning": (6, 12),
+    "afternoon": (12, 18),
+    "evening": (18, 23),
+    "night": (20, 24),
+}
+ALWAYS = ("anytime", "any time", "24/7", "all day", "always")
+NOT_SPECIFIED = ("", "not specified", "unknown", "none")
+
+_DAY = r"(mon|tue|wed|thu|fri|sat|sun)[a-z]*"
+_TIME = r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?"
+_DAY_RANGE = re.compile(_DAY + r"\s*(?:-|to)\s*" + _DAY)
+_DAY_SINGLE = re.compile(r"\b" + _DAY + r"\b")
+_TIME_RANGE = re.compile(r"\b" + _TIME + r"\s*(?:-|to|until)\s*" + _TIME)
+_TIME_OPEN = re.compile(r"\b" + _TIME + r"\s*(?:\+|onwards|onward|and later)")
+_TIME_FROM = re.compile(r"\b(?:after|from|since)\s*" + _TIME)
+_TIME_SINGLE = re.compile(r"\b" + _TIME + r"\b")
+_TIMEZONE = re.compile(r"\b(?:gmt|utc)\s*([+-])\s*(\d{1,2})(?::?(\d{2}))?")
+
+
+def _to_hour(hour, minute, meridiem, fallback_meridiem=None):
+    """Convert a clock time to an hour of the day (0-24), or None."""
+    hour = int(hour)
+    meridiem = meridiem or fallback_meridiem
+    if meridiem == "pm" and hour < 12:
+        hour += 12
+    elif meridiem == "am" and hour == 12:
+        hour = 0
+    if hour > 24 or (minute and int(minute) > 59):
+        return None
+    return hour
+
+
+def _parse_days(text):
+    """Return the weekday numbers (0=Monday) named in a schedule."""
+    days = set()
+    for group, group_days in DAY_GROUPS.items():
+        if re.search(r"\b" + group + r"\b", text):
+            days.update(group_days)
+    for match in _DAY_RANGE.finditer(text):
+        start = DAY_NAMES.index(match.group(1))
+        end = DAY_NAMES.index(match.group(2))
+        day = start
+        while True:
+            days.add(day)
+            if day == end:
+                break
+            day = (day + 1) % 7
+    text = _DAY_RANGE.sub(" ", text)
+    for match in _DAY_SINGLE.finditer(text):
+        days.add(DAY_NAMES.index(match.group(1)))
+    return days
+
+
+def _parse_hours(text):
+    """Return local (start, end) hour ranges named in a schedule."""
+    ranges = []
+    for match in _TIME_RANGE.finditer(text):
+        end = _to_hour(*match.groups()[3:6])
+        # "8-11pm" means 8pm to 11pm
+        start = _to_hour(*match.groups()[0:3], fallback_meridiem=match.group(6))
+        if start is not None and end is not None:
+            ranges.append((start, end))
+    text = _TIME_RANGE.sub(" ", text)
+
+    for pattern in (_TIME_OPEN, _TIME_FROM):
+        for match in pattern.finditer(text):
+            start = _to_hour(*match.groups())
+            if start is not None:
+                ranges.append((start, start + OPEN_ENDED_HOURS))
+        text = pattern.sub(" ", text)
+
+    for period, period_range in DAY_PERIODS.items():
+        if period in text:
+            ranges.append(period_range)
+
+    for match in _TIME_SINGLE.finditer(text):
+        # A lone time only counts with am/pm, otherwise it's likely a date
+        if match.group(3):
+            start = _to_hour(*match.groups())
+            if start is not None:
+                ranges.append((start, start + 1))
+    return ranges
+
+
+def parse_utc_offset(text):
+    """Return the UTC offset in hours named in a schedule, or None."""
+    match = _TIMEZONE.search(text.lower())
+    if not match:
+        return None
+    sign, hours, minutes = match.groups()
+    offset = int(hours) + int(minutes or 0) / 60
+    return -offset if sign == "-" else offset
+
+
+def parse_availability(text, default_offset=DEFAULT_UTC_OFFSET):
+    """Parse a free-text schedule into a mask of UTC hours of the week.
+
+    Bit (day * 24 + hour) is set when the player is available during that
+    UTC hour, with day 0 being Monday. Returns None when the schedule is not
+    specified or can't be understood.
+    """
+    if text is None:
+        return None
+    text = text.strip().lower()
+    if text in NOT_SPECIFIED:
+        return None
+    if any(word in text for word in ALWAYS):
+        return ALL_HOURS
+
+    offset = parse_utc_offset(text)
+    if offset is None:
+        offset = default_offset
+    text = _TIMEZONE.sub(" ", text)
+
+    days = _parse_days(text)
+    hours = _parse_hours(text)
+    if not days and not hours:
+        return None
+    if not days:
+        days = set(range(7))
+    if not hours:
+        hours = [(0, 24)]
+
+    shift = int(round(offset))
+    mask = 0
+    for day in days:
+        for start, end in hours:
+            if end <= start:
+                # Overnight range, e.g. 10pm-2am
+                end += 24
+            for hour in range(start, end):
+                utc_hour = (day * 24 + hour - shift) % HOURS_PER_WEEK
+                mask |= 1 << utc_hour
+    return mask
+
+
+def mask_hours(mask):
+    """Return the list of hour-of-week numbers set in a mask."""
+    hours = []
+    while mask:
+        low = mask & -mask
+        hours.append(low.bit_length() - 1)
+        mask ^= low
+    return hours
+
+
+def hour_label(hour_of_week):
+    """Return a label such as "Mon 20:00 UTC" for an hour of the week."""
+    day, hour = divmod(hour_of_week % HOURS_PER_WEEK, 24)
+    return f"{DAY_NAMES[day].title()} {hour:02d}:00 UTC"
+
+
+def parse_hour_of_week(day, time, offset=DEFAULT_UTC_OFFSET):
+    """Convert a local day name and clock time to a UTC hour of the week.
+
+    Returns None if either part can't be understood.
+    """
+    day = day.strip().lower()[:3]
+    if day not in DAY_NAMES:
+        return None
+    match = re.fullmatch(_TIME, time.strip().lower())
+    if not match:
+        return None
+    hour = _to_hour(*match.groups())
+    if hour is None or hour > 23:
+        return None
+    return (DAY_NAMES.index(day) * 24 + hour
+            - int(round(offset))) % HOURS_PER_WEEK
+
+
+def current_hour_of_week():
+    """Return the current UTC hour of the week."""
+    now = datetime.now(timezone.utc)
+    return now.weekday() * 24 + now.hour
+
+
+class AvailabilityIndex:
+    """Players available in each UTC hour of the week, by role.
+
+    Each hour holds the set of player ids available then, so "who can play
+    at X" is a single set lookup (intersected with a role set if needed).
+    Players without a parseable schedule are not indexed.
+    """
+
+    def __init__(self):
+        self.hours = [set() for _ in range(HOURS_PER_WEEK)]
+        self.roles = {}  # role -> player ids
+        self.entries = {}  # player_id -> (mask, roles)
+
+    def add(self, player):
+        mask = parse_availability(player.get("availability"))
+        if mask is None:
+            return
+        roles = tuple(player.get("roles") or ())
+        self.entries[player["id"]] = (mask, roles)
+        for hour in mask_hours(mask):
+            self.hours[hour].add(player["id"])
+        for role in roles:
+            self.roles.setdefault(role, set()).add(player["id"])
+
+    def remove(self, player):
+        entry = self.entries.pop(player["id"], None)
+        if entry is None:
+            return
+        mask, roles = entry
+        for hour in mask_hours(mask):
+            self.hours[hour].discard(player["id"])
+        for role in roles:
+            self.roles.get(role, set()).discard(player["id"])
+
+    def available_at(self, hour_of_week, role=None):
+        """Return the ids of players available in a UTC hour of the week."""
+        players = self.hours[hour_of_week % HOURS_PER_WEEK]
+        if role is None:
+            return set(players)
+        role_players = self.roles.get(role.lower(), set())
+        if len(role_players) < len(players):
+            players, role_players = role_players, players
+        return players & role_players
+
+    def mask_of(self, player_id):
+        """Return the availability mask of an indexed player, or None."""
+        entry = self.entries.get(player_id)
+        return entry[0] if entry else None
+
+
+# Keep an availability index for every store partition
+register_index("availability", AvailabilityIndex)
@@ -0,0 +1,359 @@
+# Incremental compressed backups of squads and players
+import os
+import re
+import sys
+import gzip
+import json
+import asyncio
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone, timedelta
+from db import (snapshot, save_squads, save_players, use_guild, reset_guild,
+                stored_guilds, partition_dir, data_version,
+                ensure_data_files_exist)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Minutes between scheduled backups (0 turns them off)
+BACKUP_INTERVAL_MINUTES = float(os.getenv("NB_BACKUP_INTERVAL_MINUTES", "60"))
+# Days backups can be restored from
+BACKUP_RETENTION_DAYS = float(os.getenv("NB_BACKUP_RETENTION_DAYS", "14"))
+# Diffs written on top of a base before a new base is taken
+DIFFS_PER_BASE = int(os.getenv("NB_BACKUP_DIFFS_PER_BASE", "24"))
+# Take a new base early once a chain's diffs reach this share of its base
+MAX_DIFF_RATIO = 0.5
+
+# Backups live in this directory inside each partition's data directory
+BACKUP_DIR_NAME = "backups"
+# Timestamps in backup file names, e.g. base-20250101T120000000000Z.json.gz
+FILE_TIME_FORMAT = "%Y%m%dT%H%M%S%fZ"
+_BACKUP_FILE = re.compile(r"^(base|diff)-(\d{8}T\d{12}Z)\.json\.gz$")
+_RELATIVE_TIME = re.compile(r"^(\d+(?:\.\d+)?)\s*([mhd])$")
+
+# Last backed up state per backup directory: {directory: chain}, where a
+# chain holds "version", "squads", "players", "diffs", "base_bytes",
+# "diff_bytes" and "last_file"
+_chains = {}
+# Backups of a directory must not run concurrently
+_backup_lock = threading.Lock()
+
+
+def _squad_key(squad):
+    return squad["name"].lower()
+
+
+def _player_key(player):
+    # JSON object keys are strings
+    return str(player["id"])
+
+
+def _backup_dir(data_dir):
+    return os.path.join(data_dir, BACKUP_DIR_NAME)
+
+
+def list_backups(directory):
+    """Return [(kind, taken_at, path)] for a backup directory, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    entries = []
+    for name in sorted(os.listdir(directory)):
+        match = _BACKUP_FILE.match(name)
+        if match:
+            taken_at = datetime.strptime(match.group(2), FILE_TIME_FORMAT)
+            entries.append((match.group(1),
+                            taken_at.replace(tzinfo=timezone.utc),
+                            os.path.join(directory, name)))
+    entries.sort(key=lambda entry: entry[1])
+    return entries
+
+
+def _read(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write(directory, kind, taken_at, data):
+    """Write a compressed backup file atomically; returns (path, size)."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory,
+                        f"{kind}-{taken_at.strftime(FILE_TIME_FORMAT)}.json.gz")
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(data, f, default=dict)
+    os.replace(tmp_path, path)
+    return path, os.path.getsize(path)
+
+
+def _diff(old, new):
+    """Return the upserts and deletions that turn `old` into `new`."""
+    return {
+        "upsert": [record for key, record in new.items()
+                   if old.get(key) != record],
+        "delete": [key for key in old if key not in new],
+    }
+
+
+def _apply(records, diff, key):
+    for record_key in diff["delete"]:
+        records.pop(record_key, None)
+    for record in diff["upsert"]:
+        records[key(record)] = record
+
+
+def _replay(entries, until=None):
+    """Rebuild the state recorded at `until` (default: the latest backup).
+
+    Returns a chain dict, or None if no backup was taken by then.
+    """
+    if until is not None:
+        entries = [entry for entry in entries if entry[1] <= until]
+    bases = [i for i, entry in enumerate(entries) if entry[0] == "base"]
+    if not bases:
+        return None
+
+    start = bases[-1]
+    base = _read(entries[start][2])
+    chain = {
+        "taken_at": entries[start][1],
+        "version": base["version"],
+        "squads": {_squad_key(s): s for s in base["squads"]},
+        "players": {_player_key(p): p for p in base["players"]},
+        "diffs": 0,
+        "base_bytes": os.path.getsize(entries[start][2]),
+        "diff_bytes": 0,
+        "last_file": entries[start][2],
+    }
+    for kind, taken_at, path in entries[start + 1:]:
+        diff = _read(path)
+        _apply(chain["squads"], diff["squads"], _squad_key)
+        _apply(chain["players"], diff["players"], _player_key)
+        chain["taken_at"] = taken_at
+        chain["version"] = diff["version"]
+        chain["diffs"] += 1
+        chain["diff_bytes"] += os.path.getsize(path)
+        chain["last_file"] = path
+    return chain
+
+
+def _prune(directory, now):
+    """Delete backup chains no longer needed to restore within retention.
+
+    A chain is only deleted once the next chain's base is older than the
+    retention window, so every point in the window stays restorable.
+    """
+    cutoff = now - timedelta(days=BACKUP_RETENTION_DAYS)
+    entries = list_backups(directory)
+    bases = [i for i, entry in enumerate(entries) if entry[0] == "base"]
+    removed = 0
+    for current, following in zip(bases, bases[1:]):
+        if entries[following][1] > cutoff:
+            break
+        for _, _, path in entries[current:following]:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def _current_chain(directory):
+    """Return the chain of the last backup in a directory, or None.
+
+    Must be called with _backup_lock held.
+    """
+    entries = list_backups(directory)
+    chain = _chains.get(directory)
+    if chain is None or not entries or chain["last_file"] != entries[-1][2]:
+        # First backup here, or another process wrote backups since ours
+        chain = _replay(entries)
+        if chain is not None:
+            _chains[directory] = chain
+    return chain
+
+
+def backup_store(store, data_dir, now=None):
+    """Back up a store snapshot into its partition's backup directory.
+
+    Writes a full base when a chain is due, otherwise a diff against the last
+    backup. Nothing is written if the store didn't change. Returns a summary
+    dict.
+    """
+    directory = _backup_dir(data_dir)
+    now = now or datetime.now(timezone.utc)
+    squads = {_squad_key(s): s for s in store.squads}
+    players = {_player_key(p): p for p in store.players}
+
+    with _backup_lock:
+        chain = _current_chain(directory)
+        if chain is not None and chain["version"] == store.version:
+            return {"kind": None, "version": store.version}
+
+        new_base = (chain is None or chain["diffs"] >= DIFFS_PER_BASE
+                    or chain["diff_bytes"] > MAX_DIFF_RATIO * chain["base_bytes"])
+        if new_base:
+            path, size = _write(directory, "base", now, {
+                "taken_at": now.isoformat(),
+                "version": store.version,
+                "squads": list(store.squads),
+                "players": list(store.players),
+            })
+            chain = {"diffs": 0, "base_bytes": size, "diff_bytes": 0}
+        else:
+            path, size = _write(directory, "diff", now, {
+                "taken_at": now.isoformat(),
+                "version": store.version,
+                "squads": _diff(chain["squads"], squads),
+                "players": _diff(chain["players"], players),
+            })
+            chain["diffs"] += 1
+            chain["diff_bytes"] += size
+        chain.update(taken_at=now, version=store.version, squads=squads,
+                     players=players, last_file=path)
+        _chains[directory] = chain
+        removed = _prune(directory, now)
+
+    kind = "base" if new_base else "diff"
+    logger.info(f"Backed up {directory} (v{store.version}) as {kind}, "
+                f"{size} bytes, pruned {removed} old files")
+    return {"kind": kind, "version": store.version, "bytes": size,
+            "pruned": removed}
+
+
+def backup_guild(guild_id):
+    """Back up one guild's partition (None for the shared one).
+
+    The partition's version is checked against the last backup first, so an
+    unchanged partition is neither loaded nor written.
+    """
+    token = use_guild(guild_id, create=False)
+    try:
+        data_dir = partition_dir()
+        with _backup_lock:
+            chain = _current_chain(_backup_dir(data_dir))
+        version = data_version()
+        if chain is not None and chain["version"] == version:
+            return {"kind": None, "version": version}
+        return backup_store(snapshot(), data_dir)
+    finally:
+        reset_guild(token)
+
+
+async def run_backups():
+    """Back up every stored partition from a worker thread."""
+    results = {}
+    for guild_id in await asyncio.to_thread(stored_guilds):
+        try:
+            results[guild_id] = await asyncio.to_thread(backup_guild, guild_id)
+        except Exception as e:
+            logger.error(f"Backup of guild {guild_id} failed: {e}")
+    return results
+
+
+def guild_backups(guild_id):
+    """Return the backups of a guild's partition, oldest first."""
+    token = use_guild(guild_id)
+    try:
+        return list_backups(_backup_dir(partition_dir()))
+    finally:
+        reset_guild(token)
+
+
+def parse_when(text, now=None):
+    """Parse a restore point: an ISO date/time (UTC unless given) or an age
+    such as "30m", "6h" or "2d". Returns an aware datetime or None.
+    """
+    text = text.strip()
+    now = now or datetime.now(timezone.utc)
+    match = _RELATIVE_TIME.match(text.lower())
+    if match:
+        amount = float(match.group(1))
+        unit = {"m": "minutes", "h": "hours", "d": "days"}[match.group(2)]
+        return now - timedelta(**{unit: amount})
+    try:
+        when = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when
+
+
+def restore_point(guild_id, when):
+    """Rebuild a guild's backed up state at `when`, or None if there is none.
+
+    Only reads backup files, so it can run in a worker thread.
+    """
+    token = use_guild(guild_id)
+    try:
+        directory = _backup_dir(partition_dir())
+    finally:
+        reset_guild(token)
+    return _replay(list_backups(directory), until=when)
+
+
+def apply_restore(guild_id, point):
+    """Replace a guild's squads and players with a restore point."""
+    token = use_guild(guild_id)
+    try:
+        saved = (save_squads(list(point["squads"].values()))
+                 and save_players(list(point["players"].values())))
+    finally:
+        reset_guild(token)
+    logger.warning(f"Restored guild {guild_id} to the backup from "
+                   f"{point['taken_at'].isoformat()}")
+    return saved
+
+
+def restore_guild(guild_id, when, dry_run=False):
+    """Restore a guild's squads and players as they were at `when`.
+
+    The current data is backed up first so a restore can be undone. Returns
+    a summary dict, or None if no backup was taken by then.
+    """
+    point = restore_point(guild_id, when)
+    if point is None:
+        return None
+    summary = {"taken_at": point["taken_at"].isoformat(),
+               "squads": len(point["squads"]),
+               "players": len(point["players"]),
+               "saved": False}
+    if not dry_run:
+        backup_guild(guild_id)
+        summary["saved"] = apply_restore(guild_id, point)
+    return summary
+
+
+def main(argv=None):
+    """Command line interface: list, take or restore backups."""
+    parser = argparse.ArgumentParser(description="Roster backups")
+    parser.add_argument("--guild", type=int, default=None,
+                        help="guild id (default: the shared partition)")
+    actions = parser.add_subparsers(dest="action", required=True)
+    actions.add_parser("list", help="list backups")
+    actions.add_parser("backup", help="take a backup now")
+    restore = actions.add_parser("restore", help="restore to a point in time")
+    restore.add_argument("when", help='ISO time (UTC) or age like "6h"')
+    restore.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    ensure_data_files_exist()
+    if args.action == "list":
+        for kind, taken_at, path in guild_backups(args.guild):
+            print(f"{taken_at.isoformat()}  {kind}  {os.path.getsize(path)} bytes")
+    elif args.action == "backup":
+        print(backup_guild(args.guild))
+    else:
+        when = parse_when(args.when)
+        if when is None:
+            parser.error(f"can't understand time {args.when!r}")
+        summary = restore_guild(args.guild, when, dry_run=args.dry_run)
+        if summary is None:
+            print(f"No backup taken before {when.isoformat()}")
+            return 1
+        print(summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+# Team auto-balancing for free agents
+import logging
+from array import array
+from ranks import parse_rank, parse_win_rate, MAX_RANK_SCORE
+from availability import (parse_availability, mask_hours, ALL_HOURS,
+                          HOURS_PER_WEEK)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+ROLES = ["gold", "exp", "mid", "jungle", "roam"]
+TEAM_SIZE = len(ROLES)
+
+# Weight of rank vs win rate in a player's strength score
+RANK_WEIGHT = 0.7
+WIN_RATE_WEIGHT = 0.3
+
+# Rounds of same-role swaps used to even out team strength, per team
+SWAP_ROUNDS_PER_TEAM = 2
+
+
+class Team:
+    """A balanced team: one player per role and the hour they share."""
+
+    def __init__(self, hour):
+        self.hour = hour
+        self.slots = {}  # role -> player index
+        self.off_role = set()  # roles filled by a player who doesn't list them
+        self.strength = 0.0
+
+
+def score_players(players):
+    """Compute strength scores for players.
+
+    Returns an array of scores in [0, 1]. Missing ranks or win rates are
+    replaced by the pool median so unknown profiles land mid-table.
+    """
+    ranks = [parse_rank(p.get("max_rank")) for p in players]
+    win_rates = [parse_win_rate(p.get("win_rate")) for p in players]
+
+    def median(values):
+        known = sorted(v for v in values if v is not None)
+        return known[len(known) // 2] if known else 0
+
+    rank_median = median(ranks)
+    win_rate_median = median(win_rates) or 50.0
+    return array("d", (
+        RANK_WEIGHT * min((r if r is not None else rank_median)
+                          / MAX_RANK_SCORE, 1.0)
+        + WIN_RATE_WEIGHT * (w if w is not None else win_rate_median) / 100
+        for r, w in zip(ranks, win_rates)))
+
+
+def _player_roles(player):
+    """Return the set of roles a player lists (all roles if none)."""
+    roles = {r for r in (player.get("roles") or {}) if r in ROLES}
+    return roles or set(ROLES)
+
+
+def _assign_roles(group, roles, scores, team_count):
+    """Pick team_count players for every role from a group of players.
+
+    Scarce roles are filled first, preferring players who play fewer roles so
+    flexible players stay available. Returns ({role: [(index, off_role)]},
+    unused player indexes).
+    """
+    unused = set(group)
+    picks = {}
+    order = sorted(ROLES, key=lambda r: sum(1 for i in group if r in roles[i]))
+    for role in order:
+        candidates = sorted((i for i in unused if role in roles[i]),
+                            key=lambda i: (len(roles[i]), -scores[i]))
+        chosen = [(i, False) for i in candidates[:team_count]]
+        if len(chosen) < team_count:
+            # Not enough players for this role: fill with the strongest rest
+            rest = sorted((i for i in unused if role not in roles[i]),
+                          key=lambda i: -scores[i])
+            chosen += [(i, True) for i in rest[:team_count - len(chosen)]]
+        for index, _ in chosen:
+            unused.discard(index)
+        picks[role] = chosen
+    return picks, unused
+
+
+def _distribute(picks, scores, teams):
+    """Deal each role's players to teams, strongest player to weakest team."""
+    for role in ROLES:
+        ranked = sorted(picks[role], key=lambda pick: -scores[pick[0]])
+        for team, (index, off_role) in zip(
+                sorted(teams, key=lambda t: t.strength), ranked):
+            team.slots[role] = index
+            if off_role:
+                team.off_role.add(role)
+            team.strength += scores[index]
+
+
+def _even_out(teams, scores, masks):
+    """Swap same-role players between the strongest and weakest teams.
+
+    A swap is only made when both players are available at the hour of the
+    team they move to.
+    """
+    for _ in range(SWAP_ROUNDS_PER_TEAM * len(teams)):
+        strongest = max(teams, key=lambda t: t.strength)
+        weakest = min(teams, key=lambda t: t.strength)
+        gap = strongest.strength - weakest.strength
+        best = None
+        for role in ROLES:
+            strong_index = strongest.slots[role]
+            weak_index = weakest.slots[role]
+            if not (masks[strong_index] & (1 << weakest.hour)
+                    and masks[weak_index] & (1 << strongest.hour)):
+                continue
+            diff = scores[strong_index] - scores[weak_index]
+            # Swapping moves 2 * diff of strength between the two teams
+            if 0 < diff < gap and (best is None or
+                                   abs(gap - 2 * diff) < best[0]):
+                best = (abs(gap - 2 * diff), role, diff)
+        if best is None or best[0] >= gap:
+            return
+        _, role, diff = best
+        strongest.slots[role], weakest.slots[role] = (
+            weakest.slots[role], strongest.slots[role])
+        strongest.strength -= diff
+        weakest.strength += diff
+
+
+def balance_teams(players):
+    """Form balanced 5-player teams covering every role.
+
+    Players are grouped by a shared available hour (the busiest remaining
+    hour first), then each group is split into teams with one player per role
+    and similar total strength. Returns (teams, scores, benched) where teams
+    hold indexes into `players` and benched lists players left over.
+    """
+    count = len(players)
+    scores = score_players(players)
+    roles = [_player_roles(p) for p in players]
+    masks = []
+    for player in players:
+        mask = parse_availability(player.get("availability"))
+        masks.append(ALL_HOURS if mask is None else mask)
+
+    # Players available in each hour of the week, kept up to date as
+    # players are placed in teams
+    hours_of = [mask_hours(m) for m in masks]
+    hour_counts = array("l", [0] * HOURS_PER_WEEK)
+    for hours in hours_of:
+        for hour in hours:
+            hour_counts[hour] += 1
+
+    remaining = set(range(count))
+    used_hours = set()
+    teams = []
+    while len(remaining) >= TEAM_SIZE:
+        hour = max((h for h in range(HOURS_PER_WEEK) if h not in used_hours),
+                   key=hour_counts.__getitem__, default=None)
+        if hour is None or hour_counts[hour] < TEAM_SIZE:
+            break
+        used_hours.add(hour)
+
+        bit = 1 << hour
+        group = [i for i in remaining if masks[i] & bit]
+        picks, _ = _assign_roles(group, roles, scores,
+                                 len(group) // TEAM_SIZE)
+        group_teams = [Team(hour) for _ in range(len(group) // TEAM_SIZE)]
+        _distribute(picks, scores, group_teams)
+        teams.extend(group_teams)
+
+        for team in group_teams:
+            for index in team.slots.values():
+                remaining.discard(index)
+                for player_hour in hours_of[index]:
+                    hour_counts[player_hour] -= 1
+
+    if len(teams) > 1:
+        _even_out(teams, scores, masks)
+        for team in teams:
+            team.off_role = {role for role, index in team.slots.items()
+                             if role not in roles[index]}
+    logger.debug(f"Balanced {count} players into {len(teams)} teams")
+    return teams, scores, sorted(remaining)
@@ -1,36 +1,145 @@
 # Discord bot implementation
 import os
+import time
+import resource
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import logging
-from db import ensure_data_files_exist
+from db import ensure_data_files_exist, warm_start, use_guild, evict_guild
 from commands import register_commands
+from members import bot_member_options
+from loopwatch import watchdog, WATCHDOG_ENABLED
+from logconfig import setup_logging, set_log_context
+from backups import run_backups, BACKUP_INTERVAL_MINUTES
+from needs import need_board, format_need
+from joinrequests import join_requests
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Process start time, used to report cold-start latency
+STARTED_AT = time.perf_counter()
+
 # Discord Bot setup
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='nb!', intents=intents)
+# Sharding: NB_SHARD_COUNT (or NB_SHARDED=1 to let Discord pick) switches to
+# AutoShardedBot, and NB_SHARD_IDS limits this process to some of the shards
+SHARD_COUNT = int(os.getenv("NB_SHARD_COUNT", "0")) or None
+SHARD_IDS = [int(s) for s in os.getenv("NB_SHARD_IDS", "").split(",")
+             if s.strip()] or None
+if SHARD_IDS and not SHARD_COUNT:
+    raise RuntimeError("NB_SHARD_IDS needs NB_SHARD_COUNT, the total number "
+                       "of shards across all processes")
+if SHARD_IDS and any(not 0 <= s < SHARD_COUNT for s in SHARD_IDS):
+    raise RuntimeError(f"NB_SHARD_IDS must be between 0 and "
+                       f"{SHARD_COUNT - 1} (NB_SHARD_COUNT is {SHARD_COUNT})")
+
+if SHARD_COUNT or os.getenv("NB_SHARDED", "0") == "1":
+    bot = commands.AutoShardedBot(command_prefix='nb!', intents=intents,
+                                  shard_count=SHARD_COUNT, shard_ids=SHARD_IDS,
+                                  **bot_member_options())
+else:
+    bot = commands.Bot(command_prefix='nb!', intents=intents,
+                       **bot_member_options())
+
+# Startup state: data is loaded once, not on every reconnect
+startup = {"data_ready": False, "first_command_served": False}
 
 @bot.event
 async def on_ready():
     """Event handler for when the bot is connected and ready."""
     logger.info(f'Bot logged in as {bot.user.name} ({bot.user.id})')
     
-    # Ensure data files exist
-    ensure_data_files_exist()
+    # Watch the event loop for blocking calls
+    if WATCHDOG_ENABLED:
+        watchdog.start()
+
+    # Ensure data files exist and warm the store on the first connect only
+    if not startup["data_ready"]:
+        ensure_data_files_exist()
+        stats = warm_start()
+        startup["data_ready"] = True
+        logger.info(
+            f"Loaded {stats['players']} players and {stats['squads']} squads "
+            f"from {stats['source']} in {stats['elapsed_ms']:.1f} ms")
     
+    # Deliver squad need matches
+    need_board.start(notify_need_match)
+
+    # Post batched join request digests
+    join_requests.start(bot)
+
+    # Start scheduled backups
+    if BACKUP_INTERVAL_MINUTES > 0 and not scheduled_backups.is_running():
+        scheduled_backups.start()
+
     # Set bot status
     await bot.change_presence(activity=discord.Game(name="MLBB Squad Manager | nb!help"))
     
-    logger.info("Bot is ready!")
+    # Report how long connecting (and member chunking) took and peak memory
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    logger.info(
+        f"Bot is ready! {time.perf_counter() - STARTED_AT:.2f}s after launch, "
+        f"{len(bot.guilds)} guilds, peak RSS {max_rss_mb:.1f} MB")
+
+async def notify_need_match(need, player):
+    """Tell a squad and a free agent that the player matches an open need."""
+    channel = bot.get_channel(need["channel_id"])
+    if channel is not None:
+        await channel.send(
+            f"🔔 <@{need['created_by']}> {player['mlbb_username']} "
+            f"(<@{player['id']}>) matches {need['squad']}'s need for "
+            f"{format_need(need)}!")
+    try:
+        user = bot.get_user(player["id"]) or await bot.fetch_user(player["id"])
+        await user.send(
+            f"🔔 Squad **{need['squad']}** is looking for {format_need(need)} "
+            f"and you match! Use `nb!join_squad {need['squad']}` to ask to join.")
+    except discord.HTTPException as e:
+        logger.info(f"Couldn't DM {player['id']} about need {need['id']}: {e}")
+
+@tasks.loop(minutes=BACKUP_INTERVAL_MINUTES or 60)
+async def scheduled_backups():
+    """Take incremental backups of every data partition."""
+    await run_backups()
+
+@bot.before_invoke
+async def route_to_guild(ctx):
+    """Point the data store at the partition of the guild the command runs in."""
+    use_guild(ctx.guild.id if ctx.guild else None)
+    # Tag this command's log records with the triggering message id
+    set_log_context(f"{ctx.message.id:x}", command=ctx.command.qualified_name,
+                    guild_id=ctx.guild.id if ctx.guild else None)
+    # Let the loop watchdog attribute stalls to this command
+    watchdog.command_started(ctx)
+
+@bot.after_invoke
+async def command_done(ctx):
+    """Stop attributing loop stalls to a finished command."""
+    watchdog.command_finished(ctx)
+
+@bot.event
+async def on_guild_remove(guild):
+    """Drop the cached data partition of a guild the bot left."""
+    evict_guild(guild.id)
+
+@bot.event
+async def on_command_completion(ctx):
+    """Report the cold-start time once the first command has been served."""
+    if not startup["first_command_served"]:
+        startup["first_command_served"] = True
+        elapsed = time.perf_counter() - STARTED_AT
+        logger.info(
+            f"Cold start: first command ({ctx.command.qualified_name}) "
+            f"served {elapsed:.2f}s after launch")
 
 def run_bot():
     """Run the Discord bot."""
+    setup_logging()
+
     # Register all commands
     register_commands(bot)
     
@@ -42,7 +151,8 @@ def run_bot():
     
     # Start the bot
     logger.info("Starting Discord bot...")
-    bot.run(token)
+    # Logging is already set up; don't let discord.py add its own handler
+    bot.run(token, log_handler=None)
 
 if __name__ == "__main__":
     run_bot()
@@ -0,0 +1,62 @@
+# Command cogs, loaded as discord.py extensions
+#
+# Cogs only hold command handlers. Caches and the data store live in the
+# modules they import, so reloading a cog keeps them warm.
+import logging
+from discord.ext import commands
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Cog name (as given to nb!reload) -> cog class name
+COGS = {
+    "profile": "Profile",
+    "roles": "Roles",
+    "squads": "Squads",
+    "fun": "Fun",
+    "admin": "Admin",
+}
+
+# Cogs loaded at startup
+EAGER_COGS = ("profile", "roles", "squads")
+
+# Rarely used cogs, loaded the first time one of their commands is used.
+# Their commands are listed here so they can be recognized before loading.
+LAZY_COGS = {
+    "fun": ("balance", "random_hero"),
+    "admin": ("diag", "backup", "backups", "restore", "stalls"),
+}
+LAZY_COMMANDS = {command: cog for cog, names in LAZY_COGS.items()
+                 for command in names}
+
+
+def cog_extension(name):
+    """Return the extension (module) name of a cog."""
+    return f"{__name__}.{name}"
+
+
+async def load_cog(bot, name):
+    """Load a cog unless it is loaded already; returns whether it is loaded."""
+    extension = cog_extension(name)
+    try:
+        await bot.load_extension(extension)
+    except commands.ExtensionAlreadyLoaded:
+        return True
+    except commands.ExtensionError as e:
+        logger.error(f"Failed to load {extension}: {e}",
+                     exc_info=e.__cause__ or e)
+        return False
+
+    if name in LAZY_COGS:
+        registered = {c.name for c in bot.get_cog(COGS[name]).get_commands()}
+        if registered != set(LAZY_COGS[name]):
+            logger.warning(f"Commands of {extension} don't match LAZY_COGS: "
+                           f"{sorted(registered ^ set(LAZY_COGS[name]))}")
+    logger.info(f"Loaded {extension}")
+    return True
+
+
+async def load_cogs(bot, names):
+    """Load several cogs; a cog that fails to load doesn't stop the others."""
+    for name in names:
+        await load_cog(bot, name)
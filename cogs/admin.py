@@ -0,0 +1,238 @@
+# Diagnostics and maintenance commands for admins
+import discord
+from discord.ext import commands
+import logging
+import asyncio
+from db import (snapshot, partition_dir, player_file_stats, sql_store_stats,
+                STORE_FORMAT)
+from utils import has_permission
+from members import member_cache
+from joinrequests import join_requests
+from singleflight import read_flights
+from locks import store_locks, lock_store
+from loopwatch import watchdog
+from backups import (backup_store, guild_backups, restore_point, apply_restore,
+                     parse_when)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Number of backups listed by nb!backups
+MAX_BACKUPS_SHOWN = 15
+
+# Number of stall reports listed by nb!stalls, and stack lines shown for each
+MAX_STALLS_SHOWN = 5
+STALL_STACK_LINES = 3
+
+
+class Admin(commands.Cog):
+    """Diagnostics and maintenance commands for admins."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command(name="diag")
+    @commands.check(has_permission)
+    async def diag(self, ctx, section: str = None):
+        """Show runtime diagnostics (coalescing, members, stalls, joins, store, locks)."""
+        sections = ["flights", "members", "stalls", "joins", "store", "locks"]
+        if section and section.lower() not in sections:
+            await ctx.send(
+                f"❌ Unknown section! Valid sections are: {', '.join(sections)}")
+            return
+
+        embed = discord.Embed(title="🩺 Bot Diagnostics",
+                              color=discord.Color.dark_grey())
+
+        if section is None or section.lower() == "flights":
+            totals = read_flights.totals()
+            embed.add_field(
+                name="Read Coalescing",
+                value=(f"**Calls:** {totals['calls']}\n"
+                       f"**Shared:** {totals['shared']} "
+                       f"({totals['shared_pct']:.1f}%)\n"
+                       f"**Computations:** {totals['computations']}\n"
+                       f"**In Flight:** {totals['in_flight']}"),
+                inline=False)
+            busiest = list(read_flights.stats().items())[:10]
+            if busiest:
+                embed.add_field(
+                    name="Busiest Keys",
+                    value="\n".join(
+                        f"`{key}` - {s['calls']} calls, {s['shared']} shared, "
+                        f"max {s['max_waiters']} waiting, "
+                        f"{s['avg_compute_ms']:.1f} ms"
+                        for key, s in busiest),
+                    inline=False)
+
+        if section is None or section.lower() == "members":
+            stats = member_cache.stats()
+            embed.add_field(
+                name="Member Cache",
+                value=(f"**Size:** {stats['size']}/{stats['max_size']}\n"
+                       f"**Hits:** {stats['hits']}\n"
+                       f"**Misses:** {stats['misses']}\n"
+                       f"**Queries:** {stats['queries']}"),
+                inline=False)
+
+        if section is None or section.lower() == "stalls":
+            stats = watchdog.stats()
+            embed.add_field(
+                name="Event Loop",
+                value=(f"**Watchdog:** {'running' if stats['running'] else 'off'}\n"
+                       f"**Threshold:** {stats['threshold_ms']:.0f} ms\n"
+                       f"**Stalls:** {stats['total_stalls']}\n"
+                       f"**Worst Lag:** {stats['max_lag_ms']:.0f} ms"),
+                inline=False)
+
+        if section is None or section.lower() == "joins":
+            stats = join_requests.stats()
+            embed.add_field(
+                name="Join Requests",
+                value=(f"**Open:** {stats['open']}\n"
+                       f"**Waiting for Digest:** {stats['pending']}\n"
+                       f"**Submitted:** {stats['submitted']}\n"
+                       f"**Duplicates Ignored:** {stats['duplicates']}\n"
+                       f"**Digests Posted:** {stats['digests']}"),
+                inline=False)
+
+        if section is None or section.lower() == "store":
+            stats = player_file_stats()
+            value = f"**Format:** {STORE_FORMAT}"
+            if stats is not None:
+                value += (f"\n**Indexed Players:** {stats['players']}\n"
+                          f"**Hot Cache:** {stats['cached']}/{stats['cache_size']}\n"
+                          f"**Hits:** {stats['hits']}\n"
+                          f"**Misses:** {stats['misses']}")
+            database = sql_store_stats()
+            if database is not None:
+                value += (f"\n**Database:** {database['dialect']}\n"
+                          f"**Connections in Use:** {database['checked_out']}\n"
+                          f"**Pool:** {database['pool']}")
+            embed.add_field(name="Player Store", value=value, inline=False)
+
+        if section is None or section.lower() == "locks":
+            stats = store_locks.stats()
+            lines = [f"**Locked Now:** {stats['locked']}",
+                     f"**Waiting Now:** {stats['waiting']}"]
+            for kind, counts in stats["kinds"].items():
+                lines.append(
+                    f"**{kind.title()} Locks:** {counts['acquisitions']} taken, "
+                    f"{counts['contended']} waited "
+                    f"(avg {counts['avg_wait_ms']:.1f} ms, "
+                    f"max {counts['max_wait_ms']:.1f} ms)")
+            embed.add_field(name="Data Locks", value="\n".join(lines),
+                            inline=False)
+
+        await ctx.send(embed=embed)
+
+    @commands.command(name="backup")
+    @commands.check(has_permission)
+    async def backup_now(self, ctx):
+        """Take a backup of this server's squads and players now."""
+        # The snapshot is immutable, so it can be written from a thread
+        store = snapshot()
+        result = await asyncio.to_thread(backup_store, store, partition_dir())
+        if result["kind"] is None:
+            await ctx.send(
+                f"✅ Nothing changed since the last backup (v{result['version']})")
+            return
+        await ctx.send(f"✅ Backup taken ({result['kind']}, "
+                       f"{result['bytes'] / 1024:.1f} KB)")
+
+    @commands.command(name="backups")
+    @commands.check(has_permission)
+    async def list_backups(self, ctx):
+        """List this server's most recent backups."""
+        guild_id = ctx.guild.id if ctx.guild else None
+        entries = await asyncio.to_thread(guild_backups, guild_id)
+        if not entries:
+            await ctx.send("No backups have been taken yet!")
+            return
+
+        lines = [f"`{taken_at:%Y-%m-%d %H:%M:%S}` UTC - {kind}"
+                 for kind, taken_at, _ in reversed(entries[-MAX_BACKUPS_SHOWN:])]
+        embed = discord.Embed(
+            title="💾 Backups",
+            description="\n".join(lines),
+            color=discord.Color.blue())
+        embed.set_footer(text=f"{len(entries)} backup files - "
+                              f"restore with nb!restore <time or age like 6h>")
+        await ctx.send(embed=embed)
+
+    @commands.command(name="restore")
+    @commands.check(has_permission)
+    async def restore(self, ctx, *, when: str):
+        """Restore squads and players to how they were at a point in time."""
+        point_in_time = parse_when(when)
+        if point_in_time is None:
+            await ctx.send("❌ Use a UTC time like `2025-01-31 18:00` "
+                           "or an age like `30m`, `6h` or `2d`!")
+            return
+
+        guild_id = ctx.guild.id if ctx.guild else None
+        point = await asyncio.to_thread(restore_point, guild_id, point_in_time)
+        if point is None:
+            await ctx.send(f"❌ No backup was taken before "
+                           f"{point_in_time:%Y-%m-%d %H:%M} UTC!")
+            return
+
+        await ctx.send(
+            f"⚠️ This will replace all squads and players with the backup from "
+            f"{point['taken_at']:%Y-%m-%d %H:%M:%S} UTC "
+            f"({len(point['squads'])} squads, {len(point['players'])} players). "
+            f"Type `confirm` within 30 seconds to continue.")
+        try:
+            response = await self.bot.wait_for(
+                'message',
+                timeout=30.0,
+                check=lambda m: m.author == ctx.author and m.channel == ctx.channel
+            )
+        except asyncio.TimeoutError:
+            await ctx.send("❌ Restore cancelled.")
+            return
+        if response.content.strip().lower() != "confirm":
+            await ctx.send("❌ Restore cancelled.")
+            return
+
+        # Every player and squad, before and after, stays locked until the
+        # restore is written, so no command can change them in between
+        async with lock_store(
+                ctx, players=[p["id"] for p in point["players"].values()],
+                squads=[s["name"] for s in point["squads"].values()]):
+            # Back up the current data first so the restore can be undone
+            await asyncio.to_thread(backup_store, snapshot(), partition_dir())
+            saved = await asyncio.to_thread(apply_restore, guild_id, point)
+        if saved:
+            await ctx.send("✅ Squads and players restored!")
+        else:
+            await ctx.send("❌ Failed to restore due to an error!")
+
+    @commands.command(name="stalls")
+    @commands.check(has_permission)
+    async def stalls(self, ctx, count: int = MAX_STALLS_SHOWN):
+        """Show the latest event loop stalls and where the loop was blocked."""
+        reports = watchdog.recent(max(1, min(count, MAX_STALLS_SHOWN)))
+        if not reports:
+            await ctx.send("✅ No event loop stalls recorded!")
+            return
+
+        embed = discord.Embed(
+            title="🐢 Event Loop Stalls",
+            description=f"{watchdog.stats()['total_stalls']} stalls recorded, "
+                        f"latest first:",
+            color=discord.Color.orange())
+        for report in reports:
+            duration = (f"{report['duration_ms']:.0f} ms+"
+                        if report["ongoing"] else f"{report['duration_ms']:.0f} ms")
+            stack = "".join(report["stack"][-STALL_STACK_LINES:]) or "unknown"
+            embed.add_field(
+                name=f"{duration} in {report['command'] or 'no command'}",
+                value=(f"{report['started_at'][:19]} UTC\n"
+                       f"```{stack[-900:]}```"),
+                inline=False)
+        await ctx.send(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(Admin(bot))
@@ -0,0 +1,107 @@
+# Fun and utility commands
+import discord
+from discord.ext import commands
+import logging
+import asyncio
+from db import load_players
+from heroes import hero_catalog
+from icons import icon_url
+from balance import balance_teams, ROLES, TEAM_SIZE
+from availability import hour_label
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Number of teams listed by nb!balance (embeds hold at most 25 fields)
+MAX_BALANCE_TEAMS_SHOWN = 10
+
+
+class Fun(commands.Cog):
+    """Fun and utility commands."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command(name="balance")
+    async def balance(self, ctx, members: commands.Greedy[discord.Member]):
+        """Form balanced 5-player teams from free agents or given players."""
+        wanted = {m.id for m in members}
+
+        def plan():
+            players = load_players()
+            if wanted:
+                pool = [p for p in players if p["id"] in wanted]
+            else:
+                pool = [p for p in players if not p.get("squad")]
+            if len(pool) < TEAM_SIZE:
+                return pool, None
+            return pool, balance_teams(pool)
+
+        # Loading and balancing pools of thousands of players is CPU-bound,
+        # so it runs off the event loop
+        pool, result = await asyncio.to_thread(plan)
+        if result is None:
+            await ctx.send(
+                f"❌ Need at least {TEAM_SIZE} registered players to form a team!")
+            return
+
+        teams, _, benched = result
+        if not teams:
+            await ctx.send(
+                "❌ Couldn't form a team: not enough players share an available hour!")
+            return
+
+        embed = discord.Embed(
+            title="Balanced Teams",
+            description=f"Formed {len(teams)} teams from {len(pool)} players:",
+            color=discord.Color.blue())
+
+        for number, team in enumerate(teams[:MAX_BALANCE_TEAMS_SHOWN], 1):
+            lines = []
+            for role in ROLES:
+                player = pool[team.slots[role]]
+                fill = " (fill)" if role in team.off_role else ""
+                lines.append(
+                    f"**{role.upper()}**: <@{player['id']}> - "
+                    f"{player['mlbb_username']}{fill}")
+            lines.append(f"*Plays together: {hour_label(team.hour)}*")
+            embed.add_field(
+                name=f"Team {number} (strength {team.strength:.2f})",
+                value="\n".join(lines),
+                inline=False)
+
+        footer = []
+        if len(teams) > MAX_BALANCE_TEAMS_SHOWN:
+            footer.append(
+                f"{len(teams) - MAX_BALANCE_TEAMS_SHOWN} more teams not shown")
+        if benched:
+            footer.append(f"{len(benched)} players left over")
+        if footer:
+            embed.set_footer(text=" • ".join(footer))
+        await ctx.send(embed=embed)
+
+    @commands.command(name="random_hero")
+    async def random_hero(self, ctx):
+        """Pick a random hero and show their info."""
+        import random
+
+        # Pick random hero
+        heroes = hero_catalog.heroes()
+        if not heroes:
+            await ctx.send("❌ No heroes available!")
+            return
+        hero_name = random.choice(list(heroes))
+        hero_data = heroes[hero_name]
+        
+        # Create embed
+        embed = discord.Embed(
+            title=f"Random Hero: {hero_name}",
+            color=discord.Color.random()
+        )
+        embed.set_image(url=icon_url(hero_name, hero_data))
+        
+        await ctx.send(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(Fun(bot))
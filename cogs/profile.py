@@ -0,0 +1,558 @@
+# Player profile commands
+import discord
+from discord.ext import commands
+import logging
+import asyncio
+import typing
+from datetime import datetime, timezone
+from db import (load_players, save_players, find_squad_by_name,
+                find_player_by_id, get_index, snapshot)
+from heroes import canonicalize_heroes, format_corrections
+from balance import ROLES
+from ranks import rank_label
+from history import stat_history, STAT_ALIASES, format_stat, sparkline
+from locks import lock_for
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Number of players listed by nb!leaderboard
+LEADERBOARD_SIZE = 10
+
+# Points drawn in nb!history sparklines, and recent changes listed
+HISTORY_SPARK_POINTS = 40
+HISTORY_CHANGES_SHOWN = 5
+
+
+class Profile(commands.Cog):
+    """Player profile commands."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    # Player commands
+    @commands.command(name="setup")
+    async def setup_profile(self, ctx):
+        """Interactive profile setup wizard."""
+        try:
+            # Check if already registered
+            existing_player = find_player_by_id(ctx.author.id)
+            
+            embed = discord.Embed(
+                title="🎮 MLBB Profile Setup",
+                description="Let's set up your profile! I'll guide you through each step.",
+                color=discord.Color.blue()
+            )
+            embed.set_thumbnail(url=ctx.author.display_avatar.url)
+            msg = await ctx.send(embed=embed)
+
+            if existing_player:
+                embed.description = "You're already registered! Let's update your profile information."
+                await msg.edit(embed=embed)
+            
+            # Step 1: MLBB ID
+            embed.description = "Please enter your MLBB ID (Server ID):"
+            await msg.edit(embed=embed)
+            
+            try:
+                response = await self.bot.wait_for(
+                    'message',
+                    timeout=60.0,
+                    check=lambda m: m.author == ctx.author and m.channel == ctx.channel
+                )
+                mlbb_id = response.content
+                
+                # Step 2: MLBB Username
+                embed.description = "Great! Now enter your MLBB Username:"
+                await msg.edit(embed=embed)
+                
+                response = await self.bot.wait_for(
+                    'message',
+                    timeout=60.0,
+                    check=lambda m: m.author == ctx.author and m.channel == ctx.channel
+                )
+                mlbb_username = response.content
+                
+                # Step 3: Max Rank
+                embed.description = "What's your maximum achieved rank? (e.g., Mythical Glory, Mythic, Legend, etc.)"
+                await msg.edit(embed=embed)
+                
+                response = await self.bot.wait_for(
+                    'message',
+                    timeout=60.0,
+                    check=lambda m: m.author == ctx.author and m.channel == ctx.channel
+                )
+                max_rank = response.content
+                
+                # Step 4: Win Rate
+                embed.description = "What's your overall win rate? (just the number, e.g., 65)"
+                await msg.edit(embed=embed)
+                
+                response = await self.bot.wait_for(
+                    'message',
+                    timeout=60.0,
+                    check=lambda m: m.author == ctx.author and m.channel == ctx.channel
+                )
+                win_rate = f"{response.content}%"
+                
+                # Step 5: Availability
+                embed.description = "When are you usually available to play? (e.g., Weekdays 8PM-11PM GMT+8)"
+                await msg.edit(embed=embed)
+                
+                response = await self.bot.wait_for(
+                    'message',
+                    timeout=60.0,
+                    check=lambda m: m.author == ctx.author and m.channel == ctx.channel
+                )
+                availability = response.content
+                
+                # Step 6: Roles
+                embed.description = "Last step! What roles do you play? Enter them in this format:\nrole1: hero1, hero2, hero3\nrole2: hero1, hero2\n\nValid roles: gold, exp, mid, jungle, roam"
+                await msg.edit(embed=embed)
+                
+                response = await self.bot.wait_for(
+                    'message',
+                    timeout=120.0,
+                    check=lambda m: m.author == ctx.author and m.channel == ctx.channel
+                )
+                
+                # Process roles
+                roles = {}
+                corrections, unknown = [], []
+                for line in response.content.split('\n'):
+                    if ':' in line:
+                        role, heroes = line.split(':')
+                        role = role.strip().lower()
+                        if role in ["gold", "exp", "mid", "jungle", "roam"]:
+                            heroes, fixed, missing = canonicalize_heroes(heroes)
+                            roles[role] = heroes
+                            corrections.extend(fixed)
+                            unknown.extend(missing)
+                
+                # Read the players only now: the answers took a while, and
+                # the lock isn't held while waiting for them
+                async with lock_for(ctx, players=[ctx.author.id]):
+                    players = load_players()
+                    existing_player = next(
+                        (p for p in players if p["id"] == ctx.author.id), None)
+
+                    # Create or update player profile
+                    player = {
+                        "id": ctx.author.id,
+                        "username": ctx.author.name,
+                        "mlbb_id": mlbb_id,
+                        "mlbb_username": mlbb_username,
+                        "max_rank": max_rank,
+                        "win_rate": win_rate,
+                        "availability": availability,
+                        "roles": roles,
+                        "squad": existing_player["squad"] if existing_player and "squad" in existing_player else ""
+                    }
+                
+                    if existing_player:
+                        # Update existing player
+                        players = [p if p["id"] != ctx.author.id else player for p in players]
+                    else:
+                        # Add new player
+                        players.append(player)
+                
+                    if save_players(players):
+                        embed.title = "✅ Profile Setup Complete!"
+                        embed.description = "Your profile has been successfully created! Use `nb!profile` to view it."
+                        note = format_corrections(corrections, unknown)
+                        if note:
+                            embed.description += f"\n\n{note}"
+                        embed.color = discord.Color.green()
+                        await msg.edit(embed=embed)
+                    else:
+                        embed.description = "❌ An error occurred while saving your profile."
+                        embed.color = discord.Color.red()
+                        await msg.edit(embed=embed)
+                    
+            except asyncio.TimeoutError:
+                embed.description = "❌ Setup timed out. Please try again using `nb!setup`"
+                embed.color = discord.Color.red()
+                await msg.edit(embed=embed)
+                
+        except Exception as e:
+            logger.error(f"Error in setup: {e}")
+            await ctx.send("❌ An error occurred during setup. Please try again.")
+
+    @commands.command(name="register")
+    async def register_player(self, ctx, mlbb_id: str, *, mlbb_username: str):
+        """Register yourself as a player."""
+        async with lock_for(ctx, players=[ctx.author.id]):
+            players = load_players()
+
+            # Check if already registered
+            existing_player = next(
+                (p for p in players if p["id"] == ctx.author.id), None)
+            if existing_player:
+                await ctx.send(
+                    f"❌ You are already registered! Use `nb!profile_update` to change your information."
+                )
+                return
+
+            # Create new player
+            new_player = {
+                "id": ctx.author.id,
+                "username": ctx.author.name,
+                "mlbb_id": mlbb_id,
+                "mlbb_username": mlbb_username
+            }
+
+            players.append(new_player)
+
+            if save_players(players):
+                embed = discord.Embed(
+                    title="Player Registered",
+                    description=
+                    f"{ctx.author.mention} has been registered as a player!",
+                    color=discord.Color.green())
+                embed.add_field(name="MLBB Username", value=mlbb_username)
+                embed.add_field(name="MLBB ID", value=mlbb_id)
+                embed.add_field(name="Status", value="Free Agent", inline=False)
+                await ctx.send(embed=embed)
+            else:
+                await ctx.send("❌ Failed to register due to an error!")
+
+    @commands.command(name="profile")
+    async def show_profile(self, ctx, member: discord.Member = None):
+        """Show player profile."""
+        # Default to command author if no member specified
+        target = member or ctx.author
+
+        # Find player
+        player = snapshot().player(target.id)
+        if not player:
+            await ctx.send(f"❌ {target.name} is not registered as a player!")
+            return
+
+        # Determine color based on squad status
+        embed_color = discord.Color.blue()
+        if "squad" in player and player["squad"]:
+            embed_color = discord.Color.green()
+
+        # Create embed
+        embed = discord.Embed(
+            title=f"Player Profile: {player['mlbb_username']}",
+            color=embed_color)
+
+        # Basic info
+        embed.add_field(name="Discord", value=target.mention)
+        embed.add_field(name="MLBB ID", value=player['mlbb_id'])
+        embed.add_field(name="MLBB Username", value=player['mlbb_username'])
+
+        # Squad information (with more prominence)
+        if "squad" in player and player["squad"]:
+            squad_role = player.get("role", "Member")
+            embed.add_field(
+                name="🏆 Squad Information",
+                value=
+                f"**Squad**: {player['squad']}\n**Position**: {squad_role}",
+                inline=False)
+        else:
+            embed.add_field(name="Status",
+                            value="**Free Agent**\n*Not in any squad*",
+                            inline=False)
+
+        # Add new profile details
+        if "max_rank" in player:
+            embed.add_field(name="Max Rank Achieved",
+                            value=player["max_rank"],
+                            inline=True)
+
+        if "win_rate" in player:
+            embed.add_field(name="Win Rate",
+                            value=player["win_rate"],
+                            inline=True)
+
+        if "availability" in player:
+            embed.add_field(name="Availability",
+                            value=player["availability"],
+                            inline=False)
+
+        # Add roles and main heroes
+        if "roles" in player and player["roles"]:
+            roles_text = ""
+            for role, heroes in player["roles"].items():
+                roles_text += f"**{role.upper()}**: {heroes}\n"
+
+            embed.add_field(name="Preferred Roles & Heroes",
+                            value=roles_text,
+                            inline=False)
+
+        # Set thumbnail to user's avatar
+        embed.set_thumbnail(url=target.display_avatar.url)
+
+        await ctx.send(embed=embed)
+
+    @commands.command(name="history")
+    async def show_history(self, ctx, member: typing.Optional[discord.Member] = None,
+                           stat: str = None):
+        """Show how a player's win rate and rank changed over time."""
+        member = member or ctx.author
+        if stat is not None:
+            stat = STAT_ALIASES.get(stat.lower())
+            if stat is None:
+                await ctx.send("❌ Invalid stat! Valid stats are: winrate, rank")
+                return
+
+        guild_id = ctx.guild.id if ctx.guild else None
+        history = await asyncio.to_thread(stat_history.history, guild_id,
+                                          member.id, stat)
+        if not history:
+            await ctx.send(
+                f"❌ No stat history for {member.display_name} yet! Changes to "
+                f"win rate and rank are recorded as they happen.")
+            return
+
+        embed = discord.Embed(title=f"📈 Stat History: {member.display_name}",
+                              color=discord.Color.blue())
+        for name, points in history.items():
+            values = [value for _, value in points]
+            best = max(values)
+            changes = "\n".join(
+                f"`{datetime.fromtimestamp(when, timezone.utc):%Y-%m-%d}` "
+                f"{format_stat(name, value)}"
+                for when, value in reversed(points[-HISTORY_CHANGES_SHOWN:]))
+            embed.add_field(
+                name="Win Rate" if name == "win_rate" else "Rank",
+                value=(f"`{sparkline(values[-HISTORY_SPARK_POINTS:])}`\n"
+                       f"**Current:** {format_stat(name, values[-1])}\n"
+                       f"**Best:** {format_stat(name, best)}\n"
+                       f"**Recorded Changes:** {len(points)}\n"
+                       f"{changes}"),
+                inline=True)
+        embed.set_footer(text="Older points are thinned out to one per day or week")
+        await ctx.send(embed=embed)
+
+    @commands.command(name="profile_update")
+    async def update_profile(self, ctx, field: str, *, value: str):
+        """Update your profile information."""
+        async with lock_for(ctx, players=[ctx.author.id]):
+            players = load_players()
+
+            # Find player and their index
+            player_index = -1
+            player = None
+            for i, p in enumerate(players):
+                if p["id"] == ctx.author.id:
+                    player_index = i
+                    player = p
+                    break
+
+            if not player:
+                await ctx.send(
+                    f"❌ You are not registered! Use `nb!register` first.")
+                return
+
+            # List of valid fields that can be updated
+            valid_fields = [
+                "mlbb_id", "mlbb_username", "max_rank", "win_rate", "availability"
+            ]
+            field = field.lower()  # Normalize field name
+
+            # Validate the field
+            if field not in valid_fields:
+                await ctx.send(
+                    f"❌ Invalid field! Valid fields are: {', '.join(valid_fields)}"
+                )
+                return
+
+            # Special handling for win_rate to ensure % sign
+            if field == "win_rate" and not value.endswith('%'):
+                value = f"{value}%"
+
+            # Update the field
+            player[field] = value
+
+            # Update the player in the list
+            players[player_index] = player
+
+            if save_players(players):
+                await ctx.send(f"✅ Updated your {field} to '{value}'.")
+            else:
+                await ctx.send("❌ Failed to update profile due to an error!")
+
+    @commands.command(name="set_rank")
+    async def set_rank(self, ctx, *, rank: str):
+        """Set your maximum achieved rank."""
+        async with lock_for(ctx, players=[ctx.author.id]):
+            players = load_players()
+
+            # Find player index
+            player_index = -1
+            player = None
+            for i, p in enumerate(players):
+                if p["id"] == ctx.author.id:
+                    player_index = i
+                    player = p
+                    break
+
+            if not player:
+                await ctx.send(
+                    f"❌ You are not registered! Use `nb!register` first.")
+                return
+
+            # Update rank
+            player["max_rank"] = rank
+            players[player_index] = player  # Update the player in the list
+
+            if save_players(players):
+                await ctx.send(f"✅ Updated your maximum rank to '{rank}'.")
+            else:
+                await ctx.send("❌ Failed to update rank due to an error!")
+
+    @commands.command(name="set_winrate")
+    async def set_winrate(self, ctx, win_rate: str):
+        """Set your overall win rate percentage."""
+        async with lock_for(ctx, players=[ctx.author.id]):
+            players = load_players()
+
+            # Find player index
+            player_index = -1
+            player = None
+            for i, p in enumerate(players):
+                if p["id"] == ctx.author.id:
+                    player_index = i
+                    player = p
+                    break
+
+            if not player:
+                await ctx.send(
+                    f"❌ You are not registered! Use `nb!register` first.")
+                return
+
+            # Validate win rate format (basic check)
+            if not win_rate.endswith('%'):
+                win_rate = f"{win_rate}%"
+
+            # Update win rate
+            player["win_rate"] = win_rate
+            players[player_index] = player  # Update the player in the list
+
+            if save_players(players):
+                await ctx.send(f"✅ Updated your win rate to '{win_rate}'.")
+            else:
+                await ctx.send("❌ Failed to update win rate due to an error!")
+
+    @commands.command(name="set_availability")
+    async def set_availability(self, ctx, *, availability: str):
+        """Set your availability schedule."""
+        async with lock_for(ctx, players=[ctx.author.id]):
+            players = load_players()
+
+            # Find player index
+            player_index = -1
+            player = None
+            for i, p in enumerate(players):
+                if p["id"] == ctx.author.id:
+                    player_index = i
+                    player = p
+                    break
+
+            if not player:
+                await ctx.send(
+                    f"❌ You are not registered! Use `nb!register` first.")
+                return
+
+            # Update availability
+            player["availability"] = availability
+            players[player_index] = player  # Update the player in the list
+
+            if save_players(players):
+                await ctx.send(f"✅ Updated your availability to '{availability}'.")
+            else:
+                await ctx.send("❌ Failed to update availability due to an error!")
+
+    @commands.command(name="leaderboard")
+    async def leaderboard(self, ctx, *filters: str):
+        """Show the top ranked players, optionally by role and/or squad."""
+        role = None
+        if filters and filters[0].lower() in ROLES:
+            role = filters[0].lower()
+            filters = filters[1:]
+
+        squad_name = None
+        if filters:
+            squad = find_squad_by_name(" ".join(filters))
+            if not squad:
+                await ctx.send(f"❌ Squad '{' '.join(filters)}' not found!")
+                return
+            squad_name = squad["name"]
+
+        index = get_index("rank")
+        top = index.top(LEADERBOARD_SIZE, role=role, squad=squad_name)
+        scope = " ".join(part for part in (squad_name, role and role.upper())
+                         if part) or "All Players"
+        if not top:
+            await ctx.send(f"❌ No ranked players found for {scope}!")
+            return
+
+        store = snapshot()
+        lines = []
+        for position, (player_id, score) in enumerate(top, 1):
+            player = store.player(player_id)
+            lines.append(f"**{position}.** <@{player_id}> - "
+                         f"{player['mlbb_username']} - {rank_label(score)}")
+
+        embed = discord.Embed(
+            title=f"🏅 Leaderboard: {scope}",
+            description="\n".join(lines),
+            color=discord.Color.gold())
+
+        standing = index.percentile(ctx.author.id, role=role, squad=squad_name)
+        if standing:
+            position, total, _ = standing
+            embed.set_footer(
+                text=f"You are #{position} of {total} (top {100 * position / total:.0f}%)")
+        else:
+            embed.set_footer(text=f"{index.count(role=role, squad=squad_name)} ranked players")
+        await ctx.send(embed=embed)
+
+    @commands.command(name="search_player")
+    async def search_player(self, ctx, *, search_term: str):
+        """Search for a player by name or MLBB ID."""
+        players = snapshot().players
+
+        # Search by different criteria
+        results = []
+        search_term_lower = search_term.lower()
+
+        for player in players:
+            # Check Discord username
+            if search_term_lower in player["username"].lower():
+                results.append(player)
+            # Check MLBB username
+            elif search_term_lower in player["mlbb_username"].lower():
+                results.append(player)
+            # Check MLBB ID
+            elif search_term == player["mlbb_id"]:
+                results.append(player)
+
+        if not results:
+            await ctx.send(f"❌ No players found matching '{search_term}'!")
+            return
+
+        embed = discord.Embed(
+            title=f"Player Search Results for '{search_term}'",
+            description=f"Found {len(results)} matching players:",
+            color=discord.Color.blue())
+
+        for player in results:
+            mention = f"<@{player['id']}>"
+
+            status = f"**Squad**: {player['squad']}" if "squad" in player and player[
+                "squad"] else "**Status**: Free Agent"
+
+            embed.add_field(
+                name=player["mlbb_username"],
+                value=f"Discord: {mention}\nID: {player['mlbb_id']}\n{status}",
+                inline=True)
+
+        await ctx.send(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(Profile(bot))
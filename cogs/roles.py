@@ -0,0 +1,206 @@
+# Preferred roles and finding players by role and schedule
+import discord
+from discord.ext import commands
+import logging
+from db import load_players, save_players, get_index, snapshot
+from heroes import canonicalize_heroes, format_corrections
+from balance import ROLES
+from availability import (hour_label, current_hour_of_week, parse_hour_of_week,
+                          parse_utc_offset, DEFAULT_UTC_OFFSET)
+from locks import lock_for
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Number of players listed by nb!available and nb!available_now
+MAX_AVAILABLE_SHOWN = 24
+
+
+async def send_available_players(ctx, hour, role):
+    """Send the players available at a UTC hour of the week."""
+    player_ids = get_index("availability").available_at(hour, role=role)
+    scope = f" ({role.upper()})" if role else ""
+    if not player_ids:
+        await ctx.send(
+            f"❌ No players available at {hour_label(hour)}{scope}!")
+        return
+
+    store = snapshot()
+    players = [store.player(player_id) for player_id in player_ids]
+    # Free agents first, then by name
+    players.sort(key=lambda p: (bool(p["squad"]), p["mlbb_username"].lower()))
+
+    embed = discord.Embed(
+        title=f"Available at {hour_label(hour)}{scope}",
+        description=f"Found {len(players)} players:",
+        color=discord.Color.blue())
+    for player in players[:MAX_AVAILABLE_SHOWN]:
+        status = f"**Squad**: {player['squad']}" if player[
+            "squad"] else "**Status**: Free Agent"
+        embed.add_field(
+            name=player["mlbb_username"],
+            value=f"Discord: <@{player['id']}>\n{status}\n{player['availability']}",
+            inline=True)
+    if len(players) > MAX_AVAILABLE_SHOWN:
+        embed.set_footer(
+            text=f"{len(players) - MAX_AVAILABLE_SHOWN} more players not shown")
+    await ctx.send(embed=embed)
+
+
+class Roles(commands.Cog):
+    """Preferred roles and finding players by role and schedule."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command(name="add_role")
+    async def add_role(self, ctx, role: str, *, heroes: str):
+        """Add a preferred role with main heroes."""
+        async with lock_for(ctx, players=[ctx.author.id]):
+            players = load_players()
+
+            # Find player index
+            player_index = -1
+            player = None
+            for i, p in enumerate(players):
+                if p["id"] == ctx.author.id:
+                    player_index = i
+                    player = p
+                    break
+
+            if not player:
+                await ctx.send(
+                    f"❌ You are not registered! Use `nb!register` first.")
+                return
+
+            # Valid MLBB roles
+            valid_roles = ["gold", "exp", "mid", "jungle", "roam"]
+            if role.lower() not in valid_roles:
+                await ctx.send(
+                    f"❌ Invalid role! Valid roles are: {', '.join(valid_roles)}")
+                return
+
+            # Initialize roles if not exists
+            if "roles" not in player:
+                player["roles"] = {}
+
+            # Add role with heroes, using the catalog's hero names
+            heroes, corrections, unknown = canonicalize_heroes(heroes)
+            player["roles"][role.lower()] = heroes
+            players[player_index] = player  # Update the player in the list
+
+            if save_players(players):
+                note = format_corrections(corrections, unknown)
+                await ctx.send(
+                    f"✅ Added '{role}' to your preferred roles with heroes: {heroes}"
+                    + (f"\n{note}" if note else "")
+                )
+            else:
+                await ctx.send("❌ Failed to add role due to an error!")
+
+    @commands.command(name="remove_role")
+    async def remove_role(self, ctx, role: str):
+        """Remove a role from your profile."""
+        async with lock_for(ctx, players=[ctx.author.id]):
+            players = load_players()
+
+            # Find player
+            player = next((p for p in players if p["id"] == ctx.author.id),
+                          None)
+            if not player:
+                await ctx.send(
+                    f"❌ You are not registered! Use `nb!register` first.")
+                return
+
+            # Check if player has roles
+            if "roles" not in player or not player["roles"]:
+                await ctx.send(f"❌ You don't have any preferred roles set!")
+                return
+
+            # Check if role exists in player's roles
+            if role.lower() not in player["roles"]:
+                await ctx.send(
+                    f"❌ You don't have '{role}' in your preferred roles!")
+                return
+
+            # Remove the role
+            del player["roles"][role.lower()]
+
+            if save_players(players):
+                await ctx.send(f"✅ Removed '{role}' from your preferred roles.")
+            else:
+                await ctx.send("❌ Failed to remove role due to an error!")
+
+    @commands.command(name="available_now")
+    async def available_now(self, ctx, role: str = None):
+        """List players available to play right now."""
+        if role and role.lower() not in ROLES:
+            await ctx.send(
+                f"❌ Invalid role! Valid roles are: {', '.join(ROLES)}")
+            return
+        await send_available_players(ctx, current_hour_of_week(), role)
+
+    @commands.command(name="available")
+    async def available(self, ctx, day: str, time: str, *options: str):
+        """List players available at a day and time, e.g. sat 8pm GMT+8 jungle."""
+        role = None
+        offset = DEFAULT_UTC_OFFSET
+        for option in options:
+            if option.lower() in ROLES:
+                role = option.lower()
+            elif parse_utc_offset(option) is not None:
+                offset = parse_utc_offset(option)
+            else:
+                await ctx.send(f"❌ Unknown option '{option}'!")
+                return
+
+        hour = parse_hour_of_week(day, time, offset)
+        if hour is None:
+            await ctx.send(
+                "❌ Invalid day or time! Example: `nb!available sat 8pm GMT+8 jungle`")
+            return
+        await send_available_players(ctx, hour, role)
+
+    @commands.command(name="search_role")
+    async def search_role(self, ctx, role: str):
+        """Find players by preferred role."""
+        players = snapshot().players
+
+        # Valid MLBB roles
+        valid_roles = ["gold", "exp", "mid", "jungle", "roam"]
+        if role.lower() not in valid_roles:
+            await ctx.send(
+                f"❌ Invalid role! Valid roles are: {', '.join(valid_roles)}")
+            return
+
+        # Find players with this role
+        results = []
+        for player in players:
+            if "roles" in player and player["roles"] and role.lower(
+            ) in player["roles"]:
+                results.append(player)
+
+        if not results:
+            await ctx.send(f"❌ No players found with role '{role}'!")
+            return
+
+        embed = discord.Embed(title=f"Players with {role.upper()} Role",
+                              description=f"Found {len(results)} players:",
+                              color=discord.Color.blue())
+
+        for player in results:
+            mention = f"<@{player['id']}>"
+
+            status = f"**Squad**: {player['squad']}" if "squad" in player and player[
+                "squad"] else "**Status**: Free Agent"
+            heroes = f"**Main Heroes**: {player['roles'][role.lower()]}"
+
+            embed.add_field(name=player["mlbb_username"],
+                            value=f"Discord: {mention}\n{status}\n{heroes}",
+                            inline=True)
+
+        await ctx.send(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(Roles(bot))
@@ -0,0 +1,772 @@
+# Squad management, membership, listings and role needs
+import discord
+from discord.ext import commands
+import logging
+import asyncio
+from db import (load_squads, save_squads, load_players, save_players,
+                find_squad_by_name, find_player_by_id, update_players,
+                get_index, snapshot, squads_page, free_agents_page,
+                data_version)
+from utils import has_permission
+from members import member_cache
+from joinrequests import join_requests
+from balance import ROLES
+from ranks import parse_rank
+from availability import parse_availability
+from needs import need_board, format_need
+from stats import format_squad_stats
+from singleflight import read_flights
+from locks import lock_for
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Entries per page of nb!squads and nb!free_agents (embeds hold 25 fields)
+SQUADS_PER_PAGE = 10
+FREE_AGENTS_PER_PAGE = 24
+
+
+# Batch squad membership commands
+async def send_batch_summary(ctx, title, squad_name, changed, skipped,
+                             saved):
+    """Send one summary embed for a batch membership change."""
+    if not saved:
+        await ctx.send("❌ Failed to apply changes due to an error!")
+        return
+
+    embed = discord.Embed(
+        title=title,
+        description=f"{len(changed)} player(s) updated in '{squad_name}'",
+        color=discord.Color.green() if changed else discord.Color.orange())
+    if changed:
+        embed.add_field(name=f"Updated ({len(changed)})",
+                        value="\n".join(changed)[:1024],
+                        inline=False)
+    if skipped:
+        embed.add_field(name=f"Skipped ({len(skipped)})",
+                        value="\n".join(skipped)[:1024],
+                        inline=False)
+    embed.set_footer(text=f"Requested by {ctx.author.name}")
+    await ctx.send(embed=embed)
+
+
+def apply_membership(players, members, squad_name, from_squad=None):
+    """Move the given members into squad_name (or out of any squad if None).
+
+    Returns (changed, skipped) lists of display lines. When from_squad is
+    set, only players currently in that squad are touched; otherwise players
+    in another squad are moved and marked as such. A player changing squads
+    starts over as a Member, as roles belong to a squad.
+    """
+    by_id = {p["id"]: p for p in players}
+    changed, skipped = [], []
+    for member in dict.fromkeys(members):
+        player = by_id.get(member.id)
+        if not player:
+            skipped.append(f"{member.mention} - not registered")
+            continue
+
+        current = player.get("squad", "")
+        if from_squad and current.lower() != from_squad.lower():
+            skipped.append(f"{member.mention} - not in '{from_squad}'")
+            continue
+
+        if squad_name is None:
+            player.pop("squad", None)
+            player.pop("role", None)
+        elif current.lower() == squad_name.lower():
+            skipped.append(f"{member.mention} - already in '{squad_name}'")
+            continue
+        else:
+            player["squad"] = squad_name
+            player["role"] = "Member"
+            if current and not from_squad:
+                changed.append(f"{member.mention} - {player['mlbb_username']} "
+                               f"(moved from '{current}')")
+                continue
+        changed.append(f"{member.mention} - {player['mlbb_username']}")
+    return changed, skipped
+
+
+def flight_key(ctx, *parts):
+    """Return the single-flight key of a read in the command's guild."""
+    guild_id = ctx.guild.id if ctx.guild else 0
+    return ":".join(str(part) for part in (ctx.command.name, guild_id) + parts)
+
+
+async def can_manage_squad(ctx, squad):
+    """Check if the author is an admin or the squad's creator."""
+    return squad["created_by"] == ctx.author.id or await has_permission(ctx)
+
+
+class Squads(commands.Cog):
+    """Squad management, membership, listings and role needs."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    # Squad management commands
+    @commands.command(name="squad_create")
+    @commands.check(has_permission)
+    async def squad_create(self, ctx,
+                           name: str,
+                           *,
+                           description: str = "No description provided"):
+        """Create a new squad."""
+        async with lock_for(ctx, squads=[name]):
+            squads = load_squads()
+
+            # Check if squad already exists
+            if find_squad_by_name(name):
+                await ctx.send(f"❌ Squad with name '{name}' already exists!")
+                return
+
+            # Create new squad
+            new_squad = {
+                "name": name,
+                "description": description,
+                "created_by": ctx.author.id,
+                "created_at": ctx.message.created_at.isoformat()
+            }
+
+            squads.append(new_squad)
+            if save_squads(squads):
+                embed = discord.Embed(title=f"Squad Created: {name}",
+                                      description=description,
+                                      color=discord.Color.green())
+                embed.set_footer(text=f"Created by {ctx.author.name}")
+                await ctx.send(embed=embed)
+            else:
+                await ctx.send("❌ Failed to create squad due to an error!")
+
+    @commands.command(name="squad_update")
+    @commands.check(has_permission)
+    async def squad_update(self, ctx, name: str, *, description: str):
+        """Update squad details."""
+        async with lock_for(ctx, squads=[name]):
+            squads = load_squads()
+
+            # Find the squad
+            for squad in squads:
+                if squad["name"].lower() == name.lower():
+                    squad["description"] = description
+                    if save_squads(squads):
+                        embed = discord.Embed(title=f"Squad Updated: {name}",
+                                              description=description,
+                                              color=discord.Color.blue())
+                        embed.set_footer(text=f"Updated by {ctx.author.name}")
+                        await ctx.send(embed=embed)
+                    else:
+                        await ctx.send("❌ Failed to update squad due to an error!")
+                    return
+
+            await ctx.send(f"❌ Squad '{name}' not found!")
+
+    @commands.command(name="squad_delete")
+    @commands.check(has_permission)
+    async def squad_delete(self, ctx, name: str):
+        """Delete a squad."""
+        # Every current member is locked, as each of them is changed
+        async with lock_for(ctx, squads=[name], members_of=name):
+            squads = load_squads()
+            players = load_players()
+
+            # Find the squad
+            squad = find_squad_by_name(name)
+            if not squad:
+                await ctx.send(f"❌ Squad '{name}' not found!")
+                return
+
+            # Remove the squad
+            squads = [s for s in squads if s["name"].lower() != name.lower()]
+
+            # Update all players who were in this squad
+            for player in players:
+                if player.get("squad", "").lower() == name.lower():
+                    player.pop("squad", None)
+                    player.pop("role", None)
+
+            # Save changes, then drop the squad's open needs
+            if save_squads(squads) and save_players(players):
+                need_board.remove_squad(ctx.guild.id if ctx.guild else None,
+                                        name)
+                await ctx.send(
+                    f"✅ Squad '{name}' has been deleted and all members are now free agents."
+                )
+            else:
+                await ctx.send("❌ Failed to delete squad due to an error!")
+
+    @commands.command(name="add_member")
+    @commands.check(has_permission)
+    async def add_member(self, ctx,
+                         squad_name: str,
+                         member: discord.Member,
+                         mlbb_id: str = None,
+                         mlbb_username: str = None,
+                         role: str = "Member"):
+        """Add a member to a squad. If the player is already registered, you can omit mlbb_id and mlbb_username."""
+        async with lock_for(ctx, players=[member.id], squads=[squad_name]):
+            players = load_players()
+
+            # Check if squad exists
+            if not find_squad_by_name(squad_name):
+                await ctx.send(f"❌ Squad '{squad_name}' not found!")
+                return
+
+            # Find player index
+            player_index = -1
+            existing_player = None
+            for i, p in enumerate(players):
+                if p["id"] == member.id:
+                    player_index = i
+                    existing_player = p
+                    break
+
+            if existing_player:
+                # Update existing player
+                if mlbb_id is not None:
+                    existing_player["mlbb_id"] = mlbb_id
+                if mlbb_username is not None:
+                    existing_player["mlbb_username"] = mlbb_username
+
+                existing_player["squad"] = squad_name
+                existing_player["role"] = role
+                players[
+                    player_index] = existing_player  # Update the player in the list
+            else:
+                # Require MLBB ID and username for new players
+                if mlbb_id is None or mlbb_username is None:
+                    await ctx.send(
+                        f"❌ {member.name} is not registered yet! Please provide both MLBB ID and username."
+                    )
+                    return
+
+                # Create new player with all required fields
+                new_player = {
+                    "id": member.id,
+                    "username": member.name,
+                    "mlbb_id": mlbb_id,
+                    "mlbb_username": mlbb_username,
+                    "squad": squad_name,
+                    "role": role,
+                    "max_rank": "Unranked",
+                    "win_rate": "Unknown",
+                    "availability": "Not specified",
+                    "roles": {}
+                }
+                players.append(new_player)
+
+            if save_players(players):
+                embed = discord.Embed(
+                    title=f"Member Added to {squad_name}",
+                    description=f"{member.mention} has been added to the squad!",
+                    color=discord.Color.green())
+                player_info = existing_player if existing_player else new_player
+                embed.add_field(name="MLBB Username",
+                                value=player_info["mlbb_username"])
+                embed.add_field(name="MLBB ID", value=player_info["mlbb_id"])
+                embed.add_field(name="Role", value=role)
+                await ctx.send(embed=embed)
+            else:
+                await ctx.send("❌ Failed to add member due to an error!")
+
+    @commands.command(name="remove_member")
+    @commands.check(has_permission)
+    async def remove_member(self, ctx, squad_name: str, member: discord.Member):
+        """Remove a member from a squad."""
+        async with lock_for(ctx, players=[member.id], squads=[squad_name]):
+            players = load_players()
+
+            # Check if squad exists
+            if not find_squad_by_name(squad_name):
+                await ctx.send(f"❌ Squad '{squad_name}' not found!")
+                return
+
+            # Find player
+            player = next((p for p in players if p["id"] == member.id), None)
+            if not player:
+                await ctx.send(f"❌ {member.name} is not registered as a player!")
+                return
+
+            # Check if player is in specified squad
+            if player.get("squad", "").lower() != squad_name.lower():
+                await ctx.send(
+                    f"❌ {member.name} is not a member of squad '{squad_name}'!")
+                return
+
+            # Remove player from squad
+            player.pop("squad", None)
+            player.pop("role", None)
+
+            if save_players(players):
+                await ctx.send(
+                    f"✅ {member.mention} has been removed from squad '{squad_name}' and is now a free agent."
+                )
+            else:
+                await ctx.send("❌ Failed to remove member due to an error!")
+
+    @commands.command(name="update_member")
+    @commands.check(has_permission)
+    async def update_member(self, ctx, member: discord.Member, field: str, *,
+                            value: str):
+        """Update member information."""
+        # Moving to a squad also locks the squad, so it can't be deleted meanwhile
+        new_squad = [value] if field.lower() == "squad" else []
+        async with lock_for(ctx, players=[member.id], squads=new_squad):
+            players = load_players()
+
+            # Find player
+            player = next((p for p in players if p["id"] == member.id), None)
+            if not player:
+                await ctx.send(f"❌ {member.name} is not registered as a player!")
+                return
+
+            # Update field
+            valid_fields = ["mlbb_id", "mlbb_username", "role", "squad"]
+            if field.lower() not in valid_fields:
+                await ctx.send(
+                    f"❌ Invalid field! Valid fields are: {', '.join(valid_fields)}"
+                )
+                return
+
+            # If updating squad, check if it exists
+            if field.lower() == "squad" and value.lower() != "none":
+                if not find_squad_by_name(value):
+                    await ctx.send(f"❌ Squad '{value}' not found!")
+                    return
+
+            # Remove squad assignment if value is "none"
+            if field.lower() == "squad" and value.lower() == "none":
+                player.pop("squad", None)
+                player.pop("role", None)
+            else:
+                player[field.lower()] = value
+
+            if save_players(players):
+                await ctx.send(
+                    f"✅ Updated {field} for {member.mention} to '{value}'.")
+            else:
+                await ctx.send("❌ Failed to update member due to an error!")
+
+    @commands.command(name="add_members")
+    @commands.check(has_permission)
+    async def add_members(self, ctx, squad_name: str,
+                          members: commands.Greedy[discord.Member]):
+        """Add several registered players to a squad in one operation."""
+        squad = find_squad_by_name(squad_name)
+        if not squad:
+            await ctx.send(f"❌ Squad '{squad_name}' not found!")
+            return
+        if not members:
+            await ctx.send("❌ Mention at least one member!")
+            return
+
+        async with lock_for(ctx, players=[m.id for m in members],
+                            squads=[squad_name]):
+            result = {}
+
+            def mutate(players):
+                result["changed"], result["skipped"] = apply_membership(
+                    players, members, squad["name"])
+                return result["changed"]
+
+            _, saved = update_players(mutate)
+            await send_batch_summary(ctx, f"Members Added to {squad['name']}",
+                                     squad["name"], result["changed"],
+                                     result["skipped"], saved)
+
+    @commands.command(name="remove_members")
+    @commands.check(has_permission)
+    async def remove_members(self, ctx, squad_name: str,
+                             members: commands.Greedy[discord.Member]):
+        """Remove several players from a squad in one operation."""
+        squad = find_squad_by_name(squad_name)
+        if not squad:
+            await ctx.send(f"❌ Squad '{squad_name}' not found!")
+            return
+        if not members:
+            await ctx.send("❌ Mention at least one member!")
+            return
+
+        async with lock_for(ctx, players=[m.id for m in members],
+                            squads=[squad_name]):
+            result = {}
+
+            def mutate(players):
+                result["changed"], result["skipped"] = apply_membership(
+                    players, members, None, from_squad=squad["name"])
+                return result["changed"]
+
+            _, saved = update_players(mutate)
+            await send_batch_summary(ctx, f"Members Removed from {squad['name']}",
+                                     squad["name"], result["changed"],
+                                     result["skipped"], saved)
+
+    @commands.command(name="move_members")
+    @commands.check(has_permission)
+    async def move_members(self, ctx, from_squad: str, to_squad: str,
+                           members: commands.Greedy[discord.Member]):
+        """Move several players from one squad to another in one operation."""
+        source = find_squad_by_name(from_squad)
+        target = find_squad_by_name(to_squad)
+        if not source or not target:
+            missing = from_squad if not source else to_squad
+            await ctx.send(f"❌ Squad '{missing}' not found!")
+            return
+        if not members:
+            await ctx.send("❌ Mention at least one member!")
+            return
+
+        async with lock_for(ctx, players=[m.id for m in members],
+                            squads=[from_squad, to_squad]):
+            result = {}
+
+            def mutate(players):
+                result["changed"], result["skipped"] = apply_membership(
+                    players, members, target["name"], from_squad=source["name"])
+                return result["changed"]
+
+            _, saved = update_players(mutate)
+            await send_batch_summary(
+                ctx, f"Members Moved: {source['name']} → {target['name']}",
+                target["name"], result["changed"], result["skipped"], saved)
+
+    @commands.command(name="squad_clear")
+    @commands.check(has_permission)
+    async def squad_clear(self, ctx, *, squad_name: str):
+        """Remove every member from a squad in one operation."""
+        squad = find_squad_by_name(squad_name)
+        if not squad:
+            await ctx.send(f"❌ Squad '{squad_name}' not found!")
+            return
+
+        # Every current member is locked, as each of them is changed
+        async with lock_for(ctx, squads=[squad_name], members_of=squad_name):
+            target_name = squad["name"].lower()
+
+            def mutate(players):
+                changed = []
+                for player in players:
+                    if player.get("squad", "").lower() == target_name:
+                        player.pop("squad", None)
+                        player.pop("role", None)
+                        changed.append(
+                            f"<@{player['id']}> - {player['mlbb_username']}")
+                return changed
+
+            changed, saved = update_players(mutate)
+            await send_batch_summary(ctx, f"Squad Cleared: {squad['name']}",
+                                     squad["name"], changed, [], saved)
+
+    @commands.command(name="join_squad")
+    async def join_squad(self, ctx, *, squad_name: str):
+        """Request to join a squad. You must be registered first."""
+        # Find player
+        player = find_player_by_id(ctx.author.id)
+        if not player:
+            await ctx.send(
+                f"❌ You are not registered! Use `nb!register <mlbb_id> <mlbb_username>` first."
+            )
+            return
+
+        # Check if player is already in a squad
+        if "squad" in player and player["squad"]:
+            await ctx.send(
+                f"❌ You are already a member of the '{player['squad']}' squad! Leave it first with `nb!leave_squad`."
+            )
+            return
+
+        # Check if squad exists
+        squad = find_squad_by_name(squad_name)
+        if not squad:
+            await ctx.send(f"❌ Squad '{squad_name}' not found!")
+            return
+
+        # Queue the request for the next admin digest of this squad
+        guild_id = ctx.guild.id if ctx.guild else None
+        if not join_requests.submit(guild_id, ctx.channel.id, player,
+                                    squad["name"]):
+            await ctx.send(
+                f"⏳ You already have a pending request to join '{squad['name']}'!"
+            )
+            return
+
+        await ctx.send(
+            f"✅ Your request to join '{squad['name']}' has been submitted! An admin or moderator will review it."
+        )
+
+    @commands.command(name="leave_squad")
+    async def leave_squad(self, ctx):
+        """Leave your current squad."""
+        async with lock_for(ctx, players=[ctx.author.id]):
+            players = load_players()
+
+            # Find player
+            player = next((p for p in players if p["id"] == ctx.author.id),
+                          None)
+            if not player:
+                await ctx.send(
+                    f"❌ You are not registered! Use `nb!register` first.")
+                return
+
+            # Check if player is in a squad
+            if "squad" not in player or not player["squad"]:
+                await ctx.send(f"❌ You are not in any squad!")
+                return
+
+            # Store squad name for notification
+            squad_name = player["squad"]
+
+            # Remove from squad
+            player.pop("squad", None)
+            player.pop("role", None)
+
+            if save_players(players):
+                embed = discord.Embed(
+                    title=f"Squad Left",
+                    description=f"{ctx.author.mention} has left '{squad_name}'",
+                    color=discord.Color.orange())
+
+                embed.set_thumbnail(url=ctx.author.display_avatar.url)
+                await ctx.send(embed=embed)
+            else:
+                await ctx.send("❌ Failed to leave squad due to an error!")
+
+    @commands.command(name="squads")
+    async def list_squads(self, ctx, page: int = 1):
+        """List all available squads, a page at a time."""
+        def build_embed():
+            squads, total = squads_page(page, SQUADS_PER_PAGE)
+            if not total:
+                return None
+            pages = -(-total // SQUADS_PER_PAGE)
+
+            embed = discord.Embed(
+                title="MLBB Squads List",
+                description=f"There are {total} squads registered:",
+                color=discord.Color.blue())
+            if not squads:
+                embed.description = (f"There are {total} squads registered, "
+                                     f"on {pages} page(s).")
+
+            for squad, member_count in squads:
+                embed.add_field(
+                    name=squad["name"],
+                    value=f"{squad['description']}\nMembers: {member_count}",
+                    inline=False)
+
+            embed.set_footer(text=f"Page {max(page, 1)}/{pages} - "
+                                  f"nb!squads <page> for more, "
+                                  f"nb!squad_info <name> for details")
+            return embed
+
+        # Identical concurrent requests share one query, run off the event loop
+        embed = await read_flights.do(flight_key(ctx, page),
+                                      lambda: asyncio.to_thread(build_embed),
+                                      version=data_version())
+        if embed is None:
+            await ctx.send("No squads have been created yet!")
+            return
+        await ctx.send(embed=embed)
+
+    @commands.command(name="squad_info")
+    async def squad_info(self, ctx, *, name: str):
+        """Show details about a squad including all members."""
+        store = snapshot()
+
+        def build_embed():
+            # Find the squad
+            squad = store.squad(name)
+            if not squad:
+                return None
+
+            # Find squad members
+            members = store.squad_members(name)
+
+            # Create embed
+            embed = discord.Embed(title=f"Squad: {squad['name']}",
+                                  description=squad["description"],
+                                  color=discord.Color.blue())
+
+            # Add members
+            if members:
+                member_text = ""
+                for member in members:
+                    mention = f"<@{member['id']}>"
+                    role = member.get("role", "Member")
+                    member_text += f"• {mention} - {member['mlbb_username']} (ID: {member['mlbb_id']}) - {role}\n"
+
+                embed.add_field(name=f"Members ({len(members)})",
+                                value=member_text,
+                                inline=False)
+            else:
+                embed.add_field(name="Members",
+                                value="No members yet",
+                                inline=False)
+            return embed
+
+        async def compute():
+            embed = await asyncio.to_thread(build_embed)
+            if embed is None:
+                return None
+
+            # Add squad stats from the incrementally maintained aggregates,
+            # on the event loop where the indexes are updated
+            squad = store.squad(name)
+            if store.squad_members(name):
+                embed.add_field(
+                    name="Squad Stats",
+                    value=format_squad_stats(get_index("stats").squad(squad["name"])),
+                    inline=False)
+
+            # Add creation info
+            created_by = await member_cache.resolve(ctx.guild, squad["created_by"])
+            creator = created_by.name if created_by else "Unknown"
+            embed.set_footer(text=f"Created by {creator}")
+            return embed
+
+        # Identical concurrent requests share one lookup and member resolve
+        embed = await read_flights.do(flight_key(ctx, name.lower()), compute,
+                                      version=store.version)
+        if embed is None:
+            await ctx.send(f"❌ Squad '{name}' not found!")
+            return
+        await ctx.send(embed=embed)
+
+    @commands.command(name="squad_stats")
+    async def squad_stats(self, ctx, *, name: str):
+        """Show aggregate stats for a squad."""
+        squad = find_squad_by_name(name)
+        if not squad:
+            await ctx.send(f"❌ Squad '{name}' not found!")
+            return
+
+        aggregate = get_index("stats").squad(squad["name"])
+        embed = discord.Embed(title=f"Squad Stats: {squad['name']}",
+                              description=format_squad_stats(aggregate),
+                              color=discord.Color.blue())
+        if aggregate:
+            embed.set_footer(text=f"{aggregate.members} members")
+        await ctx.send(embed=embed)
+
+    @commands.command(name="free_agents")
+    async def list_free_agents(self, ctx, page: int = 1):
+        """List players without squads, a page at a time."""
+        free_agents, total = await asyncio.to_thread(
+            free_agents_page, page, FREE_AGENTS_PER_PAGE)
+
+        if not total:
+            await ctx.send("There are no free agents at the moment!")
+            return
+        pages = -(-total // FREE_AGENTS_PER_PAGE)
+
+        embed = discord.Embed(
+            title="MLBB Free Agents",
+            description=f"There are {total} players without squads:",
+            color=discord.Color.blue())
+        if not free_agents:
+            embed.description = (f"There are {total} players without squads, "
+                                 f"on {pages} page(s).")
+
+        for player in free_agents:
+            mention = f"<@{player['id']}>"
+
+            embed.add_field(
+                name=player["mlbb_username"],
+                value=f"Discord: {mention}\nID: {player['mlbb_id']}",
+                inline=True)
+
+        embed.set_footer(text=f"Page {max(page, 1)}/{pages} - "
+                              f"nb!free_agents <page> for more")
+        await ctx.send(embed=embed)
+
+    @commands.command(name="need_add")
+    async def need_add(self, ctx, squad_name: str, role: str, *, requirements: str = ""):
+        """Register a role a squad needs, with optional min rank and schedule."""
+        squad = find_squad_by_name(squad_name)
+        if not squad:
+            await ctx.send(f"❌ Squad '{squad_name}' not found!")
+            return
+        if not await can_manage_squad(ctx, squad):
+            await ctx.send("❌ Only admins or the squad's creator can manage its needs!")
+            return
+
+        role = role.lower()
+        if role not in ROLES:
+            await ctx.send(f"❌ Invalid role! Valid roles are: {', '.join(ROLES)}")
+            return
+
+        rank_text, _, availability = requirements.partition(";")
+        min_rank = None
+        if rank_text.strip():
+            min_rank = parse_rank(rank_text)
+            if min_rank is None:
+                await ctx.send(f"❌ Couldn't understand rank '{rank_text.strip()}'!")
+                return
+        availability = availability.strip() or None
+        if availability and parse_availability(availability) is None:
+            await ctx.send(f"❌ Couldn't understand schedule '{availability}'!")
+            return
+
+        guild_id = ctx.guild.id if ctx.guild else None
+        need = need_board.add(guild_id, squad["name"], role, ctx.author.id,
+                              ctx.channel.id, min_rank=min_rank,
+                              availability=availability)
+        if need is None:
+            await ctx.send("❌ Failed to save the need due to an error!")
+            return
+
+        embed = discord.Embed(
+            title=f"📣 {squad['name']} is looking for: {format_need(need)}",
+            description=f"Need #{need['id']} - free agents who match will be "
+                        f"notified as they register or update their profile.",
+            color=discord.Color.green())
+        matches = need_board.find_players(guild_id, need)
+        if matches:
+            embed.add_field(
+                name=f"Free agents matching now ({len(matches)})",
+                value="\n".join(f"<@{p['id']}> - {p['mlbb_username']} "
+                                f"({p.get('max_rank', 'Unranked')})"
+                                for p in matches),
+                inline=False)
+        await ctx.send(embed=embed)
+
+    @commands.command(name="needs")
+    async def list_needs(self, ctx, *, squad_name: str = None):
+        """List the roles squads are looking for."""
+        needs = need_board.needs(ctx.guild.id if ctx.guild else None, squad_name)
+        if not needs:
+            await ctx.send("No squads are looking for players right now!")
+            return
+
+        embed = discord.Embed(
+            title="📣 Open Squad Needs",
+            description="\n".join(f"**#{n['id']}** {n['squad']} - {format_need(n)}"
+                                  for n in needs[:40]),
+            color=discord.Color.blue())
+        embed.set_footer(text="Use nb!join_squad <name> to request to join")
+        await ctx.send(embed=embed)
+
+    @commands.command(name="need_remove")
+    async def need_remove(self, ctx, need_id: int):
+        """Remove an open squad need."""
+        guild_id = ctx.guild.id if ctx.guild else None
+        need = next((n for n in need_board.needs(guild_id) if n["id"] == need_id),
+                    None)
+        if need is None:
+            await ctx.send(f"❌ Need #{need_id} not found!")
+            return
+        squad = find_squad_by_name(need["squad"]) or {"created_by": need["created_by"]}
+        if not await can_manage_squad(ctx, squad):
+            await ctx.send("❌ Only admins or the squad's creator can manage its needs!")
+            return
+
+        if need_board.remove(guild_id, need_id):
+            await ctx.send(f"✅ Need #{need_id} ({need['squad']} - "
+                           f"{format_need(need)}) removed.")
+        else:
+            await ctx.send("❌ Failed to remove the need due to an error!")
+
+
+async def setup(bot):
+    await bot.add_cog(Squads(bot))
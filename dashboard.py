@@ -0,0 +1,147 @@
+# Web dashboard, rendered once per data version and served precompressed
+import sys
+import gzip
+import inspect
+import hashlib
+import logging
+import importlib
+import threading
+from flask import render_template
+from db import snapshot, use_guild, reset_guild, stored_guilds
+from utils import has_permission
+from cogs import COGS, cog_extension
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Section of the commands defined outside of the cogs (help, reload)
+CORE_SECTION = "General"
+# Pages smaller than this are not worth compressing
+MIN_GZIP_BYTES = 512
+
+
+def _is_admin_only(command):
+    return any(inspect.unwrap(check) is has_permission
+               for check in command.checks)
+
+
+def _cog_module(name):
+    """Return the module of a cog, importing it if it isn't loaded.
+
+    Importing doesn't register the cog with the bot, so lazily loaded cogs
+    still load on first use.
+    """
+    module = sys.modules.get(cog_extension(name))
+    if module is None:
+        module = importlib.import_module(cog_extension(name))
+    return module
+
+
+def _describe(command, prefix):
+    return {
+        "usage": f"{prefix}{command.qualified_name} {command.signature}".rstrip(),
+        "help": command.short_doc,
+        "admin": _is_admin_only(command),
+    }
+
+
+def command_sections(bot):
+    """Return the command reference, one section per cog, from the commands'
+    own names, signatures and docstrings."""
+    prefix = bot.command_prefix if isinstance(bot.command_prefix, str) else "nb!"
+    core = sorted((c for c in list(bot.commands) if c.cog is None and not c.hidden),
+                  key=lambda c: c.name)
+    sections = [{"title": CORE_SECTION, "description": "Help and maintenance.",
+                 "commands": [_describe(c, prefix) for c in core]}]
+    for name in COGS:
+        try:
+            cog = getattr(_cog_module(name), COGS[name])
+        except Exception as e:
+            logger.error(f"Can't list the commands of {cog_extension(name)}: {e}")
+            continue
+        sections.append({
+            "title": cog.__cog_name__,
+            "description": cog.__cog_description__,
+            "commands": [_describe(c, prefix) for c in cog.__cog_commands__
+                         if not c.hidden],
+        })
+    return sections
+
+
+def _commands_version():
+    """Identify the cog modules, which are replaced when a cog is reloaded."""
+    version = []
+    for name in COGS:
+        try:
+            version.append(id(_cog_module(name)))
+        except Exception:
+            version.append(None)
+    return tuple(version)
+
+
+class Dashboard:
+    """The rendered dashboard of each guild (None for the shared data).
+
+    A page is rendered the first time it is asked for at a store version
+    and command set, then served from memory as-is or gzipped, with a strong
+    ETag per encoding.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pages = {}  # guild id -> page
+        self.renders = 0
+        self.hits = 0
+
+    def _render(self, bot, state):
+        html = render_template(
+            "index.html",
+            sections=command_sections(bot),
+            squads=len(state.squads),
+            players=len(state.players),
+            free_agents=len(state.free_agents()),
+        ).encode()
+        etag = hashlib.sha256(html).hexdigest()[:32]
+        compressed = (gzip.compress(html, compresslevel=9, mtime=0)
+                      if len(html) >= MIN_GZIP_BYTES else None)
+        return {"body": html, "gzip": compressed, "etag": etag}
+
+    def page(self, bot, guild_id=None):
+        """Return {"body", "gzip", "etag"} of a guild's dashboard, or None if
+        the guild has no data.
+
+        "gzip" is None when the page is too small to be worth compressing.
+        """
+        if guild_id is not None and guild_id not in stored_guilds():
+            return None
+        token = use_guild(guild_id, create=False)
+        try:
+            state = snapshot()
+        finally:
+            reset_guild(token)
+        key = (state.version, _commands_version())
+
+        page = self._pages.get(guild_id)
+        if page is not None and page["key"] == key:
+            self.hits += 1
+            return page
+        # Render outside the lock, the worst case is rendering a page twice
+        page = self._render(bot, state)
+        page["key"] = key
+        with self._lock:
+            self._pages[guild_id] = page
+            self.renders += 1
+        logger.debug(f"Rendered the dashboard of {guild_id or 'the shared data'} "
+                     f"at version {state.version}: {len(page['body'])} bytes")
+        return page
+
+    def stats(self):
+        return {
+            "pages": len(self._pages),
+            "renders": self.renders,
+            "hits": self.hits,
+        }
+
+
+# Dashboard pages served by the web app
+dashboard = Dashboard()
@@ -1,7 +1,27 @@
 # Database operations for the bot
 import os
+import sys
 import json
+import copy
+import time
+import random
+import struct
+import marshal
+import hashlib
 import logging
+import threading
+import contextvars
+from datetime import datetime, timezone
+from contextlib import contextmanager
+from collections import OrderedDict
+from records import PLAYER_DEFAULTS, player_record, squad_record
+from playerfile import PlayerFile, write_players, read_players
+from sqlstore import SqlStore
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking is available
+    fcntl = None
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -10,32 +30,530 @@ logger = logging.getLogger(__name__)
 DATA_DIR = "data"
 SQUADS_FILE = os.path.join(DATA_DIR, "squads.json")
 PLAYERS_FILE = os.path.join(DATA_DIR, "players.json")
+SNAPSHOT_FILE = os.path.join(DATA_DIR, "store.snapshot")
+GUILDS_DIR = os.path.join(DATA_DIR, "guilds")
+
+# Per-guild partitioning. When disabled every guild shares the files in
+# DATA_DIR. When enabled each guild gets its own directory under GUILDS_DIR,
+# and the guild named by NB_LEGACY_GUILD_ID is seeded from the shared files.
+PARTITION_BY_GUILD = os.getenv("NB_PARTITION_BY_GUILD", "0") == "1"
+LEGACY_GUILD_ID = int(os.getenv("NB_LEGACY_GUILD_ID", "0")) or None
+# Players file format: "json" (one JSON array) or "ndjson" (one record per
+# line plus an id index, so single players can be read without loading all).
+# "sql" keeps squads and players in the database at DATABASE_URL instead, so
+# several processes can share them; other documents stay in DATA_DIR.
+STORE_FORMAT = os.getenv("NB_STORE_FORMAT", "json").lower()
+# Approximate memory budget for loaded partitions, in bytes
+PARTITION_MEMORY_BUDGET = int(
+    os.getenv("NB_PARTITION_MEMORY_BUDGET", str(256 * 1024 * 1024)))
+# Rough ratio between in-memory size and JSON size of a partition
+MEMORY_PER_JSON_BYTE = 4
+# Rough in-memory size of a record, for partitions without files (SQL)
+MEMORY_PER_RECORD = 1024
+
+# Attempts at a compare-and-swap write before giving up, and the base
+# backoff between attempts in seconds
+CAS_RETRIES = 10
+CAS_BACKOFF = 0.002
+
+# Binary snapshot header: magic, format version, marshal version,
+# python major/minor, then a sha256 of the payload.
+SNAPSHOT_MAGIC = b"NBSNAP"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct("<6sHHBB32s")
+
+# Version of the on-disk player schema, recorded per partition in the
+# "schema" document once its players file has been migrated
+SCHEMA_VERSION = 1
+SCHEMA_DOCUMENT = "schema"
+
+
+# Secondary index factories, {name: factory}, see register_index()
+_index_factories = {}
+
+# Functions called with (guild_id, changes) after players are saved
+_change_listeners = []
+
+
+class _StoreState:
+    """Immutable, versioned snapshot of a partition's data with indexes.
+
+    Records are read-only slotted records (see records.py) and the
+    containers are tuples, so a snapshot never changes once published: readers just take the current
+    one, without locking, and keep using it while writers publish newer
+    snapshots. Writers build the next snapshot with evolve(), which shares
+    every unchanged record and lookup table with the previous one.
+    """
+
+    def __init__(self, squads, players, sources, version, indexes=None):
+        self.squads = tuple(squad_record(s) for s in squads)
+        self.players = tuple(player_record(p) for p in players)
+        # File signatures the state was built from, {path: [mtime_ns, size]}
+        self.sources = sources
+        # Store version the state was read at, bumped by every write
+        self.version = version
+        self.players_by_id = {p["id"]: p for p in self.players}
+        self.squads_by_name = {s["name"].lower(): s for s in self.squads
+                               if "name" in s}
+        self.players_by_squad = {}
+        for player in self.players:
+            squad = player["squad"].lower()
+            if squad:
+                self.players_by_squad[squad] = (
+                    self.players_by_squad.get(squad, ()) + (player,))
+        # Secondary indexes, built on first use and carried over to the next
+        # snapshot. Saves update them in place only on the thread that built
+        # them (the bot's event loop, which reads them without locking);
+        # saves on other threads and reloads after another process wrote
+        # start over with new ones, so indexes never change under a reader.
+        self.indexes = indexes if indexes is not None else {}
+        self.index_thread = None
+
+    def evolve(self, sources, version, squads=None, players=None):
+        """Return the next snapshot, sharing everything that didn't change.
+
+        Returns (state, changes) where changes lists the (old, new) player
+        records that were added, changed or removed.
+        """
+        state = copy.copy(self)
+        state.sources = sources
+        state.version = version
+        changes = []
+
+        if squads is not None:
+            state.squads = tuple(
+                _reuse(self.squads_by_name.get(s.get("name", "").lower()),
+                       squad_record(s))
+                for s in squads)
+            state.squads_by_name = {s["name"].lower(): s for s in state.squads
+                                    if "name" in s}
+
+        if players is not None:
+            state.players = tuple(
+                _reuse(self.players_by_id.get(p["id"]), player_record(p))
+                for p in players)
+            changes = _diff_players(self.players_by_id, state.players)
+            if changes:
+                state.players_by_id = dict(self.players_by_id)
+                state.players_by_squad = dict(self.players_by_squad)
+                for old, new in changes:
+                    state._replace(old, new)
+                if self.index_thread == threading.get_ident():
+                    _update_indexes(self.indexes, changes)
+                elif self.indexes:
+                    state.indexes, state.index_thread = {}, None
+        return state, changes
+
+    def _replace(self, old, new):
+        """Swap one player record in the (already copied) lookup tables.
+
+        Records keep their position, so lookups list players in the same
+        order as a full rebuild would.
+        """
+        if new is None:
+            del self.players_by_id[old["id"]]
+        else:
+            self.players_by_id[new["id"]] = new
+
+        old_squad = old["squad"].lower() if old is not None else ""
+        new_squad = new["squad"].lower() if new is not None else ""
+        if old_squad and old_squad == new_squad:
+            self.players_by_squad[old_squad] = tuple(
+                new if m["id"] == new["id"] else m
+                for m in self.players_by_squad[old_squad])
+            return
+        if old_squad:
+            members = tuple(m for m in self.players_by_squad[old_squad]
+                            if m["id"] != old["id"])
+            if members:
+                self.players_by_squad[old_squad] = members
+            else:
+                del self.players_by_squad[old_squad]
+        if new_squad:
+            self.players_by_squad[new_squad] = (
+                self.players_by_squad.get(new_squad, ()) + (new,))
+
+    def player(self, player_id):
+        """Return a read-only player record, or None."""
+        return self.players_by_id.get(player_id)
+
+    def squad(self, name):
+        """Return a read-only squad record by name (case-insensitive)."""
+        return self.squads_by_name.get(name.lower())
+
+    def squad_members(self, name):
+        """Return the read-only records of a squad's members."""
+        return self.players_by_squad.get(name.lower(), ())
+
+    def free_agents(self):
+        """Return the read-only records of players without a squad."""
+        return tuple(p for p in self.players if not p["squad"].strip())
+
+    def index(self, name):
+        """Return a secondary index, building it on first use."""
+        index = self.indexes.get(name)
+        if index is None:
+            index = _index_factories[name]()
+            for player in self.players:
+                index.add(player)
+            # Another thread may have built it meanwhile; keep the first one
+            index = self.indexes.setdefault(name, index)
+            if self.index_thread is None:
+                self.index_thread = threading.get_ident()
+        return index
+
+    def estimated_bytes(self):
+        """Estimate the memory held by this state from its file sizes."""
+        if "sql" in self.sources:
+            return (len(self.players) + len(self.squads)) * MEMORY_PER_RECORD
+        size = sum(sig[1] for sig in self.sources.values() if sig)
+        return size * MEMORY_PER_JSON_BYTE
+
+
+class _Partition:
+    """Data files for one guild (or the shared root) and their cached state."""
+
+    def __init__(self, key, data_dir):
+        self.key = key
+        self.data_dir = data_dir
+        self.squads_file = os.path.join(data_dir, "squads.json")
+        self.players_file = os.path.join(
+            data_dir, "players.ndjson" if STORE_FORMAT == "ndjson"
+            else "players.json")
+        self.snapshot_file = os.path.join(data_dir, "store.snapshot")
+        self.version_file = os.path.join(data_dir, "store.version")
+        self.lock_file = os.path.join(data_dir, ".store.lock")
+        self.state = None
+        # Whether the players file is known to be on SCHEMA_VERSION
+        self.schema_checked = False
+        # On-demand reader of an NDJSON players file, see _player_reader()
+        self.player_reader = None
+        # Serializes writers within this process; fcntl covers other processes
+        self.write_lock = threading.Lock()
+        # Serializes reloads after another process changed the files
+        self.load_lock = threading.Lock()
+
+    def sources(self):
+        """Return the signatures of the files backing this partition."""
+        if STORE_FORMAT == "sql":
+            return {"sql": _sql_store().version(self.key or 0)}
+        return {
+            self.squads_file: _file_signature(self.squads_file),
+            self.players_file: _file_signature(self.players_file),
+            self.version_file: _file_signature(self.version_file),
+        }
+
+
+class _RecordList(list):
+    """A list of loaded records that remembers the store version it came from.
+
+    save_players()/save_squads() use this to detect that the store changed
+    since the records were loaded and merge instead of overwriting.
+    """
+
+    def __init__(self, records, version, base):
+        super().__init__(records)
+        self.version = version
+        # Records as loaded, {key: record}
+        self.base = base
+
+
+# Shared partition in DATA_DIR, used when partitioning is off or outside guilds
+_root = _Partition(None, DATA_DIR)
+# Guild partitions in least-recently-used order
+_partitions = OrderedDict()
+_partitions_lock = threading.Lock()
+# Guild the current command runs in, set by use_guild()
+_current_guild = contextvars.ContextVar("current_guild", default=None)
+# Whether store calls in the current context may create a guild's partition
+_create_partitions = contextvars.ContextVar("create_partitions", default=True)
+# Database of the "sql" store format, see _sql_store()
+_sql = None
+_sql_lock = threading.Lock()
+
+
+def _sql_store():
+    """Return the database of the "sql" store format, connecting once."""
+    global _sql
+    if _sql is None:
+        with _sql_lock:
+            if _sql is None:
+                _sql = SqlStore()
+                logger.info(f"Using the {_sql.engine.dialect.name} database "
+                            f"for squads and players")
+    return _sql
+
+
+def register_index(name, factory):
+    """Register a secondary index kept for every store partition.
+
+    `factory()` must return an object with add(player) and remove(player)
+    methods. The index is filled from all players on first use and then
+    updated only for the players that change when players are saved, or
+    built again after saves on another thread or by another process.
+    """
+    _index_factories[name] = factory
+
+
+def add_change_listener(listener):
+    """Call listener(guild_id, changes) after players are saved.
+
+    `changes` lists (old, new) read-only player records; old is None for new
+    players and new is None for removed ones. Only saves made by this
+    process are reported. Listeners run in the saving thread and should
+    return quickly.
+    """
+    _change_listeners.append(listener)
+
+
+def get_index(name):
+    """Return a registered secondary index for the current partition."""
+    return _get_store().index(name)
+
+
+def use_guild(guild_id, create=True):
+    """Route store calls in the current context to a guild's partition.
+
+    With create=False the partition is only read, e.g. for web requests: a
+    guild without stored data raises LookupError instead of getting a new
+    partition, and no files are created or migrated. Returns a token that
+    can be passed to reset_guild().
+    """
+    return (_current_guild.set(guild_id), _create_partitions.set(create))
+
+
+def reset_guild(token):
+    """Restore the guild routing saved by use_guild()."""
+    guild_token, create_token = token
+    _create_partitions.reset(create_token)
+    _current_guild.reset(guild_token)
+
+
+def _ensure_files(partition):
+    """Ensure that a partition's directory and files exist."""
+    # Create data directory if it doesn't exist
+    if not os.path.exists(partition.data_dir):
+        os.makedirs(partition.data_dir)
+        logger.debug(f"Created directory: {partition.data_dir}")
+
+    # Seed the legacy guild from the shared files the first time it is used
+    seed = (partition.key is not None and partition.key == LEGACY_GUILD_ID)
+    squads_seed = SQUADS_FILE if seed else None
+    players_seed = PLAYERS_FILE if seed else None
+    if STORE_FORMAT == "ndjson":
+        # Convert the partition's JSON players file the first time
+        json_players = os.path.join(partition.data_dir, "players.json")
+        if os.path.exists(json_players):
+            players_seed = json_players
+
+    if STORE_FORMAT == "sql":
+        _seed_sql(partition, squads_seed or partition.squads_file,
+                  players_seed or partition.players_file)
+        return
+
+    for path, seed_path in ((partition.squads_file, squads_seed),
+                            (partition.players_file, players_seed)):
+        if os.path.exists(path):
+            continue
+        data = []
+        if seed_path and os.path.exists(seed_path):
+            with open(seed_path, 'r') as f:
+                data = json.load(f)
+            if path == partition.players_file:
+                data = [_normalize_player(p) for p in data]
+            logger.info(f"Seeded {path} from {seed_path}")
+        _write_data(partition, path, data)
+        logger.debug(f"Created file: {path}")
+
+
+def _seed_sql(partition, squads_path, players_path):
+    """Import a partition's JSON files into an empty database, once."""
+    if _read_version(partition) != 0:
+        return
+    data = {}
+    for field, path in (("squads", squads_path), ("players", players_path)):
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                data[field] = json.load(f)
+    if not data:
+        return
+    squads = data.get("squads", [])
+    players = [player_record(_normalize_player(p))
+               for p in data.get("players", [])]
+    if (_compare_and_write(partition, partition.squads_file, squads, 0)
+            is None
+            or _compare_and_write(partition, partition.players_file,
+                                  players, 1) is None):
+        # Another process is seeding the same partition
+        return
+    logger.info(f"Imported {len(squads)} squads and {len(players)} players "
+                f"from {partition.data_dir} into the database")
 
 
 def ensure_data_files_exist():
     """Ensure that the data directory and files exist."""
-    # Create data directory if it doesn't exist
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-        logger.debug(f"Created directory: {DATA_DIR}")
+    _ensure_files(_root)
 
-    # Create squads file if it doesn't exist
-    if not os.path.exists(SQUADS_FILE):
-        with open(SQUADS_FILE, 'w') as f:
-            json.dump([], f)
-        logger.debug(f"Created file: {SQUADS_FILE}")
 
-    # Create players file if it doesn't exist
-    if not os.path.exists(PLAYERS_FILE):
-        with open(PLAYERS_FILE, 'w') as f:
-            json.dump([], f)
-        logger.debug(f"Created file: {PLAYERS_FILE}")
+def _current_partition():
+    """Return the partition for the guild of the current context."""
+    guild_id = _current_guild.get()
+    if not PARTITION_BY_GUILD or guild_id is None:
+        if not _root.schema_checked:
+            _migrate_schema(_root)
+        return _root
 
+    create = _create_partitions.get()
+    if (not create and guild_id not in _partitions
+            and guild_id not in stored_guilds()):
+        raise LookupError(f"Guild {guild_id} has no stored data")
+    with _partitions_lock:
+        partition = _partitions.get(guild_id)
+        if partition is None:
+            partition = _Partition(
+                guild_id, os.path.join(GUILDS_DIR, str(guild_id)))
+            _partitions[guild_id] = partition
+        _partitions.move_to_end(guild_id)
+
+    if not create:
+        return partition
+    if partition.state is None:
+        _ensure_files(partition)
+    if not partition.schema_checked:
+        _migrate_schema(partition)
+    return partition
+
+
+def _migrate_schema(partition):
+    """Rewrite a partition's players file in the current schema, once.
+
+    Older files may lack optional fields, which used to be filled in on
+    every load. The migration stores them normalized and records the schema
+    version, so later loads read the players as they are.
+    """
+    if STORE_FORMAT == "sql":
+        # Database rows are always written normalized
+        partition.schema_checked = True
+        return
+    path = _document_path(partition, SCHEMA_DOCUMENT)
+    schema = _read_document(path, default={})
+    if schema.get("version", 0) >= SCHEMA_VERSION:
+        partition.schema_checked = True
+        return
+
+    for _ in range(CAS_RETRIES):
+        version = _read_version(partition)
+        try:
+            players = [_normalize_player(p)
+                       for p in _read_players_file(partition)]
+        except FileNotFoundError:
+            # Nothing stored yet: new files are written in the current schema
+            partition.schema_checked = True
+            return
+        except Exception as e:
+            logger.error(f"Can't migrate {partition.players_file}: {e}")
+            return
+        if _compare_and_write(partition, partition.players_file, players,
+                              version) is not None:
+            break
+    else:
+        logger.error(f"Gave up migrating {partition.players_file}")
+        return
 
-def load_squads():
-    """Load squads data from JSON file."""
     try:
-        with open(SQUADS_FILE, 'r') as f:
+        with _write_locked(partition):
+            _write_json(path, {
+                "version": SCHEMA_VERSION,
+                "migrated_at": datetime.now(timezone.utc).isoformat(),
+            })
+    except Exception as e:
+        logger.error(f"Error saving {path}: {e}")
+        return
+    partition.schema_checked = True
+    logger.info(f"Migrated {len(players)} players in {partition.data_dir} "
+                f"to schema v{SCHEMA_VERSION}")
+
+
+def _evict_cold_partitions():
+    """Drop the state of least recently used partitions over the budget."""
+    with _partitions_lock:
+        loaded = [p for p in _partitions.values() if p.state is not None]
+        total = sum(p.state.estimated_bytes() for p in loaded)
+        # Never evict the most recently used partition
+        for partition in loaded[:-1]:
+            if total <= PARTITION_MEMORY_BUDGET:
+                break
+            total -= partition.state.estimated_bytes()
+            partition.state = None
+            logger.debug(f"Evicted partition for guild {partition.key}")
+
+
+def evict_guild(guild_id):
+    """Forget the cached partition of a guild, e.g. when the bot leaves it."""
+    with _partitions_lock:
+        _partitions.pop(guild_id, None)
+
+
+def loaded_partitions():
+    """Return {guild_id: estimated_bytes} for partitions held in memory."""
+    with _partitions_lock:
+        return {p.key: p.state.estimated_bytes()
+                for p in _partitions.values() if p.state is not None}
+
+
+def stored_guilds():
+    """Return the guild ids with a partition on disk (None for the shared one)."""
+    guilds = [None]
+    if PARTITION_BY_GUILD and STORE_FORMAT == "sql":
+        guilds.extend(g for g in _sql_store().guilds() if g)
+    elif PARTITION_BY_GUILD and os.path.isdir(GUILDS_DIR):
+        guilds.extend(int(name) for name in sorted(os.listdir(GUILDS_DIR))
+                      if name.isdigit())
+    return guilds
+
+
+def partition_dir():
+    """Return the data directory of the current context's partition."""
+    return _current_partition().data_dir
+
+
+def _file_signature(path):
+    """Return [mtime_ns, size] for a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _reuse(old, record):
+    """Return the existing record if it is unchanged, else the new one."""
+    if old is not None and old == record:
+        return old
+    return record
+
+
+def _normalize_player(player):
+    """Fill in default values for missing player fields."""
+    for field, default in PLAYER_DEFAULTS.items():
+        if field not in player:
+            player[field] = default
+    if "roles" not in player:
+        player["roles"] = {}
+    return player
+
+
+def _copy_player(player):
+    """Return a copy of a stored player that callers may mutate."""
+    record = dict(player)
+    record["roles"] = dict(player.get("roles") or {})
+    return record
+
+
+def _read_json_squads(partition):
+    """Read squads from the JSON file."""
+    try:
+        with open(partition.squads_file, 'r') as f:
             squads = json.load(f)
             # Ensure each squad has required fields (example for future expansion)
             for squad in squads:
@@ -47,106 +565,591 @@ def load_squads():
         return []
 
 
+def _read_players_file(partition):
+    """Read all players from the partition's players file."""
+    if STORE_FORMAT == "ndjson":
+        return read_players(partition.players_file)
+    with open(partition.players_file, 'r') as f:
+        return json.load(f)
+
+
+def _read_json_players(partition):
+    """Read players from the players file."""
+    try:
+        return _read_players_file(partition)
+    except Exception as e:
+        logger.error(f"Error loading players: {e}")
+        return []
+
+
+def _read_snapshot(partition, sources):
+    """Load the store from the binary snapshot if it matches the JSON files.
+
+    Returns None when the snapshot is missing, stale, corrupt or was written
+    by an incompatible interpreter.
+    """
+    try:
+        with open(partition.snapshot_file, 'rb') as f:
+            blob = f.read()
+    except OSError:
+        return None
+
+    try:
+        magic, version, marshal_version, major, minor, digest = (
+            SNAPSHOT_HEADER.unpack_from(blob))
+    except struct.error:
+        logger.warning("Snapshot header is truncated, ignoring snapshot")
+        return None
+
+    if (magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION
+            or marshal_version != marshal.version
+            or (major, minor) != sys.version_info[:2]):
+        logger.info("Snapshot format is incompatible, ignoring snapshot")
+        return None
+
+    payload = blob[SNAPSHOT_HEADER.size:]
+    if hashlib.sha256(payload).digest() != digest:
+        logger.warning("Snapshot checksum mismatch, ignoring snapshot")
+        return None
+
+    try:
+        data = marshal.loads(payload)
+    except (EOFError, ValueError, TypeError) as e:
+        logger.warning(f"Snapshot payload is corrupt: {e}")
+        return None
+
+    if data.get("sources") != sources:
+        logger.debug("Snapshot is stale, falling back to JSON")
+        return None
+    return _StoreState(data["squads"], data["players"], sources,
+                       data["version"])
+
+
+def _write_snapshot(partition, state):
+    """Write the store state to the binary snapshot file."""
+    if STORE_FORMAT == "sql":
+        # The database is the only copy, so it can't get out of sync
+        return
+    payload = marshal.dumps({
+        "sources": state.sources,
+        "version": state.version,
+        "squads": [dict(s) for s in state.squads],
+        "players": [_copy_player(p) for p in state.players],
+    })
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                                  marshal.version, *sys.version_info[:2],
+                                  hashlib.sha256(payload).digest())
+    try:
+        tmp_path = f"{partition.snapshot_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(payload)
+        os.replace(tmp_path, partition.snapshot_file)
+    except Exception as e:
+        logger.error(f"Error writing snapshot: {e}")
+
+
+def _load_store(partition, sources):
+    """Build the store state, preferring the snapshot over the JSON files.
+
+    Returns a (state, source) tuple where source is "snapshot" or the
+    players file format ("json" or "ndjson").
+    """
+    if STORE_FORMAT == "sql":
+        # Squads, players and version as of one consistent point
+        version, squads, players = _sql_store().read_all(partition.key or 0)
+        return _StoreState(squads, players, {"sql": version}, version), "sql"
+
+    state = _read_snapshot(partition, sources)
+    if state is not None:
+        return state, "snapshot"
+
+    state = _StoreState(_read_json_squads(partition),
+                        _read_json_players(partition), sources,
+                        _read_version(partition))
+    if all(sources.values()):
+        _write_snapshot(partition, state)
+    return state, STORE_FORMAT
+
+
+def _set_state(partition, state):
+    """Install a new state for a partition and keep memory within budget."""
+    partition.state = state
+    if partition is not _root:
+        _evict_cold_partitions()
+    return state
+
+
+def _get_store():
+    """Return the current store state, reloading it if the files changed."""
+    partition = _current_partition()
+    sources = partition.sources()
+    previous = partition.state
+    if previous is not None and previous.sources == sources:
+        return previous
+
+    with partition.load_lock:
+        # Another thread may have reloaded while we waited
+        sources = partition.sources()
+        previous = partition.state
+        if previous is not None and previous.sources == sources:
+            return previous
+        # The new state builds its own indexes; the previous state's are left
+        # alone, as other threads may be reading them
+        state, _ = _load_store(partition, sources)
+        return _set_state(partition, state)
+
+
+def warm_start():
+    """Load the store ahead of the first command and report how long it took.
+
+    Guild partitions are loaded lazily, so this only warms the partition of
+    the current context (the shared root outside a guild). Returns a dict with
+    the load source ("snapshot", "json", or "index" when only the NDJSON
+    index was opened), the number of players and squads and the elapsed time
+    in milliseconds.
+    """
+    started = time.perf_counter()
+    partition = _current_partition()
+    if STORE_FORMAT == "ndjson":
+        # Players are decoded on demand; the full store loads on first use
+        reader = _player_reader(partition)
+        return {
+            "source": "index",
+            "players": len(reader) if reader is not None else 0,
+            "squads": len(_read_json_squads(partition)),
+            "elapsed_ms": (time.perf_counter() - started) * 1000,
+        }
+    state, source = _load_store(partition, partition.sources())
+    _set_state(partition, state)
+    return {
+        "source": source,
+        "players": len(state.players),
+        "squads": len(state.squads),
+        "elapsed_ms": (time.perf_counter() - started) * 1000,
+    }
+
+
+def snapshot():
+    """Return the current immutable snapshot of the store.
+
+    Readers can keep using it (e.g. while rendering a long listing) without
+    locks and without seeing or blocking concurrent writes.
+    """
+    return _get_store()
+
+
+def _document_path(partition, name):
+    return os.path.join(partition.data_dir, f"{name}.json")
+
+
+def _read_document(path, default):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except json.JSONDecodeError as e:
+        logger.error(f"Error reading {path}: {e}")
+        return default
+
+
+def load_document(name, default=None):
+    """Load a small JSON document kept next to the partition's data files."""
+    return _read_document(_document_path(_current_partition(), name), default)
+
+
+def save_document(name, data):
+    """Save a small JSON document next to the partition's data files."""
+    partition = _current_partition()
+    try:
+        with _write_locked(partition):
+            _write_json(_document_path(partition, name), data)
+        return True
+    except Exception as e:
+        logger.error(f"Error saving {name}: {e}")
+        return False
+
+
+def load_squads():
+    """Load squads data from the store."""
+    state = _get_store()
+    return _RecordList([dict(s) for s in state.squads], state.version,
+                       state.squads_by_name)
+
+
+def _read_version(partition):
+    """Read the store version of a partition (0 if it was never written)."""
+    if STORE_FORMAT == "sql":
+        return _sql_store().version(partition.key or 0)
+    try:
+        with open(partition.version_file, 'r') as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+@contextmanager
+def _write_locked(partition):
+    """Hold the partition's write lock, across processes where supported."""
+    with partition.write_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(partition.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _compare_and_write(partition, path, data, expected_version):
+    """Write a data file if the store is still at expected_version.
+
+    The lock is only held for the version check and the flush. Returns the
+    new version and the file signatures right after the write, or None if
+    another writer got there first.
+    """
+    if STORE_FORMAT == "sql":
+        field = "players" if path == partition.players_file else "squads"
+        version = _sql_store().compare_and_write(partition.key or 0, field,
+                                                 data, expected_version)
+        return (version, {"sql": version}) if version is not None else None
+    with _write_locked(partition):
+        version = _read_version(partition)
+        if version != expected_version:
+            return None
+        _write_data(partition, path, data)
+        tmp_path = f"{partition.version_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(version + 1))
+        os.replace(tmp_path, partition.version_file)
+        return version + 1, partition.sources()
+
+
+def _merge_records(base, ours, theirs, key):
+    """Three-way merge of record lists after a concurrent write.
+
+    `base` and `theirs` map keys to records as loaded and as now stored.
+    Records we added, changed or removed relative to base are applied on top
+    of theirs; everything else keeps the other writer's version.
+    """
+    ours_by_key = {key(r): r for r in ours}
+    merged = []
+    for record_key, record in theirs.items():
+        mine = ours_by_key.get(record_key)
+        if mine is not None:
+            changed = base.get(record_key) != mine
+            merged.append(mine if changed else record)
+            if changed and base.get(record_key) != record:
+                logger.warning(f"Concurrent update of {record_key}, keeping ours")
+        elif record_key not in base or base[record_key] != record:
+            # Added by them, or changed by them after we removed it
+            merged.append(record)
+    for record_key, mine in ours_by_key.items():
+        if record_key not in theirs and record_key not in base:
+            merged.append(mine)
+    return merged
+
+
+def _save_records(field, records, key, normalize, merge=True):
+    """Save "players" or "squads" with compare-and-swap, merging on conflict.
+
+    Returns True when the records were written. With merge=False a stale
+    read isn't merged and None is returned so the caller can redo its change.
+    """
+    partition = _current_partition()
+    path = getattr(partition, f"{field}_file")
+    by_key = f"{field}_by_id" if field == "players" else f"{field}_by_name"
+    version = getattr(records, "version", None)
+    base = getattr(records, "base", None)
+    records = [normalize(r) for r in records]
+
+    for _ in range(CAS_RETRIES):
+        state = _get_store()
+        if version is None:
+            # Records not from load_*(): treat them as based on the latest data
+            version, base = state.version, getattr(state, by_key)
+        if state.version != version:
+            if not merge:
+                return None
+            logger.info(f"Store changed since load (v{version} -> "
+                        f"v{state.version}), merging")
+            records = _merge_records(base, records, getattr(state, by_key),
+                                     key)
+            version, base = state.version, getattr(state, by_key)
+
+        written = _compare_and_write(partition, path, records, version)
+        if written is not None:
+            new_version, sources = written
+            _refresh_store(partition, state, new_version, sources,
+                           **{field: records})
+            return True
+        if not merge:
+            return None
+        # Another writer committed between our read and our write: retry
+        time.sleep(random.uniform(0, CAS_BACKOFF))
+
+    logger.error(f"Gave up saving {path} after {CAS_RETRIES} conflicting writes")
+    return False
+
+
+def _write_json(path, data):
+    """Write JSON to a temporary file and atomically move it into place."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4, default=dict)
+    os.replace(tmp_path, path)
+
+
+def _write_data(partition, path, data):
+    """Write a partition's data file in the configured format."""
+    if STORE_FORMAT == "ndjson" and path == partition.players_file:
+        write_players(path, data)
+    else:
+        _write_json(path, data)
+
+
+def _player_reader(partition):
+    """Return the on-demand reader of an NDJSON players file, or None."""
+    signature = _file_signature(partition.players_file)
+    if signature is None:
+        return None
+    reader = partition.player_reader
+    if reader is None or reader.signature != signature:
+        # The file was replaced since it was opened: open the new one
+        reader = PlayerFile(partition.players_file)
+        partition.player_reader = reader
+    return reader
+
+
+def _lookup_player(player_id):
+    """Return a player's read-only record, or None.
+
+    With the NDJSON and SQL formats, a partition whose snapshot isn't loaded
+    (or is out of date) only reads the one record.
+    """
+    partition = _current_partition()
+    if STORE_FORMAT == "sql":
+        state = partition.state
+        if state is None or state.sources != partition.sources():
+            player = _sql_store().player(partition.key or 0, player_id)
+            return player_record(player) if player is not None else None
+    if STORE_FORMAT == "ndjson":
+        state = partition.state
+        if state is None or state.sources != partition.sources():
+            reader = _player_reader(partition)
+            if reader is not None:
+                return reader.get(player_id)
+    return _get_store().players_by_id.get(player_id)
+
+
+def player_file_stats():
+    """Return hot cache statistics of the current partition's players file.
+
+    Returns None unless the NDJSON format is used and the file was opened.
+    """
+    reader = _current_partition().player_reader
+    return reader.stats() if reader is not None else None
+
+
+def _diff_players(old_by_id, players):
+    """Return (old, new) pairs for players that were added, changed or removed.
+
+    Unchanged records are expected to be the very same objects (see
+    _reuse()), so most players are skipped with an identity check.
+    """
+    changes = []
+    seen = set()
+    for new in players:
+        seen.add(new["id"])
+        old = old_by_id.get(new["id"])
+        if old is not new and old != new:
+            changes.append((old, new))
+    for player_id, old in old_by_id.items():
+        if player_id not in seen:
+            changes.append((old, None))
+    return changes
+
+
+def _update_indexes(indexes, changes):
+    """Apply player changes to secondary indexes."""
+    for index in indexes.values():
+        for old, _ in changes:
+            if old is not None:
+                index.remove(old)
+        for _, new in changes:
+            if new is not None:
+                index.add(new)
+
+
+def _refresh_store(partition, current, version, sources, squads=None,
+                   players=None):
+    """Publish the next snapshot after a save and rewrite the binary snapshot.
+
+    `current` is the snapshot the write was based on; `version` and `sources`
+    describe the files right after the write.
+    """
+    state, changes = current.evolve(sources, version, squads=squads,
+                                    players=players)
+    _set_state(partition, state)
+    _write_snapshot(partition, state)
+    for listener in _change_listeners:
+        try:
+            listener(partition.key, changes)
+        except Exception as e:
+            logger.error(f"Change listener {listener.__name__} failed: {e}")
+
+
 def save_squads(squads):
     """Save squads data to JSON file."""
     try:
-        with open(SQUADS_FILE, 'w') as f:
-            json.dump(squads, f, indent=4)
-        return True
+        return _save_records("squads", squads, lambda s: s["name"].lower(),
+                             squad_record)
     except Exception as e:
         logger.error(f"Error saving squads: {e}")
         return False
 
 
 def load_players():
-    """Load players data from JSON file, ensuring all required fields exist."""
-    try:
-        with open(PLAYERS_FILE, 'r') as f:
-            players = json.load(f)
-            # Add default values for missing fields
-            for player in players:
-                if "max_rank" not in player:
-                    player["max_rank"] = "Unranked"
-                if "roles" not in player:
-                    player["roles"] = {}
-                if "win_rate" not in player:
-                    player["win_rate"] = "Unknown"
-                if "availability" not in player:
-                    player["availability"] = "Not specified"
-                if "squad" not in player:
-                    player["squad"] = ""  # Ensure squad field exists
-            return players
-    except Exception as e:
-        logger.error(f"Error loading players: {e}")
-        return []
+    """Load players data from the store, ensuring all required fields exist."""
+    state = _get_store()
+    return _RecordList([_copy_player(p) for p in state.players],
+                       state.version, state.players_by_id)
 
 
 def save_players(players):
     """Save players data to JSON file."""
     try:
-        with open(PLAYERS_FILE, 'w') as f:
-            json.dump(players, f, indent=4)
-        return True
+        return _save_records("players", players, lambda p: p["id"],
+                             player_record)
     except Exception as e:
         logger.error(f"Error saving players: {e}")
         return False
 
 
+def update_players(mutate):
+    """Apply a batch mutation to the players list with a single save.
+
+    `mutate` receives the loaded players list, changes it in place and
+    returns a summary of what it did. Nothing is written if it returns a
+    falsy summary. If another writer commits first, `mutate` is run again on
+    the fresh data, so it must be idempotent: build its summary and any
+    other results from scratch on each call instead of appending to state
+    kept between calls. Returns a (summary, saved) tuple.
+    """
+    for attempt in range(CAS_RETRIES):
+        players = load_players()
+        summary = mutate(players)
+        if not summary:
+            return summary, True
+        try:
+            saved = _save_records("players", players, lambda p: p["id"],
+                                  player_record, merge=False)
+        except Exception as e:
+            logger.error(f"Error saving players: {e}")
+            return summary, False
+        if saved is not None:
+            return summary, saved
+        # The store changed under us: redo the mutation on fresh data
+        time.sleep(random.uniform(0, CAS_BACKOFF * 2 ** attempt))
+    logger.error(f"Gave up updating players after {CAS_RETRIES} conflicts")
+    return summary, False
+
+
 def find_squad_by_name(name):
     """Find a squad by name (case-insensitive)."""
-    squads = load_squads()
-    for squad in squads:
-        if squad["name"].lower() == name.lower():
-            return squad
-    return None
+    squad = _get_store().squads_by_name.get(name.lower())
+    return dict(squad) if squad else None
 
 
 def find_player_by_id(player_id):
     """Find a player by ID."""
-    players = load_players()
-    for player in players:
-        if player["id"] == player_id:
-            return player
-    return None
+    player = _lookup_player(player_id)
+    return _copy_player(player) if player else None
 
 
 def find_player_by_username(username):
     """Find a player by username (case-insensitive)."""
-    players = load_players()
-    for player in players:
+    for player in _get_store().players:
         if player["username"].lower() == username.lower():
-            return player
+            return _copy_player(player)
     return None
 
 
 def find_player_by_mlbb_id(mlbb_id):
     """Find a player by MLBB ID."""
-    players = load_players()
-    for player in players:
+    for player in _get_store().players:
         if player["mlbb_id"] == mlbb_id:
-            return player
+            return _copy_player(player)
     return None
 
 
 def find_squad_members(squad_name):
     """Find all members of a squad."""
-    squad = find_squad_by_name(squad_name)
+    store = _get_store()
+    squad = store.squads_by_name.get(squad_name.lower())
     if not squad:
         return None
 
-    members = []
-    players = load_players()
-    target_name = squad["name"].lower()
-    for player in players:
-        if player["squad"].lower() == target_name:
-            members.append(player)
-
-    return members
+    members = store.players_by_squad.get(squad["name"].lower(), [])
+    return [_copy_player(p) for p in members]
 
 
 def is_free_agent(player_id):
     """Check if a player is a free agent (not in a squad)."""
-    player = find_player_by_id(player_id)
+    player = _lookup_player(player_id)
     if not player:
         return False
     return not player["squad"].strip()  # True if squad is empty or whitespace
+
+
+def data_version():
+    """Return the store version of the current partition, bumped by every
+    write to its squads or players."""
+    return _read_version(_current_partition())
+
+
+def _page_bounds(page, per_page):
+    page = max(1, page)
+    return (page - 1) * per_page, per_page
+
+
+def squads_page(page=1, per_page=10):
+    """Return one page of squads, sorted by name, for listings.
+
+    Returns ([(squad, member count)], total squads). With the SQL format the
+    page is selected by the database, without loading the other squads.
+    """
+    offset, limit = _page_bounds(page, per_page)
+    partition = _current_partition()
+    if STORE_FORMAT == "sql":
+        squads, total = _sql_store().squads_page(partition.key or 0, offset,
+                                                 limit)
+        return [(squad_record(s), members) for s, members in squads], total
+    store = _get_store()
+    squads = sorted(store.squads, key=lambda s: s["name"].lower())
+    return ([(s, len(store.squad_members(s["name"])))
+             for s in squads[offset:offset + limit]], len(squads))
+
+
+def free_agents_page(page=1, per_page=24):
+    """Return one page of free agents, sorted by MLBB username.
+
+    Returns ([player], total free agents), see squads_page().
+    """
+    offset, limit = _page_bounds(page, per_page)
+    partition = _current_partition()
+    if STORE_FORMAT == "sql":
+        players, total = _sql_store().free_agents_page(partition.key or 0,
+                                                       offset, limit)
+        return [player_record(p) for p in players], total
+    players = sorted(_get_store().free_agents(),
+                     key=lambda p: (p["mlbb_username"].lower(), p["id"]))
+    return players[offset:offset + limit], len(players)
+
+
+def sql_store_stats():
+    """Return the database and pool status of the SQL format, or None."""
+    return _sql_store().stats() if STORE_FORMAT == "sql" else None
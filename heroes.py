@@ -0,0 +1,302 @@
+# Hero catalog and hero name resolution (aliases and typo correction)
+import os
+import re
+import json
+import logging
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+from db import DATA_DIR
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+HEROES_FILE = os.path.join(DATA_DIR, "heroes.json")
+
+# Stands for "any hero" in a player's hero list
+ALL_HEROES = "All"
+ALL_ALIASES = ("all", "any", "anything", "everything", "allheroes", "anyhero")
+
+# Common short names and nicknames, by normalized name. Heroes in
+# heroes.json can list more under an "aliases" key.
+ALIASES = {
+    "alu": "Alucard",
+    "bea": "Beatrix",
+    "ben": "Benedetta",
+    "bene": "Benedetta",
+    "cecil": "Cecilion",
+    "change": "Chang'e",
+    "esme": "Esmeralda",
+    "fred": "Fredrinn",
+    "gatot": "Gatotkaca",
+    "guin": "Guinevere",
+    "gus": "Gusion",
+    "haya": "Hayabusa",
+    "jaw": "Jawhead",
+    "kupa": "Popol and Kupa",
+    "lance": "Lancelot",
+    "lapu": "Lapu-Lapu",
+    "mino": "Minotaur",
+    "paq": "Paquito",
+    "popol": "Popol and Kupa",
+    "silva": "Silvanna",
+    "wan": "Wanwan",
+    "xborg": "X.Borg",
+    "yss": "Yi Sun-shin",
+    "yz": "YU Zhong",
+}
+
+# Characters separating heroes in a hero list
+_SEPARATORS = re.compile(r"[,/;|\n]+")
+# Shortest typed name resolved as a prefix ("haya" -> Hayabusa)
+MIN_PREFIX = 3
+# Distinct tokens whose resolution is remembered
+RESOLVE_CACHE_SIZE = 4096
+
+
+def normalize(name):
+    """Return the lookup key of a hero name: lowercase letters and digits."""
+    return "".join(c for c in name.lower() if c.isalnum())
+
+
+def _distance(a, b, limit=None):
+    """Levenshtein distance between two strings.
+
+    With a limit, stops early and returns limit + 1 once the distance is
+    known to exceed it.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ca != cb)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _max_typos(key):
+    """Typos tolerated in a typed name of this length."""
+    if len(key) <= 3:
+        return 0
+    return 1 if len(key) <= 6 else 2
+
+
+def _trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Words indexed by trigram for edit-distance search.
+
+    One edit changes at most three trigrams of a word, so a word within
+    `radius` edits shares at least (trigrams - 3 * radius) trigrams with the
+    query. Only those candidates get their edit distance computed.
+    """
+
+    def __init__(self, words=()):
+        self.words = []
+        self.by_trigram = {}  # trigram -> [word index]
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        for trigram in _trigrams(word):
+            self.by_trigram.setdefault(trigram, []).append(len(self.words))
+        self.words.append(word)
+
+    def search(self, word, radius):
+        """Return sorted (distance, word) pairs within radius of word."""
+        trigrams = _trigrams(word)
+        needed = len(trigrams) - 3 * radius
+        if needed > 0:
+            shared = {}
+            for trigram in trigrams:
+                for index in self.by_trigram.get(trigram, ()):
+                    shared[index] = shared.get(index, 0) + 1
+            candidates = [self.words[i] for i, count in shared.items()
+                          if count >= needed]
+        else:
+            # Too short for the filter to rule anything out
+            candidates = self.words
+        found = []
+        for candidate in candidates:
+            distance = _distance(word, candidate, radius)
+            if distance <= radius:
+                found.append((distance, candidate))
+        found.sort()
+        return found
+
+
+class HeroResolver:
+    """Resolves typed hero names to catalog names.
+
+    A token is tried as an exact name, an alias, a unique prefix, and
+    finally as a misspelling (closest name by edit distance, if there is a
+    single closest one). Results are cached per token, so repeated names
+    resolve in well under a microsecond.
+    """
+
+    def __init__(self, heroes):
+        self.names = {}  # normalized name or alias -> hero name
+        self.canonical = set()  # normalized hero names
+        for name, data in heroes.items():
+            self.canonical.add(normalize(name))
+            self.names[normalize(name)] = name
+            for alias in (data or {}).get("aliases", ()):
+                self.names.setdefault(normalize(alias), name)
+        for alias, name in ALIASES.items():
+            if name in heroes:
+                self.names.setdefault(alias, name)
+        for alias in ALL_ALIASES:
+            self.names[alias] = ALL_HEROES
+        self._sorted_keys = sorted(self.names)
+        # "all" and friends are only taken as typed, never as a correction
+        self._index = TrigramIndex(k for k in self._sorted_keys
+                                   if self.names[k] != ALL_HEROES)
+        self.resolve = lru_cache(maxsize=RESOLVE_CACHE_SIZE)(self._resolve)
+
+    def _resolve(self, token):
+        """Return (hero name, exact) for a token, or (None, False).
+
+        exact is False when the name was corrected from an alias, prefix or
+        typo.
+        """
+        key = normalize(token)
+        if not key:
+            return None, False
+        name = self.names.get(key)
+        if name is not None:
+            return name, key in self.canonical or name == ALL_HEROES
+
+        if len(key) >= MIN_PREFIX:
+            matches = {self.names[k] for k in self._prefixed(key)}
+            if len(matches) == 1:
+                return matches.pop(), False
+
+        radius = _max_typos(key)
+        if radius:
+            found = self._index.search(key, radius)
+            best = {self.names[w] for d, w in found if d == found[0][0]}
+            if len(best) == 1:
+                return best.pop(), False
+        return None, False
+
+    def _prefixed(self, key):
+        """Yield the known keys starting with key."""
+        position = bisect_left(self._sorted_keys, key)
+        while (position < len(self._sorted_keys)
+               and self._sorted_keys[position].startswith(key)):
+            yield self._sorted_keys[position]
+            position += 1
+
+    def suggest(self, token, limit=3):
+        """Return up to `limit` hero names close to a token."""
+        key = normalize(token)
+        if not key:
+            return []
+        suggestions = []
+        for _, word in self._index.search(key, max(2, len(key) // 2)):
+            name = self.names[word]
+            if name not in suggestions:
+                suggestions.append(name)
+        return suggestions[:limit]
+
+    def canonicalize(self, text):
+        """Rewrite a comma-separated hero list with catalog names.
+
+        Returns (text, corrections, unknown): corrections lists (typed, hero)
+        for names fixed as aliases, prefixes or typos, and unknown lists the
+        names that couldn't be resolved, which are kept as typed.
+        """
+        heroes = []
+        corrections = []
+        unknown = []
+        for token in _SEPARATORS.split(text):
+            token = token.strip()
+            if not token:
+                continue
+            name, exact = self.resolve(token)
+            if name is None:
+                unknown.append(token)
+                name = token
+            elif not exact:
+                corrections.append((token, name))
+            if name not in heroes:
+                heroes.append(name)
+        return ", ".join(heroes), corrections, unknown
+
+
+class HeroCatalog:
+    """heroes.json, loaded once and reloaded when the file changes."""
+
+    def __init__(self, path=HEROES_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = None
+        self._heroes = {}
+        self._resolver = None
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if signature == self._signature and self._resolver is not None:
+            return
+        with self._lock:
+            if signature == self._signature and self._resolver is not None:
+                return
+            heroes = {}
+            if signature is not None:
+                try:
+                    with open(self.path, 'r') as f:
+                        heroes = json.load(f).get("heroes", {})
+                except (OSError, ValueError, AttributeError) as e:
+                    logger.error(f"Error loading {self.path}: {e}")
+            self._heroes = heroes
+            self._resolver = HeroResolver(heroes)
+            self._signature = signature
+            logger.debug(f"Loaded {len(heroes)} heroes from {self.path}")
+
+    def heroes(self):
+        """Return {hero name: hero data}."""
+        self._refresh()
+        return self._heroes
+
+    def resolver(self):
+        """Return the resolver for the current catalog."""
+        self._refresh()
+        return self._resolver
+
+
+# Heroes of data/heroes.json
+hero_catalog = HeroCatalog()
+
+
+def canonicalize_heroes(text):
+    """Rewrite a hero list with catalog names, see HeroResolver.canonicalize()."""
+    return hero_catalog.resolver().canonicalize(text)
+
+
+def format_corrections(corrections, unknown):
+    """Return a short note about corrected and unknown hero names, or ""."""
+    resolver = hero_catalog.resolver()
+    lines = []
+    if corrections:
+        lines.append("📝 Interpreted " + ", ".join(
+            f"'{typed}' as {name}" for typed, name in corrections))
+    for token in unknown:
+        suggestions = resolver.suggest(token)
+        hint = (f" (did you mean {' / '.join(suggestions)}?)"
+                if suggestions else "")
+        lines.append(f"❓ Unknown hero '{token}'{hint}")
+    return "\n".join(lines)
@@ -0,0 +1,309 @@
+# Player stat history as compact, downsampled time series
+import os
+import time
+import queue
+import struct
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from db import add_change_listener, use_guild, reset_guild, partition_dir
+from ranks import parse_rank, parse_win_rate, rank_label
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Recorded stats and their codes in the history file
+STATS = {"win_rate": 0, "rank": 1}
+STAT_NAMES = {code: name for name, code in STATS.items()}
+# Names accepted for a stat, e.g. by nb!history
+STAT_ALIASES = {
+    "win_rate": "win_rate",
+    "winrate": "win_rate",
+    "wr": "win_rate",
+    "rank": "rank",
+    "max_rank": "rank",
+}
+
+# Points kept per player and stat, however often the stat changes
+MAX_POINTS = int(os.getenv("NB_HISTORY_MAX_POINTS", "120"))
+# Points older than this are thinned to one per day, then one per week
+DAILY_AFTER = 7 * 86400
+WEEKLY_AFTER = 90 * 86400
+
+# History file, next to a partition's data files: a magic header, then
+# fixed-size records of (player id, stat code, unix time, value)
+HISTORY_FILE = "history.bin"
+HISTORY_MAGIC = b"NBHIST1\n"
+RECORD = struct.Struct("<qBIf")
+# Rewrite the file once it holds this many times the points kept in memory
+COMPACT_RATIO = 2
+# Partitions whose series are kept in memory, least recently used dropped
+MAX_PARTITIONS = int(os.getenv("NB_HISTORY_PARTITIONS", "32"))
+
+SPARK_BARS = "▁▂▃▄▅▆▇█"
+
+
+def stat_values(player):
+    """Return {stat: value or None} of the numeric stats of a player."""
+    return {
+        "win_rate": parse_win_rate(player.get("win_rate")),
+        "rank": parse_rank(player.get("max_rank")),
+    }
+
+
+class Series:
+    """Points of one stat of one player, in time order."""
+
+    __slots__ = ("times", "values")
+
+    def __init__(self):
+        self.times = array("I")
+        self.values = array("f")
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, when, value):
+        """Add a point; returns False if the value didn't change."""
+        self.values.append(value)
+        if len(self.values) > 1 and self.values[-1] == self.values[-2]:
+            self.values.pop()
+            return False
+        self.times.append(when)
+        return True
+
+    def points(self):
+        return list(zip(self.times, self.values))
+
+    def downsample(self, now):
+        """Thin out old points so the series stays within MAX_POINTS.
+
+        Stats are levels, not rates, so each bucket keeps its last value.
+        Points older than DAILY_AFTER keep one per day, older than
+        WEEKLY_AFTER one per week. If that is not enough, the oldest points
+        are merged pairwise until the series fits. Returns the number of
+        points dropped.
+        """
+        before = len(self.times)
+        buckets = {}
+        for when, value in zip(self.times, self.values):
+            age = now - when
+            if age > WEEKLY_AFTER:
+                key = (2, when // (7 * 86400))
+            elif age > DAILY_AFTER:
+                key = (1, when // 86400)
+            else:
+                key = (0, when)
+            buckets[key] = (when, value)
+        points = list(buckets.values())
+        while len(points) > MAX_POINTS:
+            # Merge pairs among the oldest half, keeping the later point
+            half = (len(points) - MAX_POINTS) * 2
+            points = points[1:half:2] + points[half:]
+        self.times = array("I", (when for when, _ in points))
+        self.values = array("f", (value for _, value in points))
+        return before - len(points)
+
+
+def format_stat(stat, value):
+    """Return a display string for a stat value."""
+    if stat == "rank":
+        return rank_label(round(value))
+    return f"{value:.1f}%"
+
+
+def sparkline(values):
+    """Return a one-line bar chart of values."""
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    span = (high - low) or 1
+    return "".join(SPARK_BARS[int((v - low) / span * (len(SPARK_BARS) - 1))]
+                   for v in values)
+
+
+class StatHistory:
+    """Stat history of every partition, recorded as players change.
+
+    Saves queue their changes, and a writer thread appends the points to
+    each partition's history file, so the saving thread (usually the event
+    loop) never does file I/O for it. In memory every series is bounded by
+    MAX_POINTS, and the file is rewritten from memory when it grows past
+    COMPACT_RATIO times that. At most MAX_PARTITIONS partitions are kept in
+    memory; others are read from their file again when needed.
+    """
+
+    def __init__(self):
+        # data dir -> {"series", "kept", "records", "size"}, in LRU order
+        self._partitions = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = queue.Queue()  # (guild id, changes, unix time)
+        self._writer = None
+        add_change_listener(self._players_changed)
+
+    def _path(self, data_dir):
+        return os.path.join(data_dir, HISTORY_FILE)
+
+    def _data_dir(self, guild_id, create=True):
+        token = use_guild(guild_id, create=create)
+        try:
+            return partition_dir()
+        finally:
+            reset_guild(token)
+
+    def _load(self, data_dir):
+        """Return a partition's series, reading the file if needed."""
+        path = self._path(data_dir)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        part = self._partitions.get(data_dir)
+        if part is not None and part["size"] == size:
+            self._partitions.move_to_end(data_dir)
+            return part
+
+        series = {}
+        records = 0
+        if size:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if not data.startswith(HISTORY_MAGIC):
+                logger.error(f"{path} is not a history file, ignoring it")
+                data = HISTORY_MAGIC
+            body = memoryview(data)[len(HISTORY_MAGIC):]
+            # Ignore a partly written last record
+            usable = len(body) - len(body) % RECORD.size
+            for player_id, code, when, value in RECORD.iter_unpack(body[:usable]):
+                stat = STAT_NAMES.get(code)
+                if stat is not None:
+                    series.setdefault((player_id, stat), Series()).append(
+                        when, value)
+                    records += 1
+            now = int(time.time())
+            for entry in series.values():
+                if len(entry) > MAX_POINTS:
+                    entry.downsample(now)
+        part = {"series": series, "records": records, "size": size,
+                "kept": sum(len(entry) for entry in series.values())}
+        self._partitions[data_dir] = part
+        self._partitions.move_to_end(data_dir)
+        while len(self._partitions) > MAX_PARTITIONS:
+            self._partitions.popitem(last=False)
+        return part
+
+    def _append(self, data_dir, part, points):
+        path = self._path(data_dir)
+        blob = b"".join(RECORD.pack(player_id, STATS[stat], when, value)
+                        for player_id, stat, when, value in points)
+        with open(path, 'ab') as f:
+            if f.tell() == 0:
+                f.write(HISTORY_MAGIC)
+            f.write(blob)
+        part["records"] += len(points)
+        part["size"] = os.path.getsize(path)
+
+    def _compact(self, data_dir, part):
+        """Rewrite a partition's history file from the downsampled series."""
+        path = self._path(data_dir)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        records = 0
+        with open(tmp_path, 'wb') as f:
+            f.write(HISTORY_MAGIC)
+            for (player_id, stat), entry in part["series"].items():
+                f.write(b"".join(RECORD.pack(player_id, STATS[stat], when, value)
+                                 for when, value in entry.points()))
+                records += len(entry)
+        os.replace(tmp_path, path)
+        logger.debug(f"Compacted {path} from {part['records']} to "
+                     f"{records} points")
+        part["records"] = records
+        part["size"] = os.path.getsize(path)
+
+    def record(self, guild_id, changes, now=None):
+        """Record the stat changes among (old, new) player pairs."""
+        now = int(now if now is not None else time.time())
+        points = []
+        for old, new in changes:
+            if new is None:
+                continue
+            before = stat_values(old) if old is not None else {}
+            for stat, value in stat_values(new).items():
+                if value is not None and value != before.get(stat):
+                    points.append((new["id"], stat, now, value))
+        if not points:
+            return 0
+
+        data_dir = self._data_dir(guild_id)
+        with self._lock:
+            part = self._load(data_dir)
+            recorded = []
+            for point in points:
+                player_id, stat, when, value = point
+                entry = part["series"].setdefault((player_id, stat), Series())
+                if entry.append(when, value):
+                    recorded.append(point)
+                    part["kept"] += 1
+                    if len(entry) > MAX_POINTS:
+                        part["kept"] -= entry.downsample(now)
+            if not recorded:
+                return 0
+            self._append(data_dir, part, recorded)
+            if part["records"] > COMPACT_RATIO * max(part["kept"], MAX_POINTS):
+                self._compact(data_dir, part)
+        return len(recorded)
+
+    def _players_changed(self, guild_id, changes):
+        """Store change listener: queue changed win rates and ranks."""
+        if not changes:
+            return
+        self._pending.put((guild_id, changes, time.time()))
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(
+                        target=self._write_pending, name="stat-history",
+                        daemon=True)
+                    self._writer.start()
+
+    def _write_pending(self):
+        """Writer thread: record queued changes."""
+        while True:
+            guild_id, changes, when = self._pending.get()
+            try:
+                self.record(guild_id, changes, when)
+            except Exception as e:
+                logger.error(f"Failed to record stat history: {e}")
+            finally:
+                self._pending.task_done()
+
+    def history(self, guild_id, player_id, stat=None):
+        """Return {stat: [(unix time, value)]} for a player, oldest first.
+
+        Waits for queued changes to be recorded first; don't call it on the
+        event loop.
+        """
+        self._pending.join()
+        data_dir = self._data_dir(guild_id, create=False)
+        with self._lock:
+            part = self._load(data_dir)
+            return {name: part["series"][(player_id, name)].points()
+                    for name in STATS
+                    if (stat is None or stat == name)
+                    and (player_id, name) in part["series"]}
+
+    def stats(self, guild_id):
+        data_dir = self._data_dir(guild_id, create=False)
+        with self._lock:
+            part = self._load(data_dir)
+            return {
+                "series": len(part["series"]),
+                "points": part["kept"],
+                "file_records": part["records"],
+                "file_bytes": part["size"],
+            }
+
+
+# Stat history of all partitions
+stat_history = StatHistory()
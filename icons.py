@@ -0,0 +1,315 @@
+# On-disk cache of hero icons and their thumbnails, served by the web app
+import io
+import os
+import re
+import sys
+import time
+import hashlib
+import logging
+import threading
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from db import DATA_DIR
+from heroes import hero_catalog, normalize
+
+try:
+    from PIL import Image
+except ImportError:  # Without Pillow only the original icons are served
+    Image = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Where cached icons are kept, and the most they may take up
+ICON_CACHE_DIR = os.getenv("NB_ICON_CACHE_DIR", os.path.join(DATA_DIR, "icons"))
+ICON_CACHE_BYTES = int(float(os.getenv("NB_ICON_CACHE_MB", "50")) * 1024 * 1024)
+# Directory to take icons from instead of the URLs in heroes.json, with
+# files named after the hero (e.g. "Layla.png" or "yisunshin.png")
+ICON_SOURCE_DIR = os.getenv("NB_ICON_SOURCE_DIR")
+# Thumbnail widths generated along with each original
+THUMBNAIL_SIZES = tuple(int(s) for s in
+                        os.getenv("NB_ICON_SIZES", "32,64,128").split(",")
+                        if s.strip())
+# Public base URL of the web app; when set, embeds use our icon endpoint
+PUBLIC_URL = os.getenv("NB_PUBLIC_URL", "").rstrip("/")
+
+# Seconds browsers and Discord may reuse an icon without revalidating
+ICON_MAX_AGE = 7 * 86400
+# Remote fetches: timeout, largest accepted icon, and how long a failed
+# hero is not retried
+FETCH_TIMEOUT = 10
+MAX_ICON_BYTES = 2 * 1024 * 1024
+FAILURE_BACKOFF = 300
+
+ORIGINAL = "orig"
+SOURCE_EXTENSIONS = (".png", ".webp", ".jpg", ".jpeg", ".gif")
+# Cached file names: <hero key>-<size>-<content digest><extension>
+_CACHED_NAME = re.compile(r"^([a-z0-9]+)-(orig|\d+)-([0-9a-f]{32})(\.\w+)$")
+_MIME_TYPES = {".png": "image/png", ".webp": "image/webp",
+               ".jpg": "image/jpeg", ".gif": "image/gif"}
+
+
+def _sniff_extension(data):
+    """Return the file extension matching an image's magic bytes, or None."""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    return None
+
+
+def icon_url(hero_name, hero_data, size=None):
+    """Return the URL embeds should use for a hero's icon."""
+    if not PUBLIC_URL:
+        return hero_data.get("image")
+    url = f"{PUBLIC_URL}/icons/{urllib.parse.quote(normalize(hero_name))}"
+    return f"{url}?size={size}" if size else url
+
+
+class IconCache:
+    """Hero icons on disk, with a least-recently-used size cap.
+
+    Each file's name carries a digest of its content, which doubles as a
+    strong ETag and lets the cache be rebuilt from the directory listing.
+    Thumbnails are generated for every configured size as soon as an
+    original is stored.
+    """
+
+    def __init__(self, directory=ICON_CACHE_DIR, max_bytes=ICON_CACHE_BYTES,
+                 source_dir=ICON_SOURCE_DIR, sizes=THUMBNAIL_SIZES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.source_dir = source_dir
+        self.sizes = sizes if Image is not None else ()
+        self._lock = threading.Lock()
+        self._entries = None  # (key, size) -> entry, least recently used first
+        self._bytes = 0
+        self._fetching = {}  # hero key -> lock held while it is fetched
+        self._failures = {}  # hero key -> time of the last failed fetch
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _scan(self):
+        """Index the cached files, oldest first."""
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for name in os.listdir(self.directory):
+            match = _CACHED_NAME.match(name)
+            if not match:
+                continue
+            path = os.path.join(self.directory, name)
+            stat = os.stat(path)
+            key, size, digest, extension = match.groups()
+            found.append((stat.st_mtime, (key, size), {
+                "path": path, "etag": digest, "bytes": stat.st_size,
+                "mimetype": _MIME_TYPES.get(extension, "image/png")}))
+        found.sort(key=lambda item: item[0])
+        self._entries = OrderedDict((k, entry) for _, k, entry in found)
+        self._bytes = sum(entry["bytes"] for entry in self._entries.values())
+
+    def _lookup(self, key, size):
+        with self._lock:
+            if self._entries is None:
+                self._scan()
+            entry = self._entries.get((key, size))
+            if entry is not None:
+                if not os.path.exists(entry["path"]):
+                    self._forget((key, size))
+                    return None
+                self._entries.move_to_end((key, size))
+            return entry
+
+    def _forget(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self._bytes -= entry["bytes"]
+        return entry
+
+    def _store(self, key, size, data, extension):
+        """Write one icon file and evict old ones over the size cap."""
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        path = os.path.join(self.directory, f"{key}-{size}-{digest}{extension}")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            old = self._forget((key, size))
+            if old is not None and old["path"] != path:
+                self._remove_file(old["path"])
+            entry = {"path": path, "etag": digest, "bytes": len(data),
+                     "mimetype": _MIME_TYPES.get(extension, "image/png")}
+            self._entries[(key, size)] = entry
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                evicted_key, evicted = next(iter(self._entries.items()))
+                if evicted_key == (key, size):
+                    break
+                self._forget(evicted_key)
+                self._remove_file(evicted["path"])
+                self.evictions += 1
+        return entry
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _read_source(self, hero_name, hero_data):
+        """Return the original icon bytes from the source dir or its URL."""
+        if self.source_dir:
+            for base in (hero_name, normalize(hero_name)):
+                for extension in SOURCE_EXTENSIONS:
+                    path = os.path.join(self.source_dir, base + extension)
+                    if os.path.exists(path):
+                        with open(path, 'rb') as f:
+                            return f.read()
+            return None
+
+        url = (hero_data or {}).get("image")
+        if not url:
+            return None
+        request = urllib.request.Request(
+            url, headers={"User-Agent": "MLBBSquadManager/1.0"})
+        with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+            data = response.read(MAX_ICON_BYTES + 1)
+        if len(data) > MAX_ICON_BYTES:
+            raise ValueError(f"icon is larger than {MAX_ICON_BYTES} bytes")
+        return data
+
+    def _thumbnails(self, key, data, sizes=None):
+        """Store a thumbnail of the original for every configured size (or
+        the given ones)."""
+        for size in sizes or self.sizes:
+            with Image.open(io.BytesIO(data)) as image:
+                image = image.convert("RGBA")
+                image.thumbnail((size, size), Image.LANCZOS)
+                out = io.BytesIO()
+                image.save(out, format="PNG", optimize=True)
+            self._store(key, str(size), out.getvalue(), ".png")
+
+    def _regenerate(self, hero_name, key, original, size):
+        """Generate an evicted thumbnail from the cached original."""
+        try:
+            with open(original["path"], 'rb') as f:
+                data = f.read()
+            self._thumbnails(key, data, sizes=[int(size)])
+        except Exception as e:
+            logger.warning(f"Couldn't regenerate the {size}px icon of "
+                           f"{hero_name}: {e}")
+            return False
+        return True
+
+    def _populate(self, hero_name, hero_data, key, size=ORIGINAL):
+        """Make sure a hero's icon is cached at a size.
+
+        Fetches the original and generates its thumbnails, or only the
+        missing thumbnail if the original is still cached.
+        """
+        with self._lock:
+            fetching = self._fetching.setdefault(key, threading.Lock())
+        # Concurrent requests for the same hero wait for a single fetch
+        with fetching:
+            original = self._lookup(key, ORIGINAL)
+            if original is not None:
+                if size == ORIGINAL or self._lookup(key, size) is not None:
+                    return True
+                if self._regenerate(hero_name, key, original, size):
+                    return True
+                # The original is unusable, fetch it again
+            with self._lock:
+                failed_at = self._failures.get(key)
+            if failed_at is not None and time.monotonic() - failed_at < FAILURE_BACKOFF:
+                return False
+            try:
+                data = self._read_source(hero_name, hero_data)
+                extension = _sniff_extension(data) if data else None
+                if extension is None:
+                    raise ValueError("no image found")
+                self._store(key, ORIGINAL, data, extension)
+                if self.sizes:
+                    self._thumbnails(key, data)
+            except Exception as e:
+                logger.warning(f"Couldn't cache the icon of {hero_name}: {e}")
+                with self._lock:
+                    self._failures[key] = time.monotonic()
+                return False
+            with self._lock:
+                self._failures.pop(key, None)
+            logger.info(f"Cached the icon of {hero_name}")
+            return True
+
+    def get(self, hero, size=None):
+        """Return the cache entry of a hero's icon at a size, or None.
+
+        `hero` may be any name the hero resolver understands. Sizes that
+        weren't generated are served at the nearest larger size (or as the
+        original).
+        """
+        hero_name, _ = hero_catalog.resolver().resolve(hero)
+        heroes = hero_catalog.heroes()
+        if hero_name not in heroes:
+            return None
+        key = normalize(hero_name)
+
+        wanted = ORIGINAL
+        if size and self.sizes:
+            larger = [s for s in sorted(self.sizes) if s >= size]
+            if larger:
+                wanted = str(larger[0])
+
+        entry = self._lookup(key, wanted)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        if not self._populate(hero_name, heroes[hero_name], key, wanted):
+            return None
+        return self._lookup(key, wanted) or self._lookup(key, ORIGINAL)
+
+    def warm(self):
+        """Cache every hero's icon; returns the number of heroes cached."""
+        cached = 0
+        for hero_name, hero_data in hero_catalog.heroes().items():
+            key = normalize(hero_name)
+            if self._populate(hero_name, hero_data, key):
+                cached += 1
+        return cached
+
+    def stats(self):
+        with self._lock:
+            if self._entries is None:
+                self._scan()
+            return {
+                "files": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "thumbnails": Image is not None,
+            }
+
+
+# Icons served by the web app
+icon_cache = IconCache()
+
+
+if __name__ == "__main__":
+    # python icons.py warm: fill the cache (e.g. from NB_ICON_SOURCE_DIR)
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] != ["warm"]:
+        print("usage: python icons.py warm")
+        sys.exit(2)
+    started = time.perf_counter()
+    count = icon_cache.warm()
+    print(f"Cached {count} of {len(hero_catalog.heroes())} heroes in "
+          f"{time.perf_counter() - started:.1f}s: {icon_cache.stats()}")
@@ -0,0 +1,268 @@
+# Batched join request notifications with approve/deny buttons
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+import discord
+from db import use_guild, reset_guild, find_squad_by_name, update_players
+from members import find_admin_mentions
+from utils import is_moderator
+from locks import store_locks, player_key, squad_key
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Seconds between join request digests
+DIGEST_INTERVAL_SECONDS = float(os.getenv("NB_JOIN_DIGEST_SECONDS", "60"))
+# Hours a request stays open (and repeats are ignored) without a decision
+REQUEST_TTL_HOURS = float(os.getenv("NB_JOIN_REQUEST_TTL_HOURS", "24"))
+
+# Requests per digest message: two per button row, five rows per message
+REQUESTS_PER_MESSAGE = 10
+# Discord limits custom ids to 100 characters
+MAX_CUSTOM_ID = 100
+
+
+def _request_key(guild_id, user_id, squad):
+    return (guild_id, user_id, squad.lower())
+
+
+class JoinRequestButton(discord.ui.DynamicItem[discord.ui.Button],
+                        template=r"joinreq:(?P<action>approve|deny):"
+                                 r"(?P<user_id>[0-9]+):(?P<squad>.+)"):
+    """Approve or deny button of a join request.
+
+    The request is encoded in the custom id, so buttons keep working after
+    the bot restarts.
+    """
+
+    def __init__(self, action, user_id, squad, label=None):
+        super().__init__(discord.ui.Button(
+            label=label or action.title(),
+            style=(discord.ButtonStyle.success if action == "approve"
+                   else discord.ButtonStyle.danger),
+            custom_id=f"joinreq:{action}:{user_id}:{squad}"))
+        self.action = action
+        self.user_id = user_id
+        self.squad = squad
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["action"], int(match["user_id"]), match["squad"])
+
+    async def callback(self, interaction):
+        if interaction.guild is None or not is_moderator(interaction.user,
+                                                          interaction.guild):
+            await interaction.response.send_message(
+                "❌ Only admins and moderators can review join requests!",
+                ephemeral=True)
+            return
+
+        # Acknowledge now: waiting for the locks may take longer than the
+        # 3 seconds Discord gives an interaction
+        await interaction.response.defer()
+        token = use_guild(interaction.guild_id)
+        try:
+            if self.action == "approve":
+                async with store_locks.hold(
+                        player_key(interaction.guild_id, self.user_id),
+                        squad_key(interaction.guild_id, self.squad)):
+                    done, message = approve_request(self.user_id, self.squad)
+            else:
+                done = True
+                message = f"❌ <@{self.user_id}>'s request to join '{self.squad}' was denied."
+        finally:
+            reset_guild(token)
+        if not done:
+            # Keep the request open so it can be approved again or denied
+            await interaction.followup.send(
+                f"{message} (by {interaction.user.mention})")
+            return
+        join_requests.resolve(interaction.guild_id, self.user_id, self.squad)
+        logger.info(f"{interaction.user.id} {self.action}d join request of "
+                    f"{self.user_id} for {self.squad}")
+
+        # Disable both buttons of this request
+        view = discord.ui.View.from_message(interaction.message, timeout=None)
+        for item in view.children:
+            custom_id = getattr(item, "custom_id", None) or ""
+            if custom_id.split(":", 3)[2:] == [str(self.user_id), self.squad]:
+                item.disabled = True
+        await interaction.edit_original_response(view=view)
+        await interaction.followup.send(
+            f"{message} (by {interaction.user.mention})")
+
+
+def approve_request(user_id, squad_name):
+    """Add a requesting player to a squad.
+
+    Returns (whether the player was added, status message).
+    """
+    squad = find_squad_by_name(squad_name)
+    if not squad:
+        return False, f"❌ Squad '{squad_name}' no longer exists!"
+
+    problem = {}
+
+    def join(players):
+        problem.clear()
+        player = next((p for p in players if p["id"] == user_id), None)
+        if player is None:
+            problem["reason"] = "is no longer registered"
+            return None
+        if player.get("squad"):
+            problem["reason"] = f"is already in '{player['squad']}'"
+            return None
+        player["squad"] = squad["name"]
+        player.setdefault("role", "Member")
+        return player["mlbb_username"]
+
+    username, saved = update_players(join)
+    if problem:
+        return False, f"❌ <@{user_id}> {problem['reason']}!"
+    if not saved:
+        return False, "❌ Failed to add member due to an error!"
+    return True, f"✅ <@{user_id}> ({username}) joined '{squad['name']}'!"
+
+
+class JoinRequestDispatcher:
+    """Queue join requests and post them as periodic digests.
+
+    Requests are deduplicated per (guild, user, squad) until they are
+    approved, denied or expire. Pending requests are grouped by channel and
+    squad, so a burst of requests becomes one message (and one admin ping)
+    per squad per interval.
+    """
+
+    def __init__(self, interval=DIGEST_INTERVAL_SECONDS,
+                 ttl_hours=REQUEST_TTL_HOURS):
+        self.interval = interval
+        self.ttl = ttl_hours * 3600
+        self._open = {}  # (guild id, user id, squad) -> request
+        self._pending = OrderedDict()  # (channel id, squad) -> [request]
+        self._task = None
+        self.submitted = 0
+        self.duplicates = 0
+        self.digests = 0
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for key in [k for k, r in self._open.items() if r["at"] < cutoff]:
+            del self._open[key]
+
+    def submit(self, guild_id, channel_id, player, squad_name):
+        """Queue a join request; returns False if one is already open."""
+        self._expire()
+        key = _request_key(guild_id, player["id"], squad_name)
+        request = self._open.get(key)
+        if request is not None:
+            request["repeats"] += 1
+            self.duplicates += 1
+            return False
+
+        self._open[key] = request = {
+            "user_id": player["id"],
+            "squad": squad_name,
+            "guild_id": guild_id,
+            "player": dict(player),
+            "repeats": 0,
+            "at": time.monotonic(),
+        }
+        self._pending.setdefault((channel_id, squad_name.lower()),
+                                 []).append(request)
+        self.submitted += 1
+        return True
+
+    def resolve(self, guild_id, user_id, squad_name):
+        """Close a request after it was approved or denied."""
+        return self._open.pop(_request_key(guild_id, user_id, squad_name), None)
+
+    def stats(self):
+        return {
+            "open": len(self._open),
+            "pending": sum(len(r) for r in self._pending.values()),
+            "submitted": self.submitted,
+            "duplicates": self.duplicates,
+            "digests": self.digests,
+        }
+
+    def start(self, bot):
+        """Start posting digests from the bot's event loop."""
+        if self._task is None:
+            bot.add_dynamic_items(JoinRequestButton)
+            self._task = asyncio.create_task(self._run(bot))
+
+    async def _run(self, bot):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush(bot)
+            except Exception as e:
+                logger.error(f"Failed to post join request digests: {e}")
+
+    async def flush(self, bot):
+        """Post one digest per channel and squad with pending requests.
+
+        Requests are dropped from the queue only once their message is
+        sent, so those not posted when sending fails go out next time.
+        """
+        for key in list(self._pending):
+            channel_id = key[0]
+            channel = bot.get_channel(channel_id)
+            if channel is None:
+                logger.warning(f"Join request channel {channel_id} is gone")
+                del self._pending[key]
+                continue
+            mentions = " ".join(await find_admin_mentions(channel.guild))
+            requests = self._pending[key]
+            total = len(requests)
+            first = True
+            while requests:
+                batch = requests[:REQUESTS_PER_MESSAGE]
+                embed, view = self._digest(batch, total)
+                # Only ping admins once per digest
+                await channel.send(mentions if first else None,
+                                   embed=embed, view=view)
+                del requests[:len(batch)]
+                first = False
+            # Requests queued while sending were posted too
+            if self._pending.get(key) is requests:
+                del self._pending[key]
+            self.digests += 1
+
+    def _digest(self, requests, total):
+        squad = requests[0]["squad"]
+        embed = discord.Embed(
+            title=f"📥 Join Requests: {squad}",
+            description=f"{total} player{'s' if total != 1 else ''} "
+                        f"asked to join '{squad}'",
+            color=discord.Color.gold())
+        view = discord.ui.View(timeout=None)
+        for i, request in enumerate(requests):
+            player = request["player"]
+            roles = ", ".join(r.upper() for r in player.get("roles") or {}) or "None"
+            repeats = (f"\nAsked {request['repeats'] + 1} times"
+                       if request["repeats"] else "")
+            embed.add_field(
+                name=player["mlbb_username"],
+                value=(f"<@{player['id']}> - ID {player['mlbb_id']}\n"
+                       f"{player.get('max_rank', 'Unranked')} - "
+                       f"{player.get('win_rate', 'Unknown')} WR\n"
+                       f"Roles: {roles}{repeats}"),
+                inline=True)
+
+            if len(f"joinreq:approve:{request['user_id']}:{squad}") > MAX_CUSTOM_ID:
+                continue
+            name = player["mlbb_username"][:60]
+            for action, label in (("approve", f"✅ {name}"), ("deny", f"❌ {name}")):
+                button = JoinRequestButton(action, request["user_id"], squad,
+                                           label=label)
+                button.item.row = i // 2
+                view.add_item(button)
+        embed.set_footer(text="Admins/Mods: approve or deny with the buttons below")
+        return embed, view
+
+
+# Join requests of all guilds
+join_requests = JoinRequestDispatcher()
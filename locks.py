@@ -0,0 +1,174 @@
+# Keyed async locks serializing changes to the same players and squads
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from db import snapshot
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Waits longer than this are logged
+SLOW_WAIT_MS = 1000
+
+
+def player_key(guild_id, player_id):
+    """Return the lock key of a player in a guild's data."""
+    return (guild_id or 0, "player", player_id)
+
+
+def squad_key(guild_id, name):
+    """Return the lock key of a squad (by case-insensitive name)."""
+    return (guild_id or 0, "squad", name.lower())
+
+
+class LockStats:
+    """Counters for one kind of key ("player" or "squad")."""
+
+    def __init__(self):
+        self.acquisitions = 0
+        self.contended = 0  # acquisitions that had to wait
+        self.wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def as_dict(self):
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "avg_wait_ms": (self.wait_ms / self.contended
+                            if self.contended else 0.0),
+            "max_wait_ms": self.max_wait_ms,
+        }
+
+
+class KeyedLocks:
+    """One asyncio lock per key, created on demand and dropped when unused.
+
+    Commands that change different players or squads run concurrently, while
+    changes to the same ones are applied one after the other. Several keys
+    are always acquired in sorted order, so two commands locking overlapping
+    sets can't deadlock. Reads don't lock; they use store snapshots.
+    """
+
+    def __init__(self):
+        self._locks = {}  # key -> [asyncio.Lock, holders and waiters]
+        self._stats = {}  # key kind -> LockStats
+        self.waiting = 0
+
+    def _kind_stats(self, key):
+        stats = self._stats.get(key[1])
+        if stats is None:
+            stats = self._stats[key[1]] = LockStats()
+        return stats
+
+    def _release(self, key):
+        entry = self._locks[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[key]
+
+    async def _acquire(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        stats = self._kind_stats(key)
+        stats.acquisitions += 1
+        contended = entry[0].locked()
+        if contended:
+            self.waiting += 1
+        started = time.perf_counter()
+        try:
+            await entry[0].acquire()
+        except BaseException:
+            # Cancelled while waiting: the key isn't held
+            self._release(key)
+            raise
+        finally:
+            if contended:
+                self.waiting -= 1
+        if contended:
+            waited = (time.perf_counter() - started) * 1000
+            stats.contended += 1
+            stats.wait_ms += waited
+            stats.max_wait_ms = max(stats.max_wait_ms, waited)
+            if waited > SLOW_WAIT_MS:
+                logger.warning(f"Waited {waited:.0f} ms for the lock of {key}")
+
+    @asynccontextmanager
+    async def hold(self, *keys):
+        """Hold the locks of the given keys (duplicates are ignored)."""
+        held = []
+        try:
+            for key in sorted(set(keys)):
+                await self._acquire(key)
+                held.append(key)
+            yield
+        finally:
+            for key in reversed(held):
+                self._locks[key][0].release()
+                self._release(key)
+
+    @asynccontextmanager
+    async def hold_all(self, keys, more_keys):
+        """Hold `keys` plus the keys returned by `more_keys()`.
+
+        `more_keys` reads the keys from the data (e.g. a squad's members),
+        which can change while waiting. It's called again once the locks are
+        held, and if it returns new keys all locks are released and acquired
+        again with them, still in sorted order.
+        """
+        wanted = set(keys) | set(more_keys())
+        while True:
+            async with self.hold(*wanted):
+                current = set(more_keys())
+                if current <= wanted:
+                    yield
+                    return
+            wanted |= current
+
+    def stats(self):
+        """Return {key kind: counters}, plus the keys currently locked."""
+        return {
+            "locked": sum(1 for lock, _ in self._locks.values() if lock.locked()),
+            "waiting": self.waiting,
+            "kinds": {kind: s.as_dict() for kind, s in sorted(self._stats.items())},
+        }
+
+
+# Locks of the data changed by commands
+store_locks = KeyedLocks()
+
+
+def lock_for(ctx, players=(), squads=(), members_of=None):
+    """Return a context manager holding the locks of players and squads in
+    the guild a command runs in.
+
+    With `members_of`, the current members of that squad are locked too.
+    """
+    guild_id = ctx.guild.id if ctx.guild else None
+    keys = ([player_key(guild_id, p) for p in players]
+            + [squad_key(guild_id, s) for s in squads])
+    if members_of is None:
+        return store_locks.hold(*keys)
+    return store_locks.hold_all(keys, lambda: [
+        player_key(guild_id, p["id"])
+        for p in snapshot().squad_members(members_of)])
+
+
+def lock_store(ctx, players=(), squads=()):
+    """Return a context manager holding the locks of every player and squad
+    in the guild a command runs in, plus the given ones.
+
+    For commands that replace all of a guild's data, e.g. a restore.
+    """
+    guild_id = ctx.guild.id if ctx.guild else None
+    keys = ([player_key(guild_id, p) for p in players]
+            + [squad_key(guild_id, s) for s in squads])
+
+    def current_keys():
+        state = snapshot()
+        return ([player_key(guild_id, p["id"]) for p in state.players]
+                + [squad_key(guild_id, s["name"]) for s in state.squads])
+
+    return store_locks.hold_all(keys, current_keys)
@@ -0,0 +1,240 @@
+# Logging setup: structured logs written off the event loop
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+import logging.handlers
+from datetime import datetime, timezone
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Root level, and per-subsystem levels such as
+# NB_LOG_LEVELS="discord=INFO,discord.gateway=WARNING,db=DEBUG"
+LOG_LEVEL = os.getenv("NB_LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("NB_LOG_LEVELS", "")
+# "json" for one JSON object per line, "text" for human readable lines
+LOG_FORMAT = os.getenv("NB_LOG_FORMAT", "json")
+# Write logs to this file instead of stderr
+LOG_FILE = os.getenv("NB_LOG_FILE")
+# Records per second let through for noisy loggers (warnings always pass),
+# e.g. NB_LOG_RATE_LIMITS="discord.gateway=5,discord.http=10"
+LOG_RATE_LIMITS = os.getenv("NB_LOG_RATE_LIMITS", "")
+
+# Levels used unless overridden by NB_LOG_LEVELS
+DEFAULT_LEVELS = {
+    "discord": "INFO",
+    "discord.gateway": "WARNING",
+    "werkzeug": "INFO",
+}
+DEFAULT_RATE_LIMITS = {
+    "discord.gateway": 5,
+    "discord.http": 10,
+}
+
+# Bound on queued records; if the writer falls behind, records are dropped
+# instead of blocking the thread that logs
+QUEUE_SIZE = 10000
+
+# Correlation fields of the command or request being handled
+_log_context = contextvars.ContextVar("log_context", default=None)
+
+
+def _parse_pairs(text):
+    """Parse "name=value,name=value" into a dict."""
+    pairs = {}
+    for item in text.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            pairs[name.strip()] = value.strip()
+    return pairs
+
+
+def set_log_context(correlation_id, **fields):
+    """Tag log records from the current context with a correlation id.
+
+    Returns a token that can be passed to reset_log_context().
+    """
+    return _log_context.set({"correlation_id": correlation_id, **fields})
+
+
+def reset_log_context(token):
+    """Restore the log context from before set_log_context()."""
+    _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the correlation fields onto records, in the thread that logs."""
+
+    def filter(self, record):
+        context = _log_context.get()
+        if context:
+            for name, value in context.items():
+                setattr(record, name, value)
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most N records per second through for configured loggers.
+
+    Limits apply to a logger and its children. Warnings and errors always
+    pass. The next record let through carries the number suppressed.
+    """
+
+    def __init__(self, limits):
+        super().__init__()
+        self.limits = limits
+        self._windows = {}  # limited logger -> [window start, count, dropped]
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _limit_for(self, name):
+        while name:
+            if name in self.limits:
+                return name, self.limits[name]
+            name = name.rpartition(".")[0]
+        return None, None
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        name, limit = self._limit_for(record.name)
+        if name is None:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(name)
+            if window is None or now - window[0] >= 1:
+                window = self._windows[name] = [now, 0, window[2] if window else 0]
+            if window[1] >= limit:
+                window[2] += 1
+                self.dropped += 1
+                return False
+            window[1] += 1
+            if window[2]:
+                record.suppressed = window[2]
+                window[2] = 0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    # LogRecord attributes that aren't extra fields
+    _STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+        "message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc)
+                          .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for name, value in vars(record).items():
+            if name not in self._STANDARD and not name.startswith("_"):
+                entry[name] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human readable lines, with the correlation id when there is one."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        correlation_id = getattr(record, "correlation_id", None)
+        if correlation_id:
+            line = f"[{correlation_id}] {line}"
+        if getattr(record, "suppressed", None):
+            line += f" ({record.suppressed} similar records suppressed)"
+        return line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps tracebacks apart and never blocks."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Only merge the message args here (they may change after the call);
+        # all other formatting is left to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # The writer fell behind: drop rather than block the caller
+            self.dropped += 1
+
+
+_listener = None
+
+
+def setup_logging():
+    """Route all logging through a queue to a background writer thread.
+
+    Loggers only filter records and put them on a queue; formatting and I/O
+    happen on the listener thread. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    levels = {**DEFAULT_LEVELS, **_parse_pairs(LOG_LEVELS)}
+    limits = {**DEFAULT_RATE_LIMITS,
+              **{name: int(value)
+                 for name, value in _parse_pairs(LOG_RATE_LIMITS).items()}}
+
+    if LOG_FILE:
+        output = logging.FileHandler(LOG_FILE, encoding="utf-8")
+    else:
+        output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json"
+                        else TextFormatter())
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    queue_handler.addFilter(RateLimitFilter(limits))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL.upper())
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, output,
+                                               respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    logger.info(f"Logging to {LOG_FILE or 'stderr'} as {LOG_FORMAT} "
+                f"(level {LOG_LEVEL.upper()}, overrides {levels})")
+    return _listener
@@ -0,0 +1,161 @@
+# Event loop stall detection for the bot
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+import weakref
+from collections import deque
+from datetime import datetime, timezone
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# A stall is reported when the loop takes longer than this to run a callback
+STALL_THRESHOLD_MS = float(os.getenv("NB_STALL_THRESHOLD_MS", "250"))
+# Number of stall reports kept
+STALL_HISTORY = int(os.getenv("NB_STALL_HISTORY", "50"))
+# Set NB_STALL_WATCHDOG=0 to turn the watchdog off
+WATCHDOG_ENABLED = os.getenv("NB_STALL_WATCHDOG", "1") == "1"
+
+# Innermost frames of the loop thread kept in a report
+MAX_STACK_FRAMES = 12
+
+
+class LoopWatchdog:
+    """Watch an asyncio loop from a thread and record where it stalls.
+
+    The watchdog thread keeps one ping queued on the loop at a time. If the
+    ping hasn't run after the threshold, the loop is blocked: the loop
+    thread's stack and the command that was running are captured into a
+    ring buffer, and the stall's length is filled in once the ping runs.
+    """
+
+    def __init__(self, threshold_ms=STALL_THRESHOLD_MS, history=STALL_HISTORY):
+        self.threshold = threshold_ms / 1000
+        self.interval = self.threshold / 4
+        self.stalls = deque(maxlen=history)
+        self.total_stalls = 0
+        self.max_lag_ms = 0.0
+        self._commands = weakref.WeakKeyDictionary()  # task -> command info
+        self._lock = threading.Lock()
+        self._loop = None
+        self._loop_thread_id = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._ping_sent = None  # monotonic time of the unanswered ping
+        self._current = None  # report of the stall in progress
+
+    def start(self, loop=None):
+        """Start watching a loop; must be called from the loop's thread."""
+        if self._thread is not None:
+            return
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._watch,
+                                        name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Loop watchdog started (threshold "
+                    f"{self.threshold * 1000:.0f} ms)")
+
+    def stop(self):
+        """Stop the watchdog thread."""
+        self._stopped.set()
+
+    def command_started(self, ctx):
+        """Remember the command the current task is running."""
+        task = asyncio.current_task()
+        if task is not None:
+            self._commands[task] = {
+                "command": ctx.command.qualified_name if ctx.command else None,
+                "guild_id": ctx.guild.id if ctx.guild else None,
+            }
+
+    def command_finished(self, ctx):
+        """Forget the command of the current task."""
+        task = asyncio.current_task()
+        if task is not None:
+            self._commands.pop(task, None)
+
+    def _pong(self, sent):
+        """Runs on the loop: the loop is responsive again."""
+        lag = time.monotonic() - sent
+        with self._lock:
+            self._ping_sent = None
+            self.max_lag_ms = max(self.max_lag_ms, lag * 1000)
+            report, self._current = self._current, None
+            if report is not None:
+                report["duration_ms"] = round(lag * 1000, 1)
+                report["ongoing"] = False
+        if report is not None:
+            logger.warning(
+                f"Event loop stalled for {report['duration_ms']:.0f} ms "
+                f"in {report['command'] or 'no command'} at "
+                f"{report['stack'][-1].strip() if report['stack'] else '?'}")
+
+    def _running_command(self):
+        """Return the info of the command whose task holds the loop."""
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            return None
+        return self._commands.get(task) if task is not None else None
+
+    def _capture(self, lag):
+        """Record a stall that is still in progress."""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame)[-MAX_STACK_FRAMES:] if frame else []
+        command = self._running_command() or {}
+        report = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(lag * 1000, 1),
+            "ongoing": True,
+            "command": command.get("command"),
+            "guild_id": command.get("guild_id"),
+            "stack": stack,
+        }
+        with self._lock:
+            self._current = report
+            self.stalls.append(report)
+            self.total_stalls += 1
+
+    def _watch(self):
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            with self._lock:
+                sent, stalled = self._ping_sent, self._current is not None
+                if sent is None:
+                    self._ping_sent = now
+            if sent is None:
+                try:
+                    self._loop.call_soon_threadsafe(self._pong, now)
+                except RuntimeError:
+                    # The loop was closed
+                    break
+            elif not stalled and now - sent >= self.threshold:
+                self._capture(now - sent)
+            time.sleep(self.interval)
+        self._thread = None
+
+    def recent(self, limit=None):
+        """Return copies of the latest stall reports, newest first."""
+        with self._lock:
+            reports = [dict(r) for r in reversed(self.stalls)]
+        return reports[:limit] if limit else reports
+
+    def stats(self):
+        """Return watchdog settings and counters."""
+        with self._lock:
+            return {
+                "running": self._thread is not None,
+                "threshold_ms": self.threshold * 1000,
+                "total_stalls": self.total_stalls,
+                "max_lag_ms": round(self.max_lag_ms, 1),
+                "stalled_now": self._current is not None,
+            }
+
+
+# Watchdog for the bot's event loop
+watchdog = LoopWatchdog()
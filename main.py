@@ -2,29 +2,149 @@
 # Handles both the Discord bot and the Flask web server
 
 import os
+import hmac
+import uuid
 import threading
 import logging
-from flask import Flask, render_template
-from bot import run_bot
+from flask import Flask, Response, request, jsonify, send_file, abort
+from logconfig import setup_logging, set_log_context
+from bot import bot, run_bot
+from loopwatch import watchdog
+from history import stat_history, STAT_ALIASES
+from icons import icon_cache, ICON_MAX_AGE
+from dashboard import dashboard
+from db import (use_guild, reset_guild, stored_guilds, squads_page,
+                free_agents_page)
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+# Set up logging: JSON records written by a background thread
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET")
 
+# Largest page the listing APIs return
+MAX_PAGE_SIZE = 200
+# Token the operator endpoints (stalls, and the listings exposing Discord
+# ids and player details) require as "Authorization: Bearer <token>"; they
+# are disabled when it isn't set
+OPERATOR_TOKEN = os.getenv("NB_OPERATOR_TOKEN")
+
 # Start the Discord bot in a separate thread
 bot_thread = threading.Thread(target=run_bot)
 bot_thread.daemon = True
 bot_thread.start()
 logger.info("Started Discord bot thread")
 
+@app.before_request
+def tag_request_logs():
+    """Give each web request its own correlation id in the logs."""
+    set_log_context(uuid.uuid4().hex[:12], path=request.path)
+
 @app.route('/')
 def index():
     """Homepage route for the web application."""
-    return render_template('index.html')
+    page = dashboard.page(bot, request.args.get('guild', type=int))
+    if page is None:
+        abort(404)
+    compressed = page["gzip"] is not None and request.accept_encodings["gzip"]
+    if compressed:
+        response = Response(page["gzip"], mimetype="text/html")
+        response.headers["Content-Encoding"] = "gzip"
+        response.set_etag(f"{page['etag']}-gz")
+    else:
+        response = Response(page["body"], mimetype="text/html")
+        response.set_etag(page["etag"])
+    response.vary.add("Accept-Encoding")
+    # Cached, but revalidated since the page changes with the data
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def _is_operator():
+    """Return True if the request carries the operator token."""
+    if not OPERATOR_TOKEN:
+        return False
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return (scheme.lower() == "bearer"
+            and hmac.compare_digest(token.encode(), OPERATOR_TOKEN.encode()))
+
+@app.route('/api/stalls')
+def stalls():
+    """Recent Discord bot event loop stalls, newest first."""
+    if not _is_operator():
+        abort(404)
+    limit = request.args.get('limit', type=int)
+    return jsonify(stats=watchdog.stats(), stalls=watchdog.recent(limit))
+
+@app.route('/api/history/<int:player_id>')
+def player_history(player_id):
+    """Win rate and rank history of a player, oldest point first."""
+    stat = request.args.get('stat')
+    if stat is not None and stat.lower() not in STAT_ALIASES:
+        return jsonify(error=f"Unknown stat '{stat}'"), 400
+    history = stat_history.history(_guild_arg(), player_id,
+                                   STAT_ALIASES[stat.lower()] if stat else None)
+    return jsonify(player_id=player_id, history={
+        name: [{"time": when, "value": value} for when, value in points]
+        for name, points in history.items()})
+
+@app.route('/icons/<hero>')
+def hero_icon(hero):
+    """A hero's icon from the local cache, as a thumbnail with ?size=."""
+    entry = icon_cache.get(hero, request.args.get('size', type=int))
+    if entry is None:
+        abort(404)
+    try:
+        # Answers If-None-Match with 304 and sets Cache-Control
+        return send_file(entry["path"], mimetype=entry["mimetype"],
+                         etag=entry["etag"], conditional=True,
+                         max_age=ICON_MAX_AGE)
+    except FileNotFoundError:
+        # Evicted since it was looked up
+        abort(404)
+
+def _guild_arg():
+    """Return the ?guild= of a request, or answer 404 if it has no data."""
+    guild_id = request.args.get('guild', type=int)
+    if guild_id not in stored_guilds():
+        abort(404)
+    return guild_id
+
+def _page_args():
+    """Return (page, per_page) of a listing request."""
+    page = request.args.get('page', default=1, type=int)
+    per_page = request.args.get('per_page', default=50, type=int)
+    return max(page, 1), min(max(per_page, 1), MAX_PAGE_SIZE)
+
+@app.route('/api/squads')
+def list_squads():
+    """A page of squads with their member counts, sorted by name."""
+    if not _is_operator():
+        abort(404)
+    page, per_page = _page_args()
+    token = use_guild(_guild_arg(), create=False)
+    try:
+        squads, total = squads_page(page, per_page)
+    finally:
+        reset_guild(token)
+    return jsonify(page=page, per_page=per_page, total=total, squads=[
+        dict(squad, members=members) for squad, members in squads])
+
+@app.route('/api/free_agents')
+def list_free_agents():
+    """A page of players without a squad, sorted by MLBB username."""
+    if not _is_operator():
+        abort(404)
+    page, per_page = _page_args()
+    token = use_guild(_guild_arg(), create=False)
+    try:
+        players, total = free_agents_page(page, per_page)
+    finally:
+        reset_guild(token)
+    return jsonify(page=page, per_page=per_page, total=total,
+                   players=[dict(player, roles=dict(player["roles"]))
+                            for player in players])
 
 def run_flask():
     """Run the Flask web server."""
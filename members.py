@@ -0,0 +1,168 @@
+# Lazy guild member resolution for the bot
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+import discord
+from utils import MODERATOR_ROLE_ID
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Lazy member mode: don't chunk or cache every guild member at startup,
+# resolve the members commands need through a bounded cache instead
+LAZY_MEMBERS = os.getenv("NB_LAZY_MEMBERS", "0") == "1"
+MEMBER_CACHE_SIZE = int(os.getenv("NB_MEMBER_CACHE_SIZE", "5000"))
+
+# Discord accepts at most 100 user ids per member query
+QUERY_BATCH_SIZE = 100
+
+# Seconds a user not found in a guild is remembered as missing, so someone
+# who joins after a failed lookup is found again soon
+MISSING_TTL = int(os.getenv("NB_MEMBER_MISSING_TTL", "300"))
+
+
+class _Missing:
+    """Cached marker for a user that was not a member of the guild."""
+
+    __slots__ = ("expires",)
+
+    def __init__(self):
+        self.expires = time.monotonic() + MISSING_TTL
+
+
+class MemberCache:
+    """Bounded LRU cache of guild members, filled by batched queries."""
+
+    def __init__(self, max_size=MEMBER_CACHE_SIZE):
+        self.max_size = max_size
+        self._members = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+
+    def _get(self, guild, user_id):
+        """Return a cached member, a _Missing marker, or None if unknown."""
+        key = (guild.id, user_id)
+        member = self._members.get(key)
+        if isinstance(member, _Missing) and member.expires <= time.monotonic():
+            # Look the user up again, they may have joined since
+            del self._members[key]
+            member = None
+        if member is not None:
+            self._members.move_to_end(key)
+            return member
+
+        # Members the library happens to hold (e.g. the bot itself)
+        member = guild.get_member(user_id)
+        if member is not None:
+            self.put(guild, user_id, member)
+        return member
+
+    def put(self, guild, user_id, member):
+        """Cache a member (or None for a user that isn't in the guild)."""
+        key = (guild.id, user_id)
+        self._members[key] = member if member is not None else _Missing()
+        self._members.move_to_end(key)
+        while len(self._members) > self.max_size:
+            self._members.popitem(last=False)
+
+    async def _query(self, guild, user_ids):
+        """Fetch members by id, batching gateway queries."""
+        found = {}
+        for start in range(0, len(user_ids), QUERY_BATCH_SIZE):
+            batch = user_ids[start:start + QUERY_BATCH_SIZE]
+            self.queries += 1
+            try:
+                members = await guild.query_members(user_ids=batch,
+                                                    limit=len(batch),
+                                                    cache=False)
+            except (asyncio.TimeoutError, discord.ClientException) as e:
+                # Fall back to the HTTP API when the gateway query fails
+                logger.warning(f"Member query failed, using HTTP: {e}")
+                members = []
+                for user_id in batch:
+                    try:
+                        members.append(await guild.fetch_member(user_id))
+                    except discord.HTTPException:
+                        pass
+            found.update((m.id, m) for m in members)
+        return found
+
+    async def resolve_many(self, guild, user_ids):
+        """Resolve user ids to members, returning {user_id: member or None}."""
+        result = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            member = self._get(guild, user_id)
+            if member is None:
+                missing.append(user_id)
+                continue
+            self.hits += 1
+            result[user_id] = None if isinstance(member, _Missing) else member
+
+        if missing:
+            self.misses += len(missing)
+            found = await self._query(guild, missing)
+            for user_id in missing:
+                member = found.get(user_id)
+                self.put(guild, user_id, member)
+                result[user_id] = member
+        return result
+
+    async def resolve(self, guild, user_id):
+        """Resolve a single user id to a member, or None."""
+        return (await self.resolve_many(guild, [user_id]))[user_id]
+
+    def stats(self):
+        """Return cache size and hit/miss counters."""
+        return {
+            "size": len(self._members),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "queries": self.queries,
+        }
+
+
+# Shared member cache
+member_cache = MemberCache()
+
+
+def bot_member_options():
+    """Return the Bot keyword arguments for the configured member mode."""
+    if not LAZY_MEMBERS:
+        return {}
+    return {
+        "chunk_guilds_at_startup": False,
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+    }
+
+
+async def find_admin_mentions(guild, limit=3):
+    """Return mentions to notify the guild's admins and moderators.
+
+    With the full member cache this scans members for admins, mods and the
+    owner. In lazy mode the member list isn't available, so the owner and the
+    moderator role are mentioned instead.
+    """
+    mod_role = guild.get_role(MODERATOR_ROLE_ID)
+
+    if not LAZY_MEMBERS or guild.chunked:
+        admins = []
+        for member in guild.members:
+            # Check if member is admin, mod, or server owner
+            if (member.guild_permissions.administrator
+                    or (mod_role and mod_role in member.roles)
+                    or member.id == guild.owner_id):
+                admins.append(member.mention)
+        return admins[:limit]
+
+    mentions = []
+    owner = await member_cache.resolve(guild, guild.owner_id)
+    if owner:
+        mentions.append(owner.mention)
+    if mod_role:
+        mentions.append(mod_role.mention)
+    return mentions[:limit]
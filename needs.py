@@ -0,0 +1,286 @@
+# Squad role-need subscriptions matched against free agents
+import asyncio
+import logging
+import threading
+from bisect import insort, bisect_right
+from datetime import datetime, timezone
+from db import (load_document, save_document, add_change_listener, snapshot,
+                use_guild, reset_guild, partition_dir)
+from ranks import parse_rank, rank_label
+from availability import parse_availability
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Document holding a partition's needs
+NEEDS_DOCUMENT = "needs"
+
+# Matches shown when a need is registered
+MAX_MATCHES_SHOWN = 10
+# (need, player) pairs remembered so nobody is notified twice
+MAX_NOTIFIED = 50000
+
+
+def player_matches(need, player, rank_score=None, mask=None):
+    """Check a player against a need's rank and availability requirements."""
+    if player["squad"].strip() or need["role"] not in (player.get("roles") or {}):
+        return False
+    if need.get("min_rank") is not None:
+        if rank_score is None:
+            rank_score = parse_rank(player.get("max_rank"))
+        if rank_score is None or rank_score < need["min_rank"]:
+            return False
+    if need.get("availability"):
+        if mask is None:
+            mask = parse_availability(player.get("availability"))
+        if not mask or not mask & need["mask"]:
+            return False
+    return True
+
+
+class NeedMatcher:
+    """Open needs of one partition, indexed by role and minimum rank.
+
+    Per role, needs are kept sorted by minimum rank, so matching a player
+    only looks at needs for the roles they play that their rank qualifies
+    for, never at every squad.
+    """
+
+    def __init__(self, needs, next_id=1):
+        self.needs = {}
+        self.by_role = {}  # role -> sorted [(min rank, need id)]
+        for need in needs:
+            self.add(need)
+        # Ids are never reused, so a new need isn't mistaken for a removed one
+        self.next_id = max(next_id, max(self.needs, default=0) + 1)
+
+    def add(self, need):
+        need["mask"] = (parse_availability(need["availability"])
+                        if need.get("availability") else None)
+        self.needs[need["id"]] = need
+        min_rank = need["min_rank"] if need.get("min_rank") is not None else -1
+        insort(self.by_role.setdefault(need["role"], []), (min_rank, need["id"]))
+
+    def remove(self, need_id):
+        need = self.needs.pop(need_id, None)
+        if need is None:
+            return None
+        min_rank = need["min_rank"] if need.get("min_rank") is not None else -1
+        self.by_role[need["role"]].remove((min_rank, need_id))
+        return need
+
+    def match(self, player):
+        """Return the needs a free agent matches."""
+        if player["squad"].strip():
+            return []
+        rank_score = parse_rank(player.get("max_rank"))
+        mask = parse_availability(player.get("availability"))
+        matches = []
+        for role in player.get("roles") or {}:
+            entries = self.by_role.get(role)
+            if not entries:
+                continue
+            # Only needs with a minimum rank the player reaches
+            limit = bisect_right(entries, (-1 if rank_score is None
+                                           else rank_score, float("inf")))
+            for _, need_id in entries[:limit]:
+                need = self.needs[need_id]
+                if player_matches(need, player, rank_score, mask):
+                    matches.append(need)
+        return matches
+
+
+def format_need(need):
+    """Return a short description such as "JUNGLE, Legend V+, weekends"."""
+    parts = [need["role"].upper()]
+    if need.get("min_rank") is not None:
+        parts.append(f"{rank_label(need['min_rank'])}+")
+    if need.get("availability"):
+        parts.append(need["availability"])
+    return ", ".join(parts)
+
+
+def _stored(need):
+    """Return a need without fields derived at load time."""
+    return {key: value for key, value in need.items() if key != "mask"}
+
+
+class NeedBoard:
+    """Needs of every partition, and notifications for new matches.
+
+    Saves only queue their player changes; they are matched against the
+    needs in a worker thread and the matches notified on the event loop.
+    """
+
+    def __init__(self):
+        # Keyed by partition directory, as guilds may share a partition
+        self._matchers = {}  # data dir -> NeedMatcher
+        self._lock = threading.Lock()
+        self._notified = set()  # (data dir, need id, player id)
+        self._loop = None
+        self._queue = None
+        self._task = None
+        add_change_listener(self._players_changed)
+
+    def _matcher(self, guild_id):
+        token = use_guild(guild_id)
+        try:
+            data_dir = partition_dir()
+            matcher = self._matchers.get(data_dir)
+            if matcher is None:
+                document = load_document(NEEDS_DOCUMENT, default=[])
+                if isinstance(document, list):
+                    # Written before need ids were counted
+                    matcher = NeedMatcher(document)
+                else:
+                    matcher = NeedMatcher(document["needs"],
+                                          document["next_id"])
+                matcher.data_dir = data_dir
+                self._matchers[data_dir] = matcher
+        finally:
+            reset_guild(token)
+        return matcher
+
+    def _save(self, guild_id, matcher):
+        token = use_guild(guild_id)
+        try:
+            return save_document(NEEDS_DOCUMENT, {
+                "next_id": matcher.next_id,
+                "needs": [_stored(n) for n in matcher.needs.values()],
+            })
+        finally:
+            reset_guild(token)
+
+    def needs(self, guild_id, squad=None):
+        """Return a guild's open needs, optionally for one squad."""
+        with self._lock:
+            needs = list(self._matcher(guild_id).needs.values())
+        if squad:
+            needs = [n for n in needs if n["squad"].lower() == squad.lower()]
+        return needs
+
+    def add(self, guild_id, squad, role, created_by, channel_id,
+            min_rank=None, availability=None):
+        """Register a need; returns it, or None if it couldn't be saved."""
+        with self._lock:
+            matcher = self._matcher(guild_id)
+            need = {
+                "id": matcher.next_id,
+                "squad": squad,
+                "role": role,
+                "min_rank": min_rank,
+                "availability": availability,
+                "created_by": created_by,
+                "channel_id": channel_id,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+            matcher.add(need)
+            matcher.next_id += 1
+            if not self._save(guild_id, matcher):
+                matcher.remove(need["id"])
+                return None
+        return need
+
+    def _forget_notified(self, matcher, need_ids):
+        """Drop the notifications sent for removed needs."""
+        need_ids = set(need_ids)
+        self._notified = {key for key in self._notified
+                          if key[0] != matcher.data_dir or key[1] not in need_ids}
+
+    def remove(self, guild_id, need_id):
+        """Remove a need; returns it, or None if there is no such need."""
+        with self._lock:
+            matcher = self._matcher(guild_id)
+            need = matcher.remove(need_id)
+            if need is not None and not self._save(guild_id, matcher):
+                matcher.add(need)
+                return None
+            if need is not None:
+                self._forget_notified(matcher, [need_id])
+        return need
+
+    def remove_squad(self, guild_id, squad):
+        """Remove every need of a squad, e.g. when it is deleted."""
+        with self._lock:
+            matcher = self._matcher(guild_id)
+            removed = [matcher.remove(n["id"]) for n in list(matcher.needs.values())
+                       if n["squad"].lower() == squad.lower()]
+            if removed:
+                self._save(guild_id, matcher)
+                self._forget_notified(matcher, [n["id"] for n in removed])
+        return removed
+
+    def find_players(self, guild_id, need, limit=MAX_MATCHES_SHOWN):
+        """Return free agents matching a need, best ranked first."""
+        token = use_guild(guild_id)
+        try:
+            candidates = [p for p in snapshot().free_agents()
+                          if player_matches(need, p)]
+        finally:
+            reset_guild(token)
+        candidates.sort(key=lambda p: -(parse_rank(p.get("max_rank")) or 0))
+        return candidates[:limit]
+
+    def _is_new_candidate(self, old, new):
+        """Whether a player change can create new matches."""
+        if new is None or new["squad"].strip():
+            return False
+        return (old is None or old["squad"].strip()
+                or old.get("roles") != new.get("roles")
+                or old.get("max_rank") != new.get("max_rank")
+                or old.get("availability") != new.get("availability"))
+
+    def _players_changed(self, guild_id, changes):
+        """Store change listener: queue the changes for matching."""
+        if changes and self._queue is not None:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait,
+                                            (guild_id, changes))
+
+    def _match(self, guild_id, changes):
+        """Return the (need, player) matches of registered, updated or freed
+        players that weren't notified yet."""
+        matches = []
+        with self._lock:
+            matcher = self._matcher(guild_id)
+            if not matcher.needs:
+                return matches
+            for old, new in changes:
+                if not self._is_new_candidate(old, new):
+                    continue
+                for need in matcher.match(new):
+                    key = (matcher.data_dir, need["id"], new["id"])
+                    if key in self._notified:
+                        continue
+                    if len(self._notified) >= MAX_NOTIFIED:
+                        self._notified.clear()
+                    self._notified.add(key)
+                    matches.append((need, new))
+        return matches
+
+    def start(self, notify):
+        """Deliver matches by awaiting notify(need, player) on this loop."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._deliver(notify))
+
+    async def _deliver(self, notify):
+        while True:
+            guild_id, changes = await self._queue.get()
+            try:
+                matches = await asyncio.to_thread(self._match, guild_id,
+                                                  changes)
+            except Exception as e:
+                logger.error(f"Failed to match needs: {e}")
+                continue
+            for need, player in matches:
+                try:
+                    await notify(need, player)
+                except Exception as e:
+                    logger.warning(f"Failed to notify need {need['id']} match "
+                                   f"{player['id']}: {e}")
+
+
+# Needs of all partitions
+need_board = NeedBoard()
@@ -0,0 +1,195 @@
+# Newline-delimited players file with a persistent id -> offset index
+import os
+import json
+import mmap
+import struct
+import logging
+import secrets
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from records import player_record
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Decoded records kept in front of the file, per open file
+HOT_CACHE_SIZE = int(os.getenv("NB_PLAYER_CACHE_SIZE", "1024"))
+
+# First line of a players file
+FILE_FORMAT = "nb-players"
+
+# Index header: magic, format version, generation of the players file it
+# belongs to, then the record count. The header is followed by the sorted
+# player ids and their byte offsets, as two arrays of int64.
+INDEX_MAGIC = b"NBPIDX"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<6sH16sQ")
+
+
+def index_path(path):
+    """Return the path of a players file's index."""
+    return f"{path}.idx"
+
+
+def write_players(path, players):
+    """Write players and their index, atomically replacing both files.
+
+    Every write gets a new generation, stored in both files, so readers can
+    tell an index that doesn't belong to the data file they opened.
+    """
+    generation = secrets.token_bytes(16)
+    entries = []
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(json.dumps({"format": FILE_FORMAT,
+                            "generation": generation.hex()}).encode() + b"\n")
+        for player in players:
+            if type(player["id"]) is int:
+                entries.append((player["id"], f.tell()))
+            f.write(json.dumps(player, default=dict,
+                               separators=(",", ":")).encode() + b"\n")
+
+    entries.sort()
+    ids = array("q", (player_id for player_id, _ in entries))
+    offsets = array("q", (offset for _, offset in entries))
+    tmp_index = f"{index_path(path)}.{os.getpid()}.tmp"
+    with open(tmp_index, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, generation,
+                                  len(entries)))
+        f.write(ids.tobytes())
+        f.write(offsets.tobytes())
+
+    # Index first: a reader that sees the new index with the old data
+    # notices the generation mismatch and indexes the data itself
+    os.replace(tmp_index, index_path(path))
+    os.replace(tmp_path, path)
+
+
+def _read_header(line):
+    """Return the generation of a players file from its first line."""
+    try:
+        header = json.loads(line)
+        if header.get("format") == FILE_FORMAT:
+            return bytes.fromhex(header["generation"])
+    except (ValueError, AttributeError, KeyError):
+        pass
+    return None
+
+
+def read_players(path):
+    """Read every player of a players file as dicts."""
+    with open(path, 'rb') as f:
+        first = f.readline()
+        players = [] if _read_header(first) else [json.loads(first)]
+        players.extend(json.loads(line) for line in f if line.strip())
+    return players
+
+
+class PlayerFile:
+    """Memory-mapped players file that decodes records on demand.
+
+    Lookups binary-search the id index and decode just the matching line;
+    recently used records are kept in a small LRU cache. An open PlayerFile
+    keeps reading the file it opened even after a writer replaces it, so
+    open a new one when the file's signature changes.
+    """
+
+    def __init__(self, path, cache_size=HOT_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            # Same format as the store's file signatures
+            self.signature = [stat.st_mtime_ns, stat.st_size]
+            self._data = (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                          if stat.st_size else b"")
+
+        first_end = self._data.find(b"\n")
+        self.generation = _read_header(self._data[:first_end if first_end >= 0
+                                                  else len(self._data)])
+        self._ids, self._offsets = self._load_index()
+
+    def _load_index(self):
+        """Map the persistent index, or index the data if it doesn't match."""
+        try:
+            with open(index_path(self.path), 'rb') as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, generation, count = INDEX_HEADER.unpack_from(index)
+            if (magic == INDEX_MAGIC and version == INDEX_VERSION
+                    and self.generation is not None
+                    and generation == self.generation
+                    and len(index) == INDEX_HEADER.size + 16 * count):
+                view = memoryview(index)[INDEX_HEADER.size:]
+                return view[:8 * count].cast("q"), view[8 * count:].cast("q")
+            logger.info(f"Index of {self.path} is stale, rebuilding in memory")
+        except (OSError, ValueError, struct.error) as e:
+            logger.info(f"No usable index for {self.path} ({e}), rebuilding "
+                        f"in memory")
+        return self._build_index()
+
+    def _build_index(self):
+        entries = []
+        for offset, line in self._lines():
+            player_id = json.loads(line).get("id")
+            if type(player_id) is int:
+                entries.append((player_id, offset))
+        entries.sort()
+        return (array("q", (player_id for player_id, _ in entries)),
+                array("q", (offset for _, offset in entries)))
+
+    def _lines(self):
+        """Yield (offset, line) for every record line."""
+        data = self._data
+        offset = 0
+        if self.generation is not None:
+            offset = data.find(b"\n") + 1
+        while offset < len(data):
+            end = data.find(b"\n", offset)
+            if end < 0:
+                end = len(data)
+            if end > offset:
+                yield offset, data[offset:end]
+            offset = end + 1
+
+    def __len__(self):
+        return len(self._ids)
+
+    def get(self, player_id):
+        """Return a player's read-only record, or None."""
+        with self._lock:
+            record = self._cache.get(player_id)
+            if record is not None:
+                self._cache.move_to_end(player_id)
+                self.hits += 1
+                return record
+            self.misses += 1
+
+        position = bisect_left(self._ids, player_id)
+        if position == len(self._ids) or self._ids[position] != player_id:
+            return None
+        offset = self._offsets[position]
+        end = self._data.find(b"\n", offset)
+        record = player_record(json.loads(
+            self._data[offset:end if end >= 0 else len(self._data)]))
+
+        with self._lock:
+            self._cache[player_id] = record
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return record
+
+    def stats(self):
+        return {
+            "players": len(self),
+            "cached": len(self._cache),
+            "cache_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,298 @@
+# Rank and win rate parsing for player profiles
+import re
+import logging
+from array import array
+from db import register_index
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Ranks below Mythic: (name, divisions, stars per division), lowest first.
+# A rank's score is the number of stars needed to reach it from Warrior III.
+DIVISION_TIERS = [
+    ("warrior", 3, 3),
+    ("elite", 3, 4),
+    ("master", 4, 4),
+    ("grandmaster", 5, 5),
+    ("epic", 5, 5),
+    ("legend", 5, 5),
+]
+
+# Mythic tiers: (name, minimum mythic stars), highest first so that
+# "Mythical Glory" is matched before "Mythic"
+MYTHIC_TIERS = [
+    ("immortal", 100),
+    ("glory", 50),
+    ("honor", 25),
+    ("mythic", 0),
+]
+
+ROMAN_NUMERALS = {"i": 1, "ii": 2, "iii": 3, "iv": 4, "v": 5}
+
+# Score of each tier's lowest division, and where Mythic starts
+TIER_BASE = {}
+_base = 0
+for _name, _divisions, _stars in DIVISION_TIERS:
+    TIER_BASE[_name] = _base
+    _base += _divisions * _stars
+MYTHIC_BASE = _base
+
+# Highest score the parser is expected to produce (Immortal with many stars)
+MAX_RANK_SCORE = MYTHIC_BASE + 500
+
+_NUMBER = re.compile(r"\d+")
+_DIVISION = re.compile(r"\b(i{1,3}|iv|v)\b")
+
+
+def parse_rank(text):
+    """Parse a free-text rank such as "Glory 77" or "Legend II" into a score.
+
+    Higher scores are better. Returns None for unranked or unrecognised
+    ranks.
+    """
+    if not text:
+        return None
+    text = text.lower().replace("honour", "honor")
+    numbers = [int(n) for n in _NUMBER.findall(text)]
+
+    for name, min_stars in MYTHIC_TIERS:
+        if name in text or (name == "mythic" and "mythical" in text):
+            stars = numbers[0] if numbers else 0
+            return MYTHIC_BASE + max(stars, min_stars)
+
+    # Check the longest names first so "grandmaster" isn't read as "master"
+    for name, divisions, stars_per_division in sorted(
+            DIVISION_TIERS, key=lambda tier: -len(tier[0])):
+        if name not in text:
+            continue
+        rest = text.replace(name, " ")
+        match = _DIVISION.search(rest)
+        if match:
+            division = ROMAN_NUMERALS[match.group(1)]
+        elif numbers and numbers[0] <= divisions:
+            division = numbers.pop(0)
+        else:
+            division = divisions
+        division = min(max(division, 1), divisions)
+        # A division holds 0 to stars_per_division - 1 stars; more would be
+        # the next division
+        stars = min(numbers[0], stars_per_division - 1) if numbers else 0
+        return (TIER_BASE[name] + (divisions - division) * stars_per_division
+                + stars)
+
+    return None
+
+
+def rank_label(score):
+    """Return a short human readable label for a rank score."""
+    if score is None:
+        return "Unranked"
+    if score >= MYTHIC_BASE:
+        stars = score - MYTHIC_BASE
+        for name, min_stars in MYTHIC_TIERS:
+            if stars >= min_stars:
+                prefix = "Mythical " if name != "mythic" else ""
+                return f"{prefix}{name.title()} {stars}★"
+    for name, divisions, stars_per_division in reversed(DIVISION_TIERS):
+        base = TIER_BASE[name]
+        if score >= base:
+            offset = score - base
+            division = divisions - min(offset // stars_per_division,
+                                       divisions - 1)
+            numeral = {v: k for k, v in ROMAN_NUMERALS.items()}[division]
+            return f"{name.title()} {numeral.upper()}"
+    return "Unranked"
+
+
+def parse_win_rate(text):
+    """Parse a win rate such as "55%" or "55.5" into a float percentage.
+
+    Returns None when the value is unknown or out of range.
+    """
+    if text is None:
+        return None
+    try:
+        value = float(str(text).strip().rstrip("%").strip())
+    except ValueError:
+        return None
+    if not 0 <= value <= 100:
+        return None
+    return value
+
+
+class _Fenwick:
+    """Fenwick tree of counts over rank score buckets."""
+
+    def __init__(self, size):
+        self.size = size
+        self.tree = array("l", [0] * (size + 1))
+        self.total = 0
+
+    def add(self, bucket, delta):
+        """Add delta to the count of a bucket."""
+        self.total += delta
+        i = bucket + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, bucket):
+        """Return the number of entries in buckets 0..bucket."""
+        count = 0
+        i = bucket + 1
+        while i > 0:
+            count += self.tree[i]
+            i -= i & -i
+        return count
+
+    def find(self, k):
+        """Return the lowest bucket whose prefix count reaches k (k >= 1)."""
+        position = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self.tree[nxt] < k:
+                position = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return position
+
+
+class _RankBuckets:
+    """Players of one leaderboard (all, a role or a squad) by rank score."""
+
+    def __init__(self):
+        self.counts = _Fenwick(MAX_RANK_SCORE + 1)
+        self.buckets = {}  # score -> {player_id: None}, in insertion order
+
+    def add(self, player_id, score):
+        self.buckets.setdefault(score, {})[player_id] = None
+        self.counts.add(score, 1)
+
+    def remove(self, player_id, score):
+        bucket = self.buckets.get(score)
+        if bucket is None or player_id not in bucket:
+            return
+        del bucket[player_id]
+        if not bucket:
+            del self.buckets[score]
+        self.counts.add(score, -1)
+
+    def descending(self):
+        """Yield (player_id, score) from the highest score down."""
+        below = self.counts.total
+        while below > 0:
+            score = self.counts.find(below)
+            for player_id in list(self.buckets.get(score, ())):
+                yield player_id, score
+            below = self.counts.prefix(score - 1) if score else 0
+
+
+class RankIndex:
+    """Sorted rank index backing leaderboards and percentile queries.
+
+    Ranks are parsed into scores when players are written. Each leaderboard
+    (everyone, each role, each squad) keeps a Fenwick tree over the score
+    buckets, so updates and percentile lookups are O(log n) and top-N walks
+    only touch the players returned.
+    """
+
+    def __init__(self):
+        self.boards = {}
+        self.entries = {}  # player_id -> (score, keys)
+
+    @staticmethod
+    def _keys(player):
+        keys = ["all"]
+        keys.extend(f"role:{role}" for role in (player.get("roles") or {}))
+        squad = (player.get("squad") or "").lower()
+        if squad:
+            keys.append(f"squad:{squad}")
+        return keys
+
+    def add(self, player):
+        score = parse_rank(player.get("max_rank"))
+        if score is None:
+            return
+        score = min(score, MAX_RANK_SCORE)
+        keys = self._keys(player)
+        self.entries[player["id"]] = (score, keys)
+        for key in keys:
+            board = self.boards.get(key)
+            if board is None:
+                board = self.boards[key] = _RankBuckets()
+            board.add(player["id"], score)
+
+    def remove(self, player):
+        entry = self.entries.pop(player["id"], None)
+        if entry is None:
+            return
+        score, keys = entry
+        for key in keys:
+            board = self.boards.get(key)
+            if board is not None:
+                board.remove(player["id"], score)
+                if not board.counts.total:
+                    del self.boards[key]
+
+    def _board_keys(self, role=None, squad=None):
+        keys = []
+        if role:
+            keys.append(f"role:{role.lower()}")
+        if squad:
+            keys.append(f"squad:{squad.lower()}")
+        return keys or ["all"]
+
+    def count(self, role=None, squad=None):
+        """Return the number of ranked players matching the filters."""
+        keys = self._board_keys(role, squad)
+        if len(keys) == 1:
+            board = self.boards.get(keys[0])
+            return board.counts.total if board else 0
+        return sum(1 for _ in self._walk(keys))
+
+    def _walk(self, keys):
+        """Yield (player_id, score) descending for players on all boards."""
+        boards = [self.boards.get(key) for key in keys]
+        if not all(boards):
+            return
+        # Walk the smallest board and filter by membership of the others
+        boards.sort(key=lambda b: b.counts.total)
+        for player_id, score in boards[0].descending():
+            player_keys = self.entries[player_id][1]
+            if all(key in player_keys for key in keys):
+                yield player_id, score
+
+    def top(self, n, role=None, squad=None):
+        """Return up to n (player_id, score) pairs, best first."""
+        result = []
+        for entry in self._walk(self._board_keys(role, squad)):
+            result.append(entry)
+            if len(result) >= n:
+                break
+        return result
+
+    def percentile(self, player_id, role=None, squad=None):
+        """Return (position, total, percentile) for a ranked player, or None.
+
+        Position is 1 for the best player; percentile is the share of the
+        leaderboard ranked at or below the player.
+        """
+        entry = self.entries.get(player_id)
+        keys = self._board_keys(role, squad)
+        if entry is None or not all(key in entry[1] for key in keys):
+            return None
+        score = entry[0]
+        if len(keys) == 1:
+            counts = self.boards[keys[0]].counts
+            total = counts.total
+            above = total - counts.prefix(score)
+        else:
+            scores = [s for _, s in self._walk(keys)]
+            total = len(scores)
+            above = sum(1 for s in scores if s > score)
+        return above + 1, total, 100 * (total - above) / total
+
+
+# Keep a rank index for every store partition
+register_index("rank", RankIndex)
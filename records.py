@@ -0,0 +1,206 @@
+# Compact read-only player and squad records for the store
+import sys
+from operator import attrgetter
+from types import MappingProxyType
+
+# Marker for optional fields a record doesn't have
+_MISSING = object()
+
+# Shared read-only mapping for players without roles
+EMPTY_ROLES = MappingProxyType({})
+
+# Default values for optional player fields
+PLAYER_DEFAULTS = {
+    "max_rank": "Unranked",
+    "win_rate": "Unknown",
+    "availability": "Not specified",
+    "squad": "",
+}
+
+
+def _intern(value):
+    """Intern strings that repeat across records (squads, ranks, defaults)."""
+    return sys.intern(value) if type(value) is str else value
+
+
+class _Record:
+    """Read-only record with dict-style access.
+
+    Known fields live in __slots__ (no per-record dict); any other fields
+    are kept in `_extra`. Records support the read side of the dict API
+    (`r["x"]`, `get`, `in`, `keys`, `items`, `dict(r)`) and compare equal
+    to dicts with the same content.
+    """
+
+    __slots__ = ("_extra",)
+    FIELDS = ()
+    INTERNED = frozenset()
+    DEFAULTS = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Fetches every field at once, for fast comparisons
+        cls._values = attrgetter(*cls.FIELDS, "_extra")
+
+    def __init__(self, data):
+        set_field = object.__setattr__
+        for field in self.FIELDS:
+            value = data.get(field, self.DEFAULTS.get(field, _MISSING))
+            if field in self.INTERNED:
+                value = _intern(value)
+            set_field(self, field, value)
+        extra = {k: v for k, v in data.items() if k not in self.FIELDS}
+        set_field(self, "_extra", extra or None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} records are read-only")
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        elif self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        if key in self.FIELDS:
+            return getattr(self, key) is not _MISSING
+        return bool(self._extra) and key in self._extra
+
+    def keys(self):
+        keys = [f for f in self.FIELDS if getattr(self, f) is not _MISSING]
+        if self._extra:
+            keys.extend(self._extra)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if type(other) is type(self):
+            return self._values(self) == other._values(other)
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class PlayerRecord(_Record):
+    """A player as stored in a snapshot."""
+
+    FIELDS = ("id", "username", "mlbb_id", "mlbb_username", "max_rank",
+              "win_rate", "availability", "squad", "role", "roles")
+    __slots__ = FIELDS
+    INTERNED = frozenset({"max_rank", "win_rate", "availability", "squad",
+                          "role"})
+    DEFAULTS = PLAYER_DEFAULTS
+
+    def __init__(self, data):
+        super().__init__(data)
+        roles = data.get("roles")
+        if not roles:
+            roles = EMPTY_ROLES
+        elif not isinstance(roles, MappingProxyType):
+            roles = MappingProxyType({_intern(role): _intern(heroes)
+                                      for role, heroes in roles.items()})
+        object.__setattr__(self, "roles", roles)
+
+
+class SquadRecord(_Record):
+    """A squad as stored in a snapshot."""
+
+    FIELDS = ("name", "description", "created_by", "created_at")
+    __slots__ = FIELDS
+    INTERNED = frozenset({"name"})
+
+
+def player_record(data):
+    """Return a PlayerRecord for a player dict (records are returned as is)."""
+    return data if isinstance(data, PlayerRecord) else PlayerRecord(data)
+
+
+def squad_record(data):
+    """Return a SquadRecord for a squad dict (records are returned as is)."""
+    return data if isinstance(data, SquadRecord) else SquadRecord(data)
+
+
+def memory_report(count=100000):
+    """Compare memory per player of records and read-only dicts.
+
+    Builds `count` synthetic players both ways and returns
+    {"dict": bytes per player, "record": bytes per player}.
+    """
+    import random
+    import tracemalloc
+
+    squads = [f"Squad {i}" for i in range(count // 50)]
+    ranks = ["Legend", "Mythic", "Mythical Glory", "Epic", "Unranked"]
+    heroes = ["Layla", "Ling, Fanny", "Tigreal", "Kagura", "Chou"]
+    roles = ["gold", "exp", "mid", "jungle", "roam"]
+    rng = random.Random(0)
+
+    def raw_players():
+        for i in range(count):
+            player = {
+                "id": 10 ** 17 + i,
+                "username": f"user{i}",
+                "mlbb_id": str(10 ** 9 + i),
+                "mlbb_username": f"Player {i}",
+                # Parsed from JSON: equal strings are separate objects
+                "max_rank": "".join(rng.choice(ranks)),
+                "win_rate": f"{rng.randint(40, 70)}%",
+                "availability": "".join("Not specified"),
+                "squad": "".join(rng.choice(squads)) if i % 3 else "",
+                "roles": {"".join(r): "".join(rng.choice(heroes))
+                          for r in rng.sample(roles, rng.randint(0, 2))},
+            }
+            if player["squad"]:
+                player["role"] = "".join("Member")
+            yield player
+
+    def read_only_dict(player):
+        frozen = dict(player)
+        frozen["roles"] = MappingProxyType(dict(player["roles"]))
+        return MappingProxyType(frozen)
+
+    result = {}
+    for name, build in (("dict", read_only_dict), ("record", PlayerRecord)):
+        rng.seed(0)
+        tracemalloc.start()
+        players = [build(p) for p in raw_players()]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        result[name] = size / len(players)
+        del players
+    return result
+
+
+if __name__ == "__main__":
+    report = memory_report()
+    print(f"read-only dicts: {report['dict']:.0f} bytes/player")
+    print(f"slotted records: {report['record']:.0f} bytes/player "
+          f"({100 * (1 - report['record'] / report['dict']):.0f}% less)")
@@ -0,0 +1,124 @@
+# Single-flight coalescing of identical concurrent reads
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Number of keys whose stats are kept (least recently used are dropped)
+MAX_TRACKED_KEYS = 500
+
+
+class FlightStats:
+    """Counters for one single-flight key."""
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0  # calls answered by another call's computation
+        self.computations = 0
+        self.errors = 0
+        self.compute_ms = 0.0
+        self.max_waiters = 0
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "computations": self.computations,
+            "errors": self.errors,
+            "avg_compute_ms": (self.compute_ms / self.computations
+                               if self.computations else 0.0),
+            "max_waiters": self.max_waiters,
+        }
+
+
+class SingleFlight:
+    """Share one in-flight computation between identical concurrent calls.
+
+    The first call for a key starts the computation as a task; calls for the
+    same key that arrive before it finishes await that task instead of
+    starting their own. Nothing is cached once the result is delivered, so
+    later calls always see fresh data.
+    """
+
+    def __init__(self, max_tracked_keys=MAX_TRACKED_KEYS):
+        self.max_tracked_keys = max_tracked_keys
+        self._inflight = {}  # (key, version) -> (task, waiter count)
+        self._stats = OrderedDict()
+
+    def _key_stats(self, key):
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = FlightStats()
+            while len(self._stats) > self.max_tracked_keys:
+                self._stats.popitem(last=False)
+        else:
+            self._stats.move_to_end(key)
+        return stats
+
+    async def _run(self, stats, compute):
+        started = time.perf_counter()
+        stats.computations += 1
+        try:
+            return await compute()
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.compute_ms += (time.perf_counter() - started) * 1000
+
+    def _done(self, flight, task):
+        waiters = self._inflight.pop(flight)[1]
+        stats = self._key_stats(flight[0])
+        stats.max_waiters = max(stats.max_waiters, waiters)
+        # Don't warn about an unretrieved exception if every caller left
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key, compute, version=None):
+        """Return the result of `compute()`, sharing it with concurrent calls.
+
+        `compute` is a coroutine function taking no arguments. Calls only
+        share a computation if they pass the same key and data version, so a
+        call never gets a result computed from data older than it saw. A
+        caller being cancelled doesn't cancel the computation the other
+        callers wait for.
+        """
+        stats = self._key_stats(key)
+        stats.calls += 1
+        flight = (key, version)
+        entry = self._inflight.get(flight)
+        if entry is None:
+            task = asyncio.ensure_future(self._run(stats, compute))
+            self._inflight[flight] = (task, 1)
+            task.add_done_callback(lambda t: self._done(flight, t))
+        else:
+            task, waiters = entry
+            self._inflight[flight] = (task, waiters + 1)
+            stats.shared += 1
+            logger.debug(f"Coalesced call for {key} ({waiters + 1} waiting)")
+        return await asyncio.shield(task)
+
+    def stats(self):
+        """Return {key: counters} for tracked keys, most active first."""
+        return dict(sorted(((key, s.as_dict()) for key, s in self._stats.items()),
+                           key=lambda item: -item[1]["calls"]))
+
+    def totals(self):
+        """Return the call counters summed over all tracked keys."""
+        calls = sum(s.calls for s in self._stats.values())
+        shared = sum(s.shared for s in self._stats.values())
+        return {
+            "keys": len(self._stats),
+            "in_flight": len(self._inflight),
+            "calls": calls,
+            "shared": shared,
+            "computations": sum(s.computations for s in self._stats.values()),
+            "shared_pct": 100 * shared / calls if calls else 0.0,
+        }
+
+
+# Shared coalescer for read commands
+read_flights = SingleFlight()
@@ -0,0 +1,175 @@
+# Columnar player stats and per-squad aggregates
+import math
+import logging
+from array import array
+from collections import Counter
+from db import register_index
+from ranks import parse_rank, parse_win_rate, rank_label
+from balance import ROLES
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Marker for unknown values in the float columns
+UNKNOWN = math.nan
+
+
+class SquadAggregate:
+    """Running totals for one squad, updated as members join or leave."""
+
+    def __init__(self):
+        self.members = 0
+        self.win_rate_sum = 0.0
+        self.win_rate_count = 0
+        self.rank_sum = 0.0
+        self.rank_scores = Counter()  # rank score -> number of members
+        self.role_counts = Counter()  # role -> members who play it
+
+    def apply(self, win_rate, rank_score, roles, sign):
+        """Add (sign=1) or remove (sign=-1) one member's values."""
+        self.members += sign
+        if not math.isnan(win_rate):
+            self.win_rate_sum += sign * win_rate
+            self.win_rate_count += sign
+        if not math.isnan(rank_score):
+            self.rank_sum += sign * rank_score
+            self.rank_scores[int(rank_score)] += sign
+            if not self.rank_scores[int(rank_score)]:
+                del self.rank_scores[int(rank_score)]
+        for role in roles:
+            self.role_counts[role] += sign
+            if not self.role_counts[role]:
+                del self.role_counts[role]
+
+    @property
+    def average_win_rate(self):
+        if not self.win_rate_count:
+            return None
+        return self.win_rate_sum / self.win_rate_count
+
+    @property
+    def average_rank(self):
+        ranked = sum(self.rank_scores.values())
+        if not ranked:
+            return None
+        return self.rank_sum / ranked
+
+    @property
+    def rank_range(self):
+        """Return (lowest, highest) member rank scores, or None."""
+        if not self.rank_scores:
+            return None
+        return min(self.rank_scores), max(self.rank_scores)
+
+    @property
+    def missing_roles(self):
+        return [role for role in ROLES if role not in self.role_counts]
+
+
+class StatColumns:
+    """Numeric player attributes kept in array-backed columns.
+
+    Each player gets a slot in the win rate, rank score and role count
+    columns; slots of removed players are reused. Squad aggregates are
+    adjusted from the column values as players join or leave, so squad stats
+    never have to be recomputed from every member.
+    """
+
+    def __init__(self):
+        self.slots = {}  # player_id -> slot
+        self.free_slots = []
+        self.win_rate = array("d")
+        self.rank_score = array("d")
+        self.role_count = array("B")
+        self.player_roles = {}  # player_id -> tuple of roles
+        self.player_squad = {}  # player_id -> squad name (lowercase)
+        self.squads = {}
+
+    def add(self, player):
+        win_rate = parse_win_rate(player.get("win_rate"))
+        rank_score = parse_rank(player.get("max_rank"))
+        roles = tuple(r for r in (player.get("roles") or {}) if r in ROLES)
+        values = (UNKNOWN if win_rate is None else win_rate,
+                  UNKNOWN if rank_score is None else float(rank_score),
+                  len(roles))
+
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.win_rate[slot], self.rank_score[slot], self.role_count[slot] = values
+        else:
+            slot = len(self.win_rate)
+            self.win_rate.append(values[0])
+            self.rank_score.append(values[1])
+            self.role_count.append(values[2])
+        self.slots[player["id"]] = slot
+        self.player_roles[player["id"]] = roles
+
+        squad = (player.get("squad") or "").lower()
+        if squad:
+            self.player_squad[player["id"]] = squad
+            aggregate = self.squads.get(squad)
+            if aggregate is None:
+                aggregate = self.squads[squad] = SquadAggregate()
+            aggregate.apply(values[0], values[1], roles, 1)
+
+    def remove(self, player):
+        slot = self.slots.pop(player["id"], None)
+        if slot is None:
+            return
+        roles = self.player_roles.pop(player["id"])
+        squad = self.player_squad.pop(player["id"], None)
+        if squad:
+            aggregate = self.squads[squad]
+            aggregate.apply(self.win_rate[slot], self.rank_score[slot],
+                            roles, -1)
+            if not aggregate.members:
+                del self.squads[squad]
+        self.win_rate[slot] = UNKNOWN
+        self.rank_score[slot] = UNKNOWN
+        self.role_count[slot] = 0
+        self.free_slots.append(slot)
+
+    def squad(self, name):
+        """Return the aggregate for a squad, or None if it has no members."""
+        return self.squads.get(name.lower())
+
+    def player(self, player_id):
+        """Return (win_rate, rank_score, role_count) for a player, or None."""
+        slot = self.slots.get(player_id)
+        if slot is None:
+            return None
+        win_rate = self.win_rate[slot]
+        rank_score = self.rank_score[slot]
+        return (None if math.isnan(win_rate) else win_rate,
+                None if math.isnan(rank_score) else int(rank_score),
+                self.role_count[slot])
+
+
+def format_squad_stats(aggregate):
+    """Format squad aggregates for display in embeds."""
+    if aggregate is None:
+        return "No members yet"
+
+    win_rate = aggregate.average_win_rate
+    average_rank = aggregate.average_rank
+    rank_range = aggregate.rank_range
+    lines = [
+        f"**Average Win Rate:** {win_rate:.1f}%" if win_rate is not None
+        else "**Average Win Rate:** Unknown",
+        f"**Average Rank:** {rank_label(round(average_rank))}"
+        if average_rank is not None else "**Average Rank:** Unknown",
+    ]
+    if rank_range:
+        lines.append(f"**Rank Spread:** {rank_label(rank_range[0])} – "
+                     f"{rank_label(rank_range[1])}")
+    coverage = ", ".join(f"{role.upper()} ({aggregate.role_counts[role]})"
+                         for role in ROLES if role in aggregate.role_counts)
+    lines.append(f"**Roles Covered:** {coverage or 'None'}")
+    if aggregate.missing_roles:
+        lines.append(f"**Missing Roles:** "
+                     f"{', '.join(r.upper() for r in aggregate.missing_roles)}")
+    return "\n".join(lines)
+
+
+# Keep stat columns for every store partition
+register_index("stats", StatColumns)
@@ -0,0 +1,19 @@
+# Round trips between rank scores and their labels
+from ranks import (DIVISION_TIERS, MYTHIC_BASE, ROMAN_NUMERALS, parse_rank,
+                   rank_label)
+
+NUMERALS = {value: numeral.upper() for numeral, value in ROMAN_NUMERALS.items()}
+
+
+def test_division_ranks_round_trip():
+    for name, divisions, stars_per_division in DIVISION_TIERS:
+        for division in range(1, divisions + 1):
+            label = f"{name.title()} {NUMERALS[division]}"
+            for stars in range(stars_per_division + 3):
+                assert rank_label(parse_rank(f"{label} {stars}")) == label
+
+
+def test_extra_stars_stay_in_their_division():
+    assert parse_rank("Grandmaster I 5") < parse_rank("Epic V")
+    assert parse_rank("Legend I 5") < MYTHIC_BASE
+    assert parse_rank("Legend I 4") == MYTHIC_BASE - 1
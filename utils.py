@@ -6,19 +6,23 @@ import logging
 # Set up logging
 logger = logging.getLogger(__name__)
 
-async def has_permission(ctx):
-    """Check if a user has permission to use admin commands."""
+# Moderator role ID
+MODERATOR_ROLE_ID = 1344104617092452534
+
+def is_moderator(member, guild):
+    """Check if a guild member may use admin commands."""
     # Server owner always has permission
-    if ctx.author.id == ctx.guild.owner_id:
+    if member.id == guild.owner_id:
         return True
     
-    # Moderator role ID
-    MODERATOR_ROLE_ID = 1344104617092452534
-    
     # Check for admin role, administrator permission, or moderator role
-    return (ctx.author.guild_permissions.administrator or 
-            any(role.name.lower() in ["admin", "moderator"] for role in ctx.author.roles) or
-            any(role.id == MODERATOR_ROLE_ID for role in ctx.author.roles))
+    return (member.guild_permissions.administrator or 
+            any(role.name.lower() in ["admin", "moderator"] for role in member.roles) or
+            any(role.id == MODERATOR_ROLE_ID for role in member.roles))
+
+async def has_permission(ctx):
+    """Check if a user has permission to use admin commands."""
+    return is_moderator(ctx.author, ctx.guild)
 
 def create_embed(title, description, color=discord.Color.blue()):
     """Create a Discord embed with the given parameters."""